@@ -0,0 +1,259 @@
+'''
+Headless batch processing of captured garment images: undistortion, classification, segmentation with post-processing
+and the SVG export of the GUI, without the GUI, the camera or the cutter.
+Every image gives <name>.svg and <name>.json (the contours in frame coordinates) in the output directory.
+Finished images are appended to progress.jsonl in the output directory and skipped by a rerun, so an interrupted batch resumes where it stopped.
+The images are spread over a pool of worker processes that load the models once, the classifier runs on --batch-size images at a time.
+The full frame is segmented, with --reference (the empty-table reference stored by the station the images come from) only the crop around the garment.
+Run from deseptex_application: python src/batch.py ./archive --output ./batch --workers 2
+'''
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import cv2 as cv
+
+from modules.inferencer import inferencer_t
+from modules.garment_locator import garment_locator_t
+from modules.undistorter import undistorter_t
+from modules.laser_cutter import laser_cutter_t
+from modules.path_optimizer import path_optimizer_t
+from modules.frame_source import IMAGE_EXTENSIONS
+from modules.model_export import BACKENDS
+from modules.settings import (ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE, UNDISTORT_MAPS_PATH, UNDISTORT_INTERPOLATION, INFERENCE_BACKEND, CALIBRATION_FRAMES_DIR,
+                              CUT_SIMPLIFY_TOLERANCE_MM, CUT_OPTIMIZE_ORDER, classification_image_shape, segmentation_image_shape)
+
+
+MODEL_PATHS = ("./models/class_pants_avant_arriere_chemises_v1_1.pt", "./models/pants_avant_v3_1.pt", "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt")
+STAGES = ("read", "undistort", "classify", "segment", "postproc", "export")
+PROGRESS_FILE = "progress.jsonl"
+
+worker = {} # state of a pool worker, filled once by init_worker
+
+
+def list_images(path):
+    # a directory of images or a glob
+    if os.path.isdir(path):
+        return sorted(p for p in glob.glob(os.path.join(path, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(p for p in glob.glob(path) if p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def image_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def load_progress(output_dir):
+    # names of the images that are done, a line cut off by an interrupted run is ignored
+    done = set()
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    if not os.path.exists(progress_path):
+        return done
+    with open(progress_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                done.add(record["image"])
+    return done
+
+
+def make_undistorter(calibration_path):
+    # same camera matrices as CameraProcess.load_calibration
+    with open(calibration_path) as f:
+        calibration_dict = json.load(f)
+    mtx = np.asarray(calibration_dict["mtx"])
+    dist = np.asarray(calibration_dict["dist"])
+    newcameramtx, _ = cv.getOptimalNewCameraMatrix(mtx, dist, (ORIGINAL_IMAGE_SHAPE[1], ORIGINAL_IMAGE_SHAPE[0]), 1, (SHARED_IMAGE_SHAPE[1], SHARED_IMAGE_SHAPE[0]))
+    return undistorter_t(mtx, dist, newcameramtx, ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE, UNDISTORT_MAPS_PATH, UNDISTORT_INTERPOLATION)
+
+
+def init_worker(config):
+    # runs once per worker process, everything slow is loaded here and kept for all the images of the worker
+    if config["threads"]:
+        import torch
+        torch.set_num_threads(config["threads"])
+    model_paths = config["models"]
+    worker["config"] = config
+    worker["undistorter"] = None if config["undistorted"] else make_undistorter(config["calibration"])
+    worker["inferencer"] = inferencer_t(model_paths[0], classification_image_shape, model_paths[1], model_paths[2], model_paths[3], segmentation_image_shape,
+                                        config["backend"], config["calibration_frames"])
+    # the GARMENT_ROI default is the empty table of this station, the archived images may come from another one
+    worker["inferencer"].garment_locator = garment_locator_t(config["reference"]) if config["reference"] is not None else None
+    worker["inferencer"].warm_up(SHARED_IMAGE_SHAPE)
+    for class_name in worker["inferencer"].unloaded_classes():
+        worker["inferencer"].preload(class_name, SHARED_IMAGE_SHAPE)
+    with open(config["persp_matrix"]) as f:
+        M = np.asarray(json.load(f)["matrix"])
+    # contours are in frame coordinates, the perspective matrix maps sensor pixels
+    worker["laser_cutter"] = laser_cutter_t("127.0.0.1", 0, 0, M,
+                                            input_scale=(ORIGINAL_IMAGE_SHAPE[1] / SHARED_IMAGE_SHAPE[1], ORIGINAL_IMAGE_SHAPE[0] / SHARED_IMAGE_SHAPE[0]),
+                                            path_optimizer=path_optimizer_t(CUT_SIMPLIFY_TOLERANCE_MM, CUT_OPTIMIZE_ORDER))
+
+
+def read_frame(path, record):
+    start = time.perf_counter()
+    image = cv.imread(path)
+    record["read_ms"] = (time.perf_counter() - start) * 1000
+    if image is None:
+        raise IOError(f"could not decode {path}")
+
+    start = time.perf_counter()
+    undistorter = worker["undistorter"]
+    if undistorter is not None:
+        if image.shape != ORIGINAL_IMAGE_SHAPE:
+            raise ValueError(f"expected a sensor frame of shape {ORIGINAL_IMAGE_SHAPE}, got {image.shape}, pass --undistorted for frames that are already undistorted")
+        image = undistorter.undistort(image)
+    elif image.shape != SHARED_IMAGE_SHAPE:
+        raise ValueError(f"expected an undistorted frame of shape {SHARED_IMAGE_SHAPE}, got {image.shape}")
+    record["undistort_ms"] = (time.perf_counter() - start) * 1000
+    return image
+
+
+def export(image_path, image_shape, selected_class, roi, contours, record):
+    output_dir = worker["config"]["output"]
+    name = image_name(image_path)
+    laser_cutter = worker["laser_cutter"]
+    laser_cutter.write_svg(laser_cutter.build_svg(contours), os.path.join(output_dir, name + ".svg"))
+
+    document = {"image": os.path.abspath(image_path), "class": selected_class, "shape": list(image_shape),
+                "roi": None if roi is None else [int(v) for v in roi],
+                "contours": [np.asarray(contour).reshape(-1, 2).tolist() for contour in contours]}
+    tmp_path = os.path.join(output_dir, name + ".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(document, f)
+    os.replace(tmp_path, os.path.join(output_dir, name + ".json"))
+
+
+def process_batch(image_paths):
+    '''
+    Processes a batch of images in a worker and returns one record per image with the time per stage.
+    A failing image gets an "error" in its record and does not stop the rest of the batch.
+    '''
+    inferencer = worker["inferencer"]
+    records = [{"image": image_name(path), "worker": os.getpid()} for path in image_paths]
+    images = []
+    for path, record in zip(image_paths, records):
+        try:
+            images.append(read_frame(path, record))
+        except (IOError, ValueError) as e:
+            record["error"] = str(e)
+            images.append(None)
+
+    # one classifier call for the whole batch, its time is shared by the images
+    valid = [i for i, image in enumerate(images) if image is not None]
+    start = time.perf_counter()
+    classes = inferencer.classify([images[i] for i in valid]) if valid else []
+    classify_ms = (time.perf_counter() - start) * 1000 / max(len(valid), 1)
+
+    for i, selected_class in zip(valid, classes):
+        record = records[i]
+        record["class"] = selected_class
+        record["classify_ms"] = classify_ms
+        try:
+            start = time.perf_counter()
+            result, relevant_indices = inferencer.segment(images[i], selected_class) if selected_class is not None else (None, None)
+            roi = inferencer.roi if result is not None else None
+            record["segment_ms"] = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            contours = inferencer.postprocess(result, relevant_indices, images[i].shape, roi)
+            record["postproc_ms"] = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            export(image_paths[i], images[i].shape, selected_class, roi, contours, record)
+            record["export_ms"] = (time.perf_counter() - start) * 1000
+            record["contours"] = len(contours)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["total_ms"] = sum(record.get(stage + "_ms", 0.0) for stage in STAGES)
+    return records
+
+
+def batches(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", help="directory of images or a glob")
+    parser.add_argument("--output", default="./batch", help="directory for the SVG and JSON files and the progress")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes, each one loads the models")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per worker, by default the cores are split over the workers")
+    parser.add_argument("--batch-size", type=int, default=8, help="images per classifier call")
+    parser.add_argument("--backend", choices=BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument("--calibration-frames", default=CALIBRATION_FRAMES_DIR, help="directory of saved frames for INT8 calibration")
+    parser.add_argument("--models", nargs=4, default=MODEL_PATHS, metavar=("CLASSIFIER", "PANTS_AVANT", "PANTS_ARRIERE", "CHEMISES"))
+    parser.add_argument("--reference", default=None, help="empty-table reference stored by the station the images come from, e.g. ./calibration/empty_table.png, segments only the garment crop")
+    parser.add_argument("--undistorted", action="store_true", help="the images are frames from the frame ring, already undistorted")
+    parser.add_argument("--calibration", default="./calibration/camera_calibration.json")
+    parser.add_argument("--persp-matrix", default="./calibration/persp_matrix.json")
+    parser.add_argument("--restart", action="store_true", help="process every image again, ignoring the progress of earlier runs")
+    args = parser.parse_args()
+
+    image_paths = list_images(args.images)
+    if not image_paths:
+        sys.exit(f"No images found in '{args.images}'")
+    names = [image_name(path) for path in image_paths]
+    if len(set(names)) != len(names):
+        sys.exit("Image names must be unique, the outputs are named after them")
+
+    os.makedirs(args.output, exist_ok=True)
+    progress_path = os.path.join(args.output, PROGRESS_FILE)
+    if args.restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+    done = load_progress(args.output)
+    todo = [path for path in image_paths if image_name(path) not in done]
+    print(f"{len(image_paths)} images, {len(image_paths) - len(todo)} already done, {len(todo)} to process")
+    if not todo:
+        sys.exit(0)
+
+    # build the undistortion maps once here, otherwise every worker would build and cache them at the same time
+    if not args.undistorted:
+        make_undistorter(args.calibration)
+
+    if args.reference is not None and not os.path.exists(args.reference):
+        sys.exit(f"No empty-table reference at '{args.reference}'")
+
+    workers = max(1, min(args.workers, len(todo)))
+    config = {"output": args.output, "models": list(args.models), "backend": args.backend, "calibration_frames": args.calibration_frames, "undistorted": args.undistorted,
+              "reference": args.reference, "calibration": args.calibration, "persp_matrix": args.persp_matrix,
+              "threads": args.threads if args.threads is not None else max(1, (os.cpu_count() or 1) // workers)}
+
+    timings = {stage: [] for stage in STAGES}
+    failed = 0
+    start = time.perf_counter()
+    load_time = None
+    # a pool that fails loudly when a worker dies (e.g. out of memory), the finished images are in the progress already
+    with ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"), initializer=init_worker, initargs=(config,)) as pool, open(progress_path, "a") as progress:
+        futures = [pool.submit(process_batch, batch) for batch in batches(todo, args.batch_size)]
+        try:
+            for future in as_completed(futures):
+                records = future.result()
+                if load_time is None:
+                    load_time = time.perf_counter() - start
+                for record in records:
+                    progress.write(json.dumps(record) + "\n")
+                    if "error" in record:
+                        failed += 1
+                        print(f"{record['image']}: failed, {record['error']}")
+                        continue
+                    for stage in STAGES:
+                        timings[stage].append(record[stage + "_ms"])
+                    print(f"{record['image']}: {record['class']}, {record['contours']} contours, {record['total_ms']:.0f} ms")
+                progress.flush()
+        except BrokenProcessPool:
+            sys.exit("A worker died, probably out of memory, rerun with fewer --workers to resume")
+    elapsed = time.perf_counter() - start
+
+    processed = len(todo) - failed
+    print(f"{processed} images in {elapsed:.1f} s with {workers} workers ({failed} failed), {processed / elapsed * 60:.1f} images/min, first batch after {load_time:.1f} s")
+    if processed:
+        print("mean per image: " + ", ".join(f"{stage} {np.mean(timings[stage]):.0f} ms" for stage in STAGES))
@@ -0,0 +1,74 @@
+'''
+Cost of the snapshot archive for the GUI: snaps are submitted every --interval seconds, like an operator who snaps and
+finishes garments, and the time submit takes (the copy out of the frame ring) is compared with writing the frame as a
+PNG right away. Reports the writer time per snapshot, the snapshots dropped because the writer fell behind and the
+disk use against a --disk-mb budget, for every codec.
+Run from deseptex_application: python src/benchmarks/archive.py --snaps 20 --interval 0.05 --disk-mb 100
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_camera import synthetic_frames
+from modules.frame_ring import frame_ring_t
+from modules.snapshot_archive import snapshot_archive_t, CODECS
+from modules.settings import SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS, ARCHIVE_QUEUE
+
+
+def contours_of(rng, count=8):
+    return [rng.integers(0, 2000, size=(int(rng.integers(50, 400)), 2)).astype(np.int32) for _ in range(count)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snaps", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between two submitted snapshots")
+    parser.add_argument("--queue", type=int, default=ARCHIVE_QUEUE)
+    parser.add_argument("--disk-mb", type=float, default=100.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = synthetic_frames(rng, SHARED_IMAGE_SHAPE, 4)
+    frame_ring = frame_ring_t(SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS)
+
+    # what writing in the UI path would cost
+    sync_dir = tempfile.mkdtemp(prefix="archive_bench_sync_")
+    sync_times = []
+    for i in range(3):
+        start = time.perf_counter()
+        cv.imwrite(os.path.join(sync_dir, f"{i}.png"), frames[i % len(frames)])
+        sync_times.append(time.perf_counter() - start)
+    print(f"{'synchronous png':16s} UI blocked p50 {np.percentile(sync_times, 50) * 1000:8.1f} ms")
+
+    for codec in CODECS:
+        path = tempfile.mkdtemp(prefix=f"archive_bench_{codec}_")
+        archive = snapshot_archive_t(path, args.queue, args.disk_mb, codec)
+        submit_times = []
+        for i in range(args.snaps):
+            seq = frame_ring.write(frames[i % len(frames)])
+            start = time.perf_counter()
+            archive.submit(frame_ring, seq, contours_of(rng), contours_of(rng), {"class": "chemise", "outcome": "cut"})
+            submit_times.append(time.perf_counter() - start)
+            time.sleep(args.interval)
+        archive.close(timeout=60)
+        stats = archive.stats()
+        on_disk = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / (1024 * 1024)
+        with open(archive.index_path) as f:
+            indexed = sum(1 for _ in f)
+        print(f"{codec:16s} UI blocked p50 {np.percentile(submit_times, 50) * 1000:8.1f} ms   max {max(submit_times) * 1000:6.1f} ms   "
+              f"write {stats['write_ms'] or 0:6.1f} ms/snapshot   written {stats['written']}   dropped {stats['dropped']}   "
+              f"evicted {stats['evicted']}   {on_disk:6.1f} MB on disk ({indexed} indexed)")
+
+        # a restart drops the index lines of the evicted snapshots
+        reopened = snapshot_archive_t(path, args.queue, args.disk_mb, codec)
+        with open(reopened.index_path) as f:
+            print(f"{'':16s} after a restart {sum(1 for _ in f)} index lines for {len(reopened.entries)} snapshots on disk")
+        reopened.close()
+
+    frame_ring.close()
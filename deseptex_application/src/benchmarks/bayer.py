@@ -0,0 +1,88 @@
+'''
+Raw Bayer capture against BGR8 capture, on the mock camera device with synthetic sensor frames.
+Both go through CameraProcess.capture_frame; the Bayer path demosaics every 2x2 cell into one pixel and remaps that
+half-resolution image (undistorter_t with bayer). Reports the bytes per frame and the frame rate a GigE link allows,
+the capture time and the memory allocated per frame, and how far the Bayer frames are from the BGR frames, next to
+the difference of a full-resolution OpenCV demosaic, which shows how much of it is the mosaic itself.
+Run from deseptex_application: python src/benchmarks/bayer.py --frames 5
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_camera import SENSOR_IMAGE_SHAPE, synthetic_frames, make_camera
+from capture import measure
+from modules.mock_camera import mock_device_t
+from modules.frame_source import arena_source_t
+from modules.frame_ring import frame_ring_t
+from modules.undistorter import undistorter_t, bayer_mosaic
+from modules.settings import SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE, FRAME_RING_SLOTS, UNDISTORT_INTERPOLATION
+
+
+OPENCV_DEMOSAIC = {"BayerRG8": cv.COLOR_BayerBG2BGR, "BayerBG8": cv.COLOR_BayerRG2BGR, # OpenCV names the pattern from the second row
+                   "BayerGR8": cv.COLOR_BayerGB2BGR, "BayerGB8": cv.COLOR_BayerGR2BGR}
+
+
+def difference(frame, reference):
+    # mean and 99th percentile absolute difference and PSNR, over the pixels both frames cover
+    valid = (reference.max(axis=2) > 0) & (frame.max(axis=2) > 0)
+    diff = np.abs(frame.astype(np.int16) - reference.astype(np.int16))[valid]
+    mse = float(np.mean(diff.astype(np.float64) ** 2))
+    return float(diff.mean()), float(np.percentile(diff, 99)), 10 * np.log10(255 ** 2 / max(mse, 1e-12))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--frame-shape", type=int, nargs=3, default=SENSOR_IMAGE_SHAPE, help="height width channels of the sensor frames")
+    parser.add_argument("--pattern", default="BayerRG8")
+    parser.add_argument("--link-mb-s", type=float, default=110.0, help="usable bandwidth of the camera link, GigE gives about 110 MB/s")
+    parser.add_argument("--calibration", default="./calibration/camera_calibration.json")
+    args = parser.parse_args()
+
+    frame_shape = tuple(args.frame_shape)
+    source = synthetic_frames(np.random.default_rng(0), frame_shape, 1)
+    # smooth shading on top of the flat blobs, so the demosaic has gradients as well as edges to get right
+    ramp = np.linspace(0, 40, frame_shape[1], dtype=np.float32)[None, :, None]
+    source = [np.clip(frame.astype(np.float32) * 0.8 + ramp, 0, 255).astype(np.uint8) for frame in source]
+    frame_ring = frame_ring_t(SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    preview_ring = frame_ring_t(GUI_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    camera = make_camera(frame_ring, preview_ring, args.calibration, frame_shape)
+    bgr_undistorter = camera.undistorter
+    bayer_undistorter = undistorter_t(camera.mtx, camera.dist, camera.newcameramtx, frame_shape, SHARED_IMAGE_SHAPE, None, UNDISTORT_INTERPOLATION, args.pattern)
+
+    results = {}
+    for pixel_format, undistorter in (("BGR8", bgr_undistorter), (args.pattern, bayer_undistorter)):
+        device = mock_device_t(source, pixel_format=pixel_format)
+        camera.undistorter = undistorter
+        camera.frame_source = arena_source_t(device=device, pixel_format=pixel_format)
+        camera.frame_source.start()
+        capture = lambda camera, device: camera.capture_frame()
+        capture(camera, device) # warm up
+        times, peak, frame = measure(capture, camera, device, args.frames)
+        camera.frame_source.stop()
+        assert not device.outstanding, "every buffer must be requeued"
+        results[pixel_format] = frame
+
+        frame_bytes = device.buffers[0].array.nbytes
+        print(f"{pixel_format:9s} {frame_bytes / 1e6:6.1f} MB per frame   at most {args.link_mb_s * 1e6 / frame_bytes:5.2f} fps on the link   "
+              f"capture p50 {np.percentile(times, 50):7.1f} ms   allocated per frame {peak / 1e6:6.1f} MB")
+
+    # the same mosaic through a full-resolution demosaic and the BGR remap, the usual way to do it
+    start = time.perf_counter()
+    full = cv.cvtColor(bayer_mosaic(source[0], args.pattern), OPENCV_DEMOSAIC[args.pattern])
+    opencv_frame = bgr_undistorter.undistort(full)
+    opencv_ms = (time.perf_counter() - start) * 1000
+
+    for name, frame in ((f"{args.pattern} superpixel", results[args.pattern]), (f"{args.pattern} OpenCV bilinear", opencv_frame)):
+        mean, p99, psnr = difference(frame, results["BGR8"])
+        print(f"{name:28s} against BGR8: mean abs diff {mean:5.2f}   p99 {p99:5.1f}   PSNR {psnr:5.1f} dB")
+    print(f"full-resolution OpenCV demosaic + remap: {opencv_ms:.1f} ms per frame")
+
+    frame_ring.close()
+    preview_ring.close()
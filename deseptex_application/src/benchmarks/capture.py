@@ -0,0 +1,80 @@
+'''
+Capture path from a device buffer into the shared frame ring, against the mock camera device.
+The legacy path copies the buffer (BufferFactory.copy), swaps RGB to BGR with cvtColor and then remaps;
+the copy-free path of CameraProcess.capture_frame with arena_source_t remaps a view on the BGR8 device buffer straight into the ring slot.
+Reports the time per frame, the memory allocated per frame (tracemalloc peak) and checks that both produce the same frame.
+Run from deseptex_application: python src/benchmarks/capture.py --frames 10
+'''
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_camera import SENSOR_IMAGE_SHAPE, synthetic_frames, make_camera
+from modules.mock_camera import mock_device_t
+from modules.frame_source import arena_source_t
+from modules.frame_ring import frame_ring_t
+from modules.settings import SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE, FRAME_RING_SLOTS
+
+
+def legacy_capture(camera, device):
+    buffer = device.get_buffer()
+    item = np.array(arena_source_t.buffer_view(buffer)) # BufferFactory.copy
+    device.requeue_buffer(buffer)
+    image = cv.cvtColor(item, cv.COLOR_BGR2RGB)
+    camera.publish_frame(image)
+
+
+def measure(capture, camera, device, frames):
+    times, peaks = [], []
+    for _ in range(frames):
+        tracemalloc.start()
+        start = time.perf_counter()
+        capture(camera, device)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    _, frame = camera.frame_ring.read()
+    return np.array(times) * 1000, max(peaks), frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--frame-shape", type=int, nargs=3, default=SENSOR_IMAGE_SHAPE, help="height width channels of the sensor frames")
+    parser.add_argument("--calibration", default="./calibration/camera_calibration.json")
+    args = parser.parse_args()
+
+    frame_shape = tuple(args.frame_shape)
+    frame_bytes = int(np.prod(frame_shape))
+    source = synthetic_frames(np.random.default_rng(0), frame_shape, 1)
+    frame_ring = frame_ring_t(SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    preview_ring = frame_ring_t(GUI_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    camera = make_camera(frame_ring, preview_ring, args.calibration, frame_shape)
+
+    results = {}
+    for name, capture, pixel_format in (("legacy", legacy_capture, "RGB8"),
+                                        ("copy-free", lambda camera, device: camera.capture_frame(), "BGR8")):
+        device = mock_device_t(source, pixel_format=pixel_format)
+        camera.frame_source = arena_source_t(device=device)
+        camera.frame_source.start()
+        capture(camera, device) # warm up
+        results[name] = measure(capture, camera, device, args.frames)
+        camera.frame_source.stop()
+        assert not device.outstanding, "every buffer must be requeued"
+
+        times, peak, _ = results[name]
+        print(f"{name:10s} p50 {np.percentile(times, 50):7.1f} ms   max {times.max():7.1f} ms   "
+              f"allocated per frame {peak / 1e6:7.1f} MB ({peak / frame_bytes:.2f} sensor frames)")
+
+    difference = np.abs(results["legacy"][2].astype(np.int16) - results["copy-free"][2].astype(np.int16)).max()
+    print(f"max pixel difference between the two paths: {difference}")
+    print(f"speedup {np.percentile(results['legacy'][0], 50) / np.percentile(results['copy-free'][0], 50):.2f}x")
+
+    frame_ring.close()
+    preview_ring.close()
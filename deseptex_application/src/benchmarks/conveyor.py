@@ -0,0 +1,159 @@
+'''
+Replay test of the hands-free conveyor mode: an image sequence is replayed through CameraProcess.capture_frame into the
+frame and preview rings, conveyor_t watches the previews with its motion trigger, snaps through a real InferenceProcess and
+sends confident results to the loopback fake cutter. Results below the thresholds are "reviewed" by a simulated operator
+who takes --review-time seconds. Reports the number of triggers against the number of garments, the timings of every
+garment and the garments per hour.
+Without --images a synthetic sequence is made: per garment an empty table, the garment sliding in, lying still for
+--still frames and sliding out again. A real sequence (--images) has to start with a few frames of the empty table.
+Run from deseptex_application: python src/benchmarks/conveyor.py --random-models --garments 5 --min-class-prob 0
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import cv2 as cv
+from multiprocessing import Event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pipeline import random_models
+from synthetic_camera import make_camera
+from processes.inference_process import InferenceProcess
+from modules.frame_ring import frame_ring_t
+from modules.frame_source import replay_source_t
+from modules.contour_store import contour_store_t
+from modules.laser_cutter import laser_cutter_t
+from modules.fake_cutter import fake_cutter_t
+from modules.motion_trigger import motion_trigger_t
+from modules.conveyor import conveyor_t
+from modules.settings import SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE, FRAME_RING_SLOTS, CONVEYOR_STABLE_FRAMES, CONVEYOR_MOTION_THRESHOLD, \
+    CONVEYOR_MIN_CLASS_PROB, CONVEYOR_MIN_SEG_CONF, classification_image_shape, segmentation_image_shape
+
+
+def garment_sequence(rng, shape, garments, still, directory):
+    '''
+    Writes the synthetic sequence as numbered PNGs to directory, returns the number of frames.
+    '''
+    table = np.full(shape, 90, dtype=np.uint8)
+    table += rng.integers(0, 12, size=shape, dtype=np.uint8)
+    frames = []
+    for _ in range(garments):
+        center = rng.uniform((shape[1] * 0.35, shape[0] * 0.35), (shape[1] * 0.65, shape[0] * 0.65))
+        axes = tuple(int(v) for v in rng.uniform(shape[0] * 0.2, shape[0] * 0.3, size=2))
+        angle = float(rng.uniform(0, 180))
+        # slides in from the left, lies still, slides out to the right
+        xs = [center[0] * f for f in (0.2, 0.5, 0.8)] + [center[0]] * still + [center[0] + (shape[1] - center[0]) * f for f in (0.5, 1.2)]
+        frames += [None, None]
+        frames += [(x, center[1], axes, angle) for x in xs]
+    frames += [None, None]
+
+    for i, garment in enumerate(frames):
+        frame = table.copy()
+        if garment is not None:
+            x, y, axes, angle = garment
+            cv.ellipse(frame, (int(x), int(y)), axes, angle, 0, 360, (20, 30, 90), -1)
+        # a little sensor noise, consecutive frames of a still table are never identical
+        noise = rng.integers(0, 3, size=(shape[0] // 8, shape[1] // 8, 1), dtype=np.uint8)
+        frame += cv.resize(noise, (shape[1], shape[0]), interpolation=cv.INTER_NEAREST)[..., None]
+        cv.imwrite(os.path.join(directory, f"frame_{i:04d}.png"), frame, [cv.IMWRITE_PNG_COMPRESSION, 1])
+    return len(frames)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="directory, video file or glob of the sequence to replay")
+    parser.add_argument("--expected", type=int, default=None, help="number of garments in --images")
+    parser.add_argument("--garments", type=int, default=5, help="number of garments in the synthetic sequence")
+    parser.add_argument("--still", type=int, default=4, help="frames a synthetic garment lies still")
+    parser.add_argument("--fps", type=float, default=0.0, help="replay rate, 0 replays as fast as the pipeline goes")
+    parser.add_argument("--review-time", type=float, default=2.0, help="seconds the simulated operator takes to review a garment")
+    parser.add_argument("--min-class-prob", type=float, default=CONVEYOR_MIN_CLASS_PROB)
+    parser.add_argument("--min-seg-conf", type=float, default=CONVEYOR_MIN_SEG_CONF)
+    parser.add_argument("--random-models", action="store_true", help="use tiny randomly initialized models instead of ./models")
+    parser.add_argument("--backend", default="pytorch")
+    parser.add_argument("--calibration", default="./calibration/camera_calibration.json")
+    parser.add_argument("--persp-matrix", default="./calibration/persp_matrix.json")
+    parser.add_argument("--port", type=int, default=29880, help="fake cutter port, replies go to port + 1")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake cutter reply latency in seconds")
+    parser.add_argument("--log", default=None, help="append the garment timings as JSON lines")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="conveyor_bench_")
+    if args.images is not None:
+        images, expected = args.images, args.expected
+    else:
+        images = os.path.join(work_dir, "sequence")
+        os.makedirs(images)
+        num_frames = garment_sequence(np.random.default_rng(0), SHARED_IMAGE_SHAPE, args.garments, args.still, images)
+        expected = args.garments
+        print(f"synthetic sequence: {num_frames} frames, {expected} garments")
+
+    if args.random_models:
+        model_paths = random_models(work_dir)
+    else:
+        model_paths = ["./models/class_pants_avant_arriere_chemises_v1_1.pt", "./models/pants_avant_v3_1.pt",
+                       "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt"]
+
+    frame_ring = frame_ring_t(SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    preview_ring = frame_ring_t(GUI_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    quit_event = Event()
+    inference_proc = InferenceProcess(frame_ring, model_paths[0], classification_image_shape, model_paths[1], model_paths[2], model_paths[3],
+                                      segmentation_image_shape, quit_event, args.backend)
+    inference_proc.start()
+
+    frame_shape = SHARED_IMAGE_SHAPE # like the test images with TESTING on
+    frame_source = replay_source_t(images, fps=args.fps, shape=frame_shape, loop=False)
+    frame_source.start()
+    camera = make_camera(frame_ring, preview_ring, args.calibration, frame_shape)
+    camera.frame_source = frame_source
+
+    with open(args.persp_matrix) as f:
+        M = np.asarray(json.load(f)["matrix"])
+    cutter = fake_cutter_t("127.0.0.1", args.port, args.port + 1, args.latency).start()
+    laser_cutter = laser_cutter_t("127.0.0.1", args.port, args.port + 1, M,
+                                  input_scale=(frame_shape[1] / GUI_IMAGE_SHAPE[1], frame_shape[0] / GUI_IMAGE_SHAPE[0]),
+                                  svg_path=os.path.join(work_dir, "test.svg"))
+    inference_proc.ready_event.wait()
+
+    # the first frame shows the empty table, like pressing "Empty table" in the GUI
+    running_event = Event()
+    running_event.set()
+    camera.capture_frame(timeout=60)
+    motion_trigger = motion_trigger_t(CONVEYOR_STABLE_FRAMES, CONVEYOR_MOTION_THRESHOLD)
+    motion_trigger.set_empty(preview_ring.read()[1])
+    conveyor = conveyor_t(frame_ring, preview_ring, inference_proc, laser_cutter, contour_store_t(), running_event, motion_trigger,
+                          args.min_class_prob, args.min_seg_conf, log_path=args.log)
+
+    try:
+        while True:
+            if running_event.is_set() and not camera.capture_frame(timeout=60):
+                break # end of the sequence
+            event = conveyor.poll()
+            if event == "review":
+                time.sleep(args.review_time)
+                conveyor.finish_review()
+            elif conveyor.state == "inferring":
+                time.sleep(0.005)
+    finally:
+        quit_event.set()
+        inference_proc.join(timeout=10)
+        frame_source.stop()
+        cutter.stop()
+        laser_cutter.close()
+        frame_ring.close()
+        preview_ring.close()
+
+    print(f"{'garment':>8s} {'outcome':>8s} {'class':>14s} {'class_prob':>10s} {'seg_conf':>8s} {'contours':>8s} {'inference':>10s} {'cut':>8s} {'review':>8s} {'total':>8s}")
+    for i, record in enumerate(conveyor.garments):
+        seg_conf = f"{record['seg_conf']:8.2f}" if record.get("seg_conf") is not None else f"{'-':>8s}"
+        print(f"{i + 1:8d} {record['outcome']:>8s} {str(record.get('class')):>14s} {record.get('class_prob', 0.0):10.2f} {seg_conf} {record['contours']:8d} "
+              f"{record['inference_s']:9.2f}s {record.get('cut_s', 0.0):7.2f}s {record.get('review_s', 0.0):7.2f}s {record['total_s']:7.2f}s")
+    summary = conveyor.summary()
+    print(json.dumps(summary, indent=1))
+    if expected is not None:
+        print(f"{len(conveyor.garments)} garments for {expected} garments, {conveyor.empty_snaps} empty-table snaps" + ("" if len(conveyor.garments) == expected else "   MISMATCH"))
+    print(f"{summary['garments_per_hour']:.0f} garments/hour, {summary['reviewed']} of {summary['cut']} reviewed")
@@ -0,0 +1,86 @@
+'''
+Line throughput with and without the cutter job queue, against the loopback fake cutter with a cut time.
+A simulated operator snaps and edits every garment for --operator-time seconds and then presses Finish. Without the queue
+Finish blocks until the cutter acknowledged the job, i.e. until the garment is cut; with the queue it returns right away
+and the operator works on the next garment while the cutter cuts. Reports how long Finish blocked and the garments per hour.
+Run from deseptex_application: python src/benchmarks/cutter_queue.py --garments 6 --operator-time 2 --cut-time 3
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.laser_cutter import laser_cutter_t
+from modules.cutter_queue import cutter_queue_t
+from modules.fake_cutter import fake_cutter_t
+from modules.settings import GUI_IMAGE_SHAPE
+
+
+def synthetic_contours(rng, count=6, points=200):
+    # closed wobbly outlines in GUI coordinates, like the contours of a garment
+    contours = []
+    for _ in range(count):
+        center = rng.uniform((100, 100), (GUI_IMAGE_SHAPE[1] - 100, GUI_IMAGE_SHAPE[0] - 100))
+        angles = np.linspace(0, 2 * np.pi, points, endpoint=False)
+        radii = rng.uniform(20, 80) * (1 + 0.1 * np.sin(angles * rng.integers(2, 6)))
+        contours.append(np.stack([center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)], axis=1).astype(np.int32))
+    return contours
+
+
+def run(args, queued, port, work_dir):
+    cutter = fake_cutter_t("127.0.0.1", port, port + 1, cut_time=args.cut_time).start()
+    with open(args.persp_matrix) as f:
+        M = np.asarray(json.load(f)["matrix"])
+    laser_cutter = laser_cutter_t("127.0.0.1", port, port + 1, M, svg_path=os.path.join(work_dir, "test.svg"), timeout=args.cut_time + 5.0, retries=0)
+    cutter_queue = cutter_queue_t(laser_cutter, job_timeout=args.cut_time + 5.0) if queued else None
+    rng = np.random.default_rng(0)
+
+    blocked = []
+    start = time.perf_counter()
+    for _ in range(args.garments):
+        time.sleep(args.operator_time) # snap, inference and edit of the next garment
+        contours = synthetic_contours(rng)
+        finish = time.perf_counter()
+        if queued:
+            cutter_queue.submit(contours)
+        else:
+            laser_cutter.prepare_svg(contours)
+            laser_cutter.start_cutter()
+            laser_cutter.send_svg_to_cutter()
+        blocked.append(time.perf_counter() - finish)
+    if queued:
+        cutter_queue.wait()
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for job in cutter_queue.jobs if job.state == "failed") if queued else 0
+    cut_files = len(set(cutter.cut_files))
+    if queued:
+        cutter_queue.close()
+    laser_cutter.close()
+    cutter.stop()
+    return {"garments_per_hour": args.garments / elapsed * 3600, "elapsed_s": elapsed, "finish_p50_s": float(np.percentile(blocked, 50)),
+            "finish_max_s": float(np.max(blocked)), "failed": failed, "distinct_files_cut": cut_files}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--garments", type=int, default=6)
+    parser.add_argument("--operator-time", type=float, default=2.0, help="seconds to snap and edit a garment")
+    parser.add_argument("--cut-time", type=float, default=3.0, help="seconds the fake cutter takes per garment")
+    parser.add_argument("--persp-matrix", default="./calibration/persp_matrix.json")
+    parser.add_argument("--port", type=int, default=29890, help="fake cutter port, replies go to port + 1 (+2 and +3 for the second run)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="cutter_queue_bench_")
+    results = {"blocking": run(args, False, args.port, work_dir), "queued": run(args, True, args.port + 2, work_dir)}
+    for mode, result in results.items():
+        print(f"{mode:9s} {result['garments_per_hour']:7.0f} garments/hour   {result['elapsed_s']:6.1f} s   Finish blocks p50 {result['finish_p50_s'] * 1000:8.1f} ms   "
+              f"max {result['finish_max_s'] * 1000:8.1f} ms   {result['distinct_files_cut']} files cut   {result['failed']} failed")
+    bound = 3600 / max(args.operator_time, args.cut_time)
+    print(f"throughput gain {results['queued']['garments_per_hour'] / results['blocking']['garments_per_hour'] - 1:+.0%}, "
+          f"the line can do at most {bound:.0f} garments/hour")
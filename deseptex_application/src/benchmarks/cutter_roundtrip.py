@@ -0,0 +1,49 @@
+'''
+Round-trip latency and failure handling of the cutter client against the loopback fake cutter.
+Run from deseptex_application: python src/benchmarks/cutter_roundtrip.py --latency 0.01 --loss 0.1
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.cutter_client import cutter_client_t
+from modules.fake_cutter import fake_cutter_t
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake cutter reply latency in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="fake cutter request loss probability")
+    parser.add_argument("--timeout", type=float, default=0.1)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--port", type=int, default=29840, help="fake cutter port, replies go to port + 1")
+    args = parser.parse_args()
+
+    cutter = fake_cutter_t("127.0.0.1", args.port, args.port + 1, args.latency, args.loss, seed=0).start()
+    client = cutter_client_t("127.0.0.1", args.port, args.port + 1, args.timeout, args.retries)
+
+    round_trips = []
+    failures = 0
+    start = time.perf_counter()
+    for i in range(args.requests):
+        message = "START" if i % 2 == 0 else "LOADFILE:../../svg/test.svg"
+        try:
+            _, _, round_trip = client.send(message)
+            round_trips.append(round_trip)
+        except TimeoutError:
+            failures += 1
+    elapsed = time.perf_counter() - start
+
+    client.close()
+    cutter.stop()
+
+    round_trips_ms = np.array(round_trips) * 1000
+    print(f"requests: {args.requests}, answered: {len(round_trips)}, failed: {failures}, dropped by cutter: {cutter.dropped}")
+    if len(round_trips_ms):
+        print(f"round trip p50 {np.percentile(round_trips_ms, 50):.2f} ms, p95 {np.percentile(round_trips_ms, 95):.2f} ms, max {round_trips_ms.max():.2f} ms")
+    print(f"total {elapsed:.2f} s, {args.requests / elapsed:.1f} requests/s")
@@ -0,0 +1,242 @@
+'''
+End-to-end latency of one garment, from a captured frame to the cutter acknowledging the SVG, driven headlessly through the real code:
+CameraProcess.publish_frame (undistort into the shared ring + GUI preview), the shared-memory read of the inference process,
+inferencer_t.run_inference and run_inference_with_postproc, the GUI rescale into the contour store, laser_cutter_t.prepare_svg
+and the UDP exchange with the loopback fake cutter.
+Frames are synthetic at the full sensor resolution unless --images is given (replayed through replay_source_t), --random-models uses tiny randomly initialized
+YOLO models instead of the production weights. The results can be saved as JSON and compared against an earlier run.
+Run from deseptex_application: python src/benchmarks/pipeline.py --random-models --output pipeline.json --baseline old.json
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import tempfile
+import numpy as np
+
+try:
+    import resource # not available on Windows, peak RSS is then not reported
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_camera import SENSOR_IMAGE_SHAPE, synthetic_frames, make_camera
+from modules.frame_ring import frame_ring_t
+from modules.inferencer import inferencer_t
+from modules.contour_store import contour_store_t
+from modules.laser_cutter import laser_cutter_t
+from modules.path_optimizer import path_optimizer_t
+from modules.fake_cutter import fake_cutter_t
+from modules.frame_source import replay_source_t
+from modules.tracer import tracer, trace_collector_t
+from modules.settings import SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE, FRAME_RING_SLOTS, CUT_SIMPLIFY_TOLERANCE_MM, CUT_OPTIMIZE_ORDER, classification_image_shape, segmentation_image_shape
+
+
+STAGES = ("capture", "handoff", "inference", "inference_postproc", "contours", "svg", "cutter", "total")
+
+
+def random_models(directory, seed=0):
+    '''
+    Writes a randomly initialized classifier and three segmentation models, returns their paths in inferencer_t argument order.
+    The segmentation heads report a box of class 1 (boutons) at every anchor, so post-processing and the SVG get real work.
+    '''
+    import torch
+    from ultralytics.nn.tasks import ClassificationModel, SegmentationModel
+
+    torch.manual_seed(seed)
+    classifier = ClassificationModel("yolov8n-cls.yaml", nc=3, verbose=False)
+    classifier.names = {0: "pants_avant", 1: "pants_arriere", 2: "chemise"}
+    paths = [os.path.join(directory, "classifier.pt")]
+    torch.save({"model": classifier.eval(), "train_args": {"task": "classify"}}, paths[0])
+
+    for name in ("pants_avant", "pants_arriere", "chemise"):
+        torch.manual_seed(seed)
+        segmenter = SegmentationModel("yolov8n-seg.yaml", nc=6, verbose=False)
+        head = segmenter.model[-1]
+        for box_branch, class_branch in zip(head.cv2, head.cv3):
+            box_branch[-1].weight.data[:] = 0.0 # same box size around every anchor
+            box_branch[-1].bias.data[:] = 0.0
+            class_branch[-1].weight.data[:] = 0.0
+            class_branch[-1].bias.data[:] = -10.0
+            class_branch[-1].bias.data[1] = 0.0
+        paths.append(os.path.join(directory, f"{name}.pt"))
+        torch.save({"model": segmenter.eval(), "train_args": {"task": "segment"}}, paths[-1])
+    return paths
+
+
+def summarize(timings):
+    summary = {}
+    for stage, samples in timings.items():
+        samples_ms = np.array(samples) * 1000
+        summary[stage] = {"p50_ms": float(np.percentile(samples_ms, 50)),
+                          "p95_ms": float(np.percentile(samples_ms, 95)),
+                          "max_ms": float(samples_ms.max())}
+    return summary
+
+
+def compare(results, baseline, threshold):
+    '''
+    Returns the regressions of results against baseline: stages whose p50 got slower than threshold
+    (a fraction, 0.1 = 10%) and a drop in throughput of more than threshold.
+    '''
+    regressions = []
+    for stage, stats in results["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+        before, after = baseline["stages"][stage]["p50_ms"], stats["p50_ms"]
+        change = after / before - 1 if before > 0 else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{stage:20s} p50 {before:9.1f} -> {after:9.1f} ms  {change:+7.1%}  {flag}")
+        if flag:
+            regressions.append(stage)
+    before, after = baseline["garments_per_min"], results["garments_per_min"]
+    if before > 0 and after < before * (1 - threshold):
+        regressions.append("garments_per_min")
+    print(f"{'garments/min':20s}     {before:9.2f} -> {after:9.2f}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2, help="iterations that are run but not counted")
+    parser.add_argument("--images", default=None, help="directory, video file or glob of images, e.g. './data/test_*.png', instead of synthetic frames")
+    parser.add_argument("--frame-shape", type=int, nargs=3, default=SENSOR_IMAGE_SHAPE, help="height width channels of the synthetic frames")
+    parser.add_argument("--random-models", action="store_true", help="use tiny randomly initialized models instead of ./models")
+    parser.add_argument("--backend", default="pytorch")
+    parser.add_argument("--calibration", default="./calibration/camera_calibration.json")
+    parser.add_argument("--persp-matrix", default="./calibration/persp_matrix.json")
+    parser.add_argument("--port", type=int, default=29850, help="fake cutter port, replies go to port + 1")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake cutter reply latency in seconds")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON of an earlier run to compare against")
+    parser.add_argument("--trace", default=None, help="record the spans of all stages and write them as Chrome trace JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown against the baseline, 0.1 = 10%%")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.trace is not None:
+        trace_collector = trace_collector_t()
+        tracer.configure("benchmark", trace_collector.queue, enabled=True)
+    work_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    if args.images is not None:
+        frame_source = replay_source_t(args.images)
+        frame_source.start()
+        frame_shape = frame_source.get_frame(timeout=60)[0].shape
+    else:
+        frames = synthetic_frames(rng, tuple(args.frame_shape), 3)
+        frame_shape = frames[0].shape
+
+    if args.random_models:
+        model_paths = random_models(work_dir)
+    else:
+        model_paths = ["./models/class_pants_avant_arriere_chemises_v1_1.pt", "./models/pants_avant_v3_1.pt",
+                       "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt"]
+
+    frame_ring = frame_ring_t(SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    preview_ring = frame_ring_t(GUI_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    start = time.perf_counter()
+    camera = make_camera(frame_ring, preview_ring, args.calibration, frame_shape)
+    if args.images is not None:
+        camera.frame_source = frame_source
+    print(f"undistortion maps for {frame_shape[1]}x{frame_shape[0]}: {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    inferencer = inferencer_t(model_paths[0], classification_image_shape, model_paths[1], model_paths[2], model_paths[3], segmentation_image_shape, args.backend)
+    inferencer.warm_up(SHARED_IMAGE_SHAPE)
+    for class_name in inferencer.unloaded_classes():
+        inferencer.preload(class_name, SHARED_IMAGE_SHAPE)
+    print(f"models loaded and warmed up: {time.perf_counter() - start:.1f} s")
+
+    with open(args.persp_matrix) as f:
+        M = np.asarray(json.load(f)["matrix"])
+    cutter = fake_cutter_t("127.0.0.1", args.port, args.port + 1, args.latency).start()
+    laser_cutter = laser_cutter_t("127.0.0.1", args.port, args.port + 1, M,
+                                  input_scale=(frame_shape[1] / GUI_IMAGE_SHAPE[1], frame_shape[0] / GUI_IMAGE_SHAPE[0]),
+                                  svg_path=os.path.join(work_dir, "test.svg"),
+                                  path_optimizer=path_optimizer_t(CUT_SIMPLIFY_TOLERANCE_MM, CUT_OPTIMIZE_ORDER))
+    contour_data = contour_store_t()
+
+    timings = {stage: [] for stage in STAGES}
+    contour_counts = []
+    for i in range(args.warmup + args.iterations):
+        times = {}
+        begin = time.perf_counter()
+        if args.images is not None:
+            camera.capture_frame()
+        else:
+            camera.publish_frame(frames[i % len(frames)])
+        times["capture"] = time.perf_counter() - begin
+
+        start = time.perf_counter()
+        seq, image = frame_ring.read(frame_ring.latest_seq())
+        times["handoff"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        inferencer.run_inference(image)
+        times["inference"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        contours = inferencer.run_inference_with_postproc(image)
+        times["inference_postproc"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        contour_data.set_contours(contours)
+        contour_data.scale(GUI_IMAGE_SHAPE[1] / SHARED_IMAGE_SHAPE[1], GUI_IMAGE_SHAPE[0] / SHARED_IMAGE_SHAPE[0])
+        times["contours"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        laser_cutter.prepare_svg(contour_data)
+        times["svg"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        laser_cutter.start_cutter()
+        laser_cutter.send_svg_to_cutter()
+        times["cutter"] = time.perf_counter() - start
+
+        # a garment is snapped once, the bare inference stage is measured on top of it
+        times["total"] = time.perf_counter() - begin - times["inference"]
+        if i >= args.warmup:
+            for stage in STAGES:
+                timings[stage].append(times[stage])
+            contour_counts.append(len(contours))
+
+    laser_cutter.close()
+    cutter.stop()
+    if args.images is not None:
+        frame_source.stop()
+    contour_data.close()
+    frame_ring.close()
+    preview_ring.close()
+    shutil.rmtree(work_dir, ignore_errors=True)
+    if args.trace is not None:
+        tracer.flush()
+        trace_collector.drain(timeout=0.5)
+        trace_collector.export_chrome(args.trace)
+        print(trace_collector.report())
+
+    results = {"config": {"iterations": args.iterations, "frame_shape": list(frame_shape), "images": args.images,
+                          "random_models": args.random_models, "backend": args.backend},
+               "stages": summarize(timings),
+               "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource is not None else None, # kilobytes on Linux
+               "garments_per_min": 60.0 / float(np.mean(timings["total"])),
+               "contours_per_garment": float(np.mean(contour_counts))}
+
+    for stage, stats in results["stages"].items():
+        print(f"{stage:20s} p50 {stats['p50_ms']:9.1f} ms   p95 {stats['p95_ms']:9.1f} ms   max {stats['max_ms']:9.1f} ms")
+    print(f"peak RSS {results['peak_rss_mb'] or 0:.0f} MB, {results['garments_per_min']:.1f} garments/min, {results['contours_per_garment']:.0f} contours per garment")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"regressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
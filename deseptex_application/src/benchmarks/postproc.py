@@ -0,0 +1,86 @@
+'''
+Equivalence and speed of the post-processing modes against the legacy full-resolution path.
+Synthetic button/rivet-sized polygons are scattered over a SHARED_IMAGE_SHAPE frame, every mode with
+the rect kernel must reproduce the legacy contours within the IoU tolerance. The disk kernel changes the
+margin shape on purpose, its IoU is reported but not checked.
+Run from deseptex_application: python src/benchmarks/postproc.py
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.postprocessor import postprocessor_t
+from modules.settings import SHARED_IMAGE_SHAPE
+
+
+def synthetic_polygons(rng, image_shape, count):
+    polygons = []
+    for _ in range(count):
+        center = rng.uniform((50, 50), (image_shape[1] - 50, image_shape[0] - 50))
+        axes = rng.uniform(5, 40, size=2)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, size=int(rng.integers(8, 40))))
+        polygons.append(np.stack((center[0] + axes[0] * np.cos(angles), center[1] + axes[1] * np.sin(angles)), axis=1).astype(np.float32))
+    return polygons
+
+
+def contour_mask(contours, image_shape):
+    mask = np.zeros(image_shape[:2], dtype=np.uint8)
+    if len(contours):
+        cv.fillPoly(mask, [np.round(np.asarray(c)).astype(np.int32) for c in contours], 255) #type: ignore
+    return mask > 0
+
+
+def iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else np.logical_and(a, b).sum() / union
+
+
+def time_process(postprocessor, polygons, image_shape, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        contours = postprocessor.process(polygons, image_shape)
+    return (time.perf_counter() - start) / repeats * 1000, contours
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--polygons", type=int, default=12, help="detections per frame")
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-iou", type=float, default=0.95)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    image_shape = SHARED_IMAGE_SHAPE
+    legacy = postprocessor_t("legacy")
+    candidates = {f"{mode}/{kernel}": postprocessor_t(mode, kernel) for mode in ("crop", "mask") for kernel in ("rect", "disk")}
+
+    timings = {name: [] for name in ["legacy", *candidates]}
+    ious = {name: [] for name in candidates}
+    for _ in range(args.frames):
+        polygons = synthetic_polygons(rng, image_shape, args.polygons)
+        legacy_ms, legacy_contours = time_process(legacy, polygons, image_shape, args.repeats)
+        timings["legacy"].append(legacy_ms)
+        legacy_mask = contour_mask(legacy_contours, image_shape)
+        for name, postprocessor in candidates.items():
+            ms, contours = time_process(postprocessor, polygons, image_shape, args.repeats)
+            timings[name].append(ms)
+            ious[name].append(iou(legacy_mask, contour_mask(contours, image_shape)))
+
+    legacy_ms = np.mean(timings["legacy"])
+    print(f"{'mode':<16}{'ms':>10}{'speedup':>10}{'min IoU':>10}")
+    print(f"{'legacy':<16}{legacy_ms:>10.2f}{1:>10.1f}{1:>10.4f}")
+    failed = False
+    for name in candidates:
+        ms = np.mean(timings[name])
+        min_iou = min(ious[name])
+        checked = name.endswith("rect")
+        failed |= checked and min_iou < args.min_iou
+        print(f"{name:<16}{ms:>10.2f}{legacy_ms / ms:>10.1f}{min_iou:>10.4f}{'' if checked else '   (not checked)'}")
+    print("FAILED: a mode is outside the IoU tolerance" if failed else "all rect modes within the IoU tolerance")
+    sys.exit(1 if failed else 0)
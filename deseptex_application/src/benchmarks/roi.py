@@ -0,0 +1,101 @@
+'''
+Segmentation on the full frame against segmentation on the garment crop found by the garment locator.
+Reports the inference latency, the number of detections and the number of cutting contours for both.
+Without --images, synthetic garments with buttons are put on a textured table whose empty image is the reference;
+with --images, --reference is the image of the empty table taken with the same camera setup.
+Run from deseptex_application: python src/benchmarks/roi.py --random-models
+'''
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pipeline import random_models
+from modules.inferencer import inferencer_t
+from modules.garment_locator import garment_locator_t
+from modules.settings import SHARED_IMAGE_SHAPE, classification_image_shape, segmentation_image_shape
+
+
+def synthetic_scene(rng, shape, count):
+    # textured table, then a garment with a few buttons at a random place on it
+    table = np.full(shape, 90, dtype=np.uint8)
+    table += rng.integers(0, 12, size=shape, dtype=np.uint8)
+    frames = []
+    for _ in range(count):
+        frame = table.copy()
+        center = rng.uniform((shape[1] * 0.3, shape[0] * 0.3), (shape[1] * 0.7, shape[0] * 0.7))
+        axes = rng.uniform(shape[0] * 0.1, shape[0] * 0.25, size=2)
+        cv.ellipse(frame, tuple(int(v) for v in center), tuple(int(v) for v in axes), float(rng.uniform(0, 180)), 0, 360, (40, 60, 160), -1)
+        for _ in range(6):
+            button = center + rng.uniform(-0.6, 0.6, size=2) * axes
+            cv.circle(frame, tuple(int(v) for v in button), 8, (230, 230, 230), -1)
+        frames.append(frame)
+    return table, frames
+
+
+def run(inferencer, frame):
+    start = time.perf_counter()
+    result, relevant_indices = inferencer.run_inference(frame)
+    elapsed = time.perf_counter() - start
+    detections = 0 if result is None or result.boxes is None else len(result.boxes)
+    contours = []
+    if result is not None and result.masks is not None:
+        contours = inferencer.postprocessor.process(inferencer.relevant_polygons(result, relevant_indices, inferencer.roi), frame.shape)
+    return elapsed * 1000, detections, len(contours)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="glob of frames at SHARED_IMAGE_SHAPE, e.g. './data/test_*.png'")
+    parser.add_argument("--reference", default=None, help="image of the empty table, required with --images")
+    parser.add_argument("--frames", type=int, default=5, help="number of synthetic frames")
+    parser.add_argument("--random-models", action="store_true", help="use tiny randomly initialized models instead of ./models")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.images is not None:
+        if args.reference is None:
+            sys.exit("--reference is required with --images")
+        reference = cv.imread(args.reference)
+        frames = [cv.imread(path) for path in sorted(glob.glob(args.images))]
+    else:
+        reference, frames = synthetic_scene(np.random.default_rng(0), SHARED_IMAGE_SHAPE, args.frames)
+
+    if args.random_models:
+        model_paths = random_models(tempfile.mkdtemp(prefix="roi_bench_"))
+    else:
+        model_paths = ["./models/class_pants_avant_arriere_chemises_v1_1.pt", "./models/pants_avant_v3_1.pt",
+                       "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt"]
+    locator = garment_locator_t()
+    locator.set_reference(reference)
+    inferencer = inferencer_t(model_paths[0], classification_image_shape, model_paths[1], model_paths[2], model_paths[3], segmentation_image_shape,
+                              garment_locator=locator)
+    inferencer.warm_up(reference.shape)
+    for class_name in inferencer.unloaded_classes():
+        inferencer.preload(class_name, reference.shape)
+
+    start = time.perf_counter()
+    for _ in range(10):
+        locator.locate(frames[0])
+    print(f"locate: {(time.perf_counter() - start) * 100:.1f} ms per frame")
+
+    totals = {"full": [], "roi": []}
+    for i, frame in enumerate(frames):
+        row = []
+        for name, garment_locator in (("full", None), ("roi", locator)):
+            inferencer.garment_locator = garment_locator
+            runs = [run(inferencer, frame) for _ in range(args.repeats)]
+            latency = float(np.median([r[0] for r in runs]))
+            totals[name].append(latency)
+            row.append(f"{name} {latency:7.1f} ms {runs[-1][1]:4d} detections {runs[-1][2]:3d} contours")
+        roi = inferencer.roi
+        area = 1.0 if roi is None else (roi[2] - roi[0]) * (roi[3] - roi[1]) / (frame.shape[0] * frame.shape[1])
+        print(f"frame {i}: " + "   ".join(row) + f"   crop {area:.0%} of the frame")
+
+    print(f"median latency full {np.median(totals['full']):.1f} ms, roi {np.median(totals['roi']):.1f} ms")
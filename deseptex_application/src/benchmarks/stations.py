@@ -0,0 +1,124 @@
+'''
+Load generator for the shared inference server (src/inference_server.py): simulated stations snap synthetic frames through
+inference_client_t, each from its own frame ring in shared memory like main.py does. A station snaps, waits for the contours
+and then handles the garment for about --think seconds before the next snap.
+For every number of stations in --stations the snaps per minute, the latency seen by the stations and the busy fraction
+and batch sizes of the server are reported, to find how many tables one machine keeps busy.
+Run from deseptex_application: python src/benchmarks/stations.py --random-models --stations 1 2 4 --duration 60 --think 5
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pipeline import random_models
+from synthetic_camera import synthetic_frames
+from modules.frame_ring import frame_ring_t
+from modules.inference_client import inference_client_t
+from modules.settings import SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS, INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY
+
+
+def station(name, frames, address, think, deadline, latencies, seed):
+    rng = np.random.default_rng(seed)
+    frame_ring = frame_ring_t(SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    client = inference_client_t(frame_ring, name, address, INFERENCE_SERVER_AUTHKEY)
+    client.start()
+    client.ready_event.wait()
+    i = 0
+    while time.perf_counter() < deadline:
+        seq = frame_ring.write(frames[i % len(frames)])
+        i += 1
+        start = time.perf_counter()
+        request_id = client.submit(seq)
+        while client.poll(request_id) is None:
+            time.sleep(0.002)
+        latencies.append(time.perf_counter() - start)
+        # the operator handles the garment, jittered so the stations do not snap in lockstep
+        time.sleep(think * rng.uniform(0.5, 1.5))
+    client.close()
+    frame_ring.close()
+
+
+def server_counters(monitor):
+    stats = monitor.server_stats()
+    return stats["busy_fraction"] * stats["uptime_s"], stats["batch_sizes"]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, nargs="+", default=[1, 2, 4], help="numbers of simulated stations to run, one after the other")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per number of stations")
+    parser.add_argument("--think", type=float, default=5.0, help="mean seconds between getting the contours and the next snap of a station")
+    parser.add_argument("--max-latency", type=float, default=5.0, help="snap latency (p95, seconds) that still keeps a table busy")
+    parser.add_argument("--random-models", action="store_true", help="use tiny randomly initialized models instead of ./models")
+    parser.add_argument("--max-batch", type=int, default=None)
+    parser.add_argument("--batch-window", type=float, default=None)
+    parser.add_argument("--port", type=int, default=29870)
+    args = parser.parse_args()
+
+    # the server runs as its own program, like in production, the result cache would hide the repeated frames
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inference_server.py"),
+               "--port", str(args.port), "--no-cache", "--stats-interval", "1e9"]
+    if args.random_models:
+        command += ["--models", *random_models(tempfile.mkdtemp(prefix="stations_bench_"))]
+    if args.max_batch is not None:
+        command += ["--max-batch", str(args.max_batch)]
+    if args.batch_window is not None:
+        command += ["--batch-window", str(args.batch_window)]
+    server = subprocess.Popen(command)
+    address = (INFERENCE_SERVER_ADDRESS[0], args.port)
+
+    rng = np.random.default_rng(0)
+    frames = synthetic_frames(rng, SHARED_IMAGE_SHAPE, 4)
+    monitor_ring = frame_ring_t((1, 1, 3), 1)
+    monitor = inference_client_t(monitor_ring, "monitor", address, INFERENCE_SERVER_AUTHKEY, connect_timeout=600.0)
+    monitor.start()
+    monitor.ready_event.wait()
+
+    rows = []
+    try:
+        for count in args.stations:
+            busy_before, batches_before = server_counters(monitor)
+            latencies = [[] for _ in range(count)]
+            start = time.perf_counter()
+            deadline = start + args.duration
+            threads = [threading.Thread(target=station, args=(f"station{i}", frames[i % len(frames):] + frames[:i % len(frames)], address,
+                                                              args.think, deadline, latencies[i], i))
+                       for i in range(count)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            busy_after, batches_after = server_counters(monitor)
+
+            batches = {size: batches_after.get(size, 0) - batches_before.get(size, 0) for size in batches_after}
+            num_batches = sum(batches.values())
+            all_latencies = np.concatenate([np.array(l) for l in latencies])
+            rows.append({"stations": count,
+                         "snaps_per_min": len(all_latencies) / elapsed * 60,
+                         "p50_s": float(np.percentile(all_latencies, 50)),
+                         "p95_s": float(np.percentile(all_latencies, 95)),
+                         "worst_station_p95_s": max(float(np.percentile(l, 95)) for l in latencies),
+                         "busy": (busy_after - busy_before) / elapsed,
+                         "mean_batch": sum(size * n for size, n in batches.items()) / max(num_batches, 1)})
+            row = rows[-1]
+            print(f"{count:3d} stations: {row['snaps_per_min']:7.1f} snaps/min   latency p50 {row['p50_s']:6.2f} s   p95 {row['p95_s']:6.2f} s   "
+                  f"worst station p95 {row['worst_station_p95_s']:6.2f} s   server busy {row['busy']:5.0%}   mean batch {row['mean_batch']:.2f}")
+    finally:
+        monitor.close()
+        monitor_ring.close()
+        server.terminate()
+        server.wait()
+
+    kept_busy = [row["stations"] for row in rows if row["p95_s"] <= args.max_latency]
+    if kept_busy:
+        print(f"one server keeps {max(kept_busy)} tables busy with a snap p95 below {args.max_latency:.1f} s at {args.think:.1f} s per garment")
+    else:
+        print(f"no configuration kept the snap p95 below {args.max_latency:.1f} s")
@@ -0,0 +1,40 @@
+'''
+Synthetic sensor frames and a CameraProcess that is never started, shared by the benchmarks.
+Only the capture side is imported here, so the capture benchmarks run without torch and ultralytics.
+'''
+import numpy as np
+import cv2 as cv
+from multiprocessing import Event
+
+from processes.camera_process import CameraProcess
+from modules.undistorter import undistorter_t
+from modules.settings import SHARED_IMAGE_SHAPE, UNDISTORT_INTERPOLATION
+
+
+SENSOR_IMAGE_SHAPE = (5588, 8232, 3) # ORIGINAL_IMAGE_SHAPE with TESTING off
+
+
+def synthetic_frames(rng, shape, count):
+    # grey table with a few textured garment-like blobs, generated once and cycled
+    frames = []
+    for _ in range(count):
+        frame = np.full(shape, 90, dtype=np.uint8)
+        for _ in range(4):
+            center = tuple(int(v) for v in rng.uniform((shape[1] * 0.2, shape[0] * 0.2), (shape[1] * 0.8, shape[0] * 0.8)))
+            axes = tuple(int(v) for v in rng.uniform(shape[0] * 0.05, shape[0] * 0.3, size=2))
+            color = tuple(int(v) for v in rng.integers(0, 255, size=3))
+            cv.ellipse(frame, center, axes, float(rng.uniform(0, 180)), 0, 360, color, -1)
+        noise = rng.integers(0, 16, size=(shape[0] // 8, shape[1] // 8, 1), dtype=np.uint8)
+        frame += cv.resize(noise, (shape[1], shape[0]), interpolation=cv.INTER_NEAREST)[..., None]
+        frames.append(frame)
+    return frames
+
+
+def make_camera(frame_ring, preview_ring, calibration_path, frame_shape):
+    # a CameraProcess that is never started, publish_frame runs in this process
+    camera = CameraProcess(frame_ring, preview_ring, calibration_path, Event(), Event())
+    camera.load_calibration()
+    camera.newcameramtx, _ = cv.getOptimalNewCameraMatrix(camera.mtx, camera.dist, (frame_shape[1], frame_shape[0]), 1, (SHARED_IMAGE_SHAPE[1], SHARED_IMAGE_SHAPE[0]))
+    camera.undistorter = undistorter_t(camera.mtx, camera.dist, camera.newcameramtx, frame_shape, SHARED_IMAGE_SHAPE, None, UNDISTORT_INTERPOLATION)
+    camera.preview_scratch = np.empty(preview_ring.shape, dtype=np.uint8)
+    return camera
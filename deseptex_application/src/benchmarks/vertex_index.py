@@ -0,0 +1,67 @@
+'''
+Hit-test latency of the vertex index used by the GUI edit mode, against the linear scan it replaced.
+Run from deseptex_application: python src/benchmarks/vertex_index.py --vertices 50000
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.vertex_index import vertex_index_t
+from modules.settings import GUI_IMAGE_SHAPE
+
+
+def linear_scan(contours, x, y, threshold):
+    for poly_idx, contour in enumerate(contours):
+        for pt_idx, (px, py) in enumerate(contour):
+            if (x - px)**2 + (y - py)**2 <= threshold**2:
+                return (poly_idx, pt_idx)
+    return None
+
+
+def percentiles_us(samples):
+    samples = np.array(samples) * 1e6
+    return f"p50 {np.percentile(samples, 50):8.1f} us   p99 {np.percentile(samples, 99):8.1f} us   max {samples.max():8.1f} us"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vertices", type=int, default=50000)
+    parser.add_argument("--polygons", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    height, width = GUI_IMAGE_SHAPE[:2]
+    contours = [rng.integers(0, (width, height), size=(args.vertices // args.polygons, 2)).astype(np.int32) for _ in range(args.polygons)]
+    queries = rng.uniform(0, (width, height), size=(args.queries, 2))
+
+    start = time.perf_counter()
+    index = vertex_index_t(args.threshold)
+    index.build(contours)
+    print(f"build: {(time.perf_counter() - start) * 1000:.1f} ms for {sum(len(c) for c in contours)} vertices")
+
+    index_times, scan_times = [], []
+    for x, y in queries:
+        start = time.perf_counter()
+        index.nearest(x, y, args.threshold)
+        index_times.append(time.perf_counter() - start)
+    for x, y in queries[:200]:
+        start = time.perf_counter()
+        linear_scan(contours, x, y, args.threshold)
+        scan_times.append(time.perf_counter() - start)
+
+    drag_times = []
+    for x, y in queries:
+        start = time.perf_counter()
+        index.move_vertex(0, 0, x, y)
+        drag_times.append(time.perf_counter() - start)
+
+    print(f"index hit-test:  {percentiles_us(index_times)}")
+    print(f"linear scan:     {percentiles_us(scan_times)}")
+    print(f"drag update:     {percentiles_us(drag_times)}")
+    print(f"one frame at 60 Hz is {1e6 / 60:.0f} us")
@@ -0,0 +1,82 @@
+'''
+Exports the models to a CPU inference backend and compares it against PyTorch.
+For every model the latency of both backends is reported, the parity check runs the full
+inferencer (classifier, segmentation, post-processing) and compares the resulting contours.
+Run from deseptex_application: python src/export_models.py --backend onnx --images "./data/test_*.png"
+'''
+import glob
+import time
+import argparse
+import numpy as np
+import cv2 as cv
+
+from modules.inferencer import inferencer_t
+from modules.model_export import BACKENDS
+from modules.settings import classification_image_shape, segmentation_image_shape
+
+
+MODEL_PATHS = ("./models/class_pants_avant_arriere_chemises_v1_1.pt", "./models/pants_avant_v3_1.pt", "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt")
+
+
+def contour_mask(contours, shape):
+    mask = np.zeros(shape[:2], dtype=np.uint8)
+    if len(contours):
+        cv.fillPoly(mask, [np.asarray(c, dtype=np.int32) for c in contours], 255) #type: ignore
+    return mask
+
+
+def contour_iou(reference, candidate, shape):
+    reference_mask = contour_mask(reference, shape) > 0
+    candidate_mask = contour_mask(candidate, shape) > 0
+    union = np.logical_or(reference_mask, candidate_mask).sum()
+    if union == 0:
+        return 1.0
+    return np.logical_and(reference_mask, candidate_mask).sum() / union
+
+
+def time_model(model, images, imgsz, repeats):
+    model.predict(images[0], imgsz=imgsz, verbose=False) # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for image in images:
+            model.predict(image, imgsz=imgsz, verbose=False)
+    return (time.perf_counter() - start) / (repeats * len(images)) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=BACKENDS[1:], default="onnx")
+    parser.add_argument("--images", default="./data/test_*.png", help="glob of frames for the parity check and the latency comparison")
+    parser.add_argument("--calibration-frames", default=None, help="directory of saved frames for INT8 calibration")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-iou", type=float, default=0.98, help="minimum contour IoU to call the backend equivalent")
+    args = parser.parse_args()
+
+    images = [cv.imread(path) for path in sorted(glob.glob(args.images))]
+    if not images:
+        raise SystemExit(f"No images found for '{args.images}'")
+
+    reference = inferencer_t(MODEL_PATHS[0], classification_image_shape, *MODEL_PATHS[1:], segmentation_image_shape)
+    candidate = inferencer_t(MODEL_PATHS[0], classification_image_shape, *MODEL_PATHS[1:], segmentation_image_shape,
+                             backend=args.backend, calibration_frames=args.calibration_frames)
+
+    # latency per model
+    print(f"{'model':<55}{'pytorch ms':>12}{args.backend + ' ms':>18}")
+    reference_ms = time_model(reference.classifier_model, images, classification_image_shape, args.repeats)
+    candidate_ms = time_model(candidate.classifier_model, images, classification_image_shape, args.repeats)
+    print(f"{'classifier':<55}{reference_ms:>12.1f}{candidate_ms:>18.1f}")
+    for class_name in reference.segmentation_model_paths:
+        reference_ms = time_model(reference.get_segmentation_model(class_name), images, segmentation_image_shape, args.repeats)
+        candidate_ms = time_model(candidate.get_segmentation_model(class_name), images, segmentation_image_shape, args.repeats)
+        print(f"{class_name:<55}{reference_ms:>12.1f}{candidate_ms:>18.1f}")
+
+    # parity of the final contours
+    ious = []
+    for image in images:
+        reference_contours = reference.run_inference_with_postproc(image)
+        candidate_contours = candidate.run_inference_with_postproc(image)
+        ious.append(contour_iou(reference_contours, candidate_contours, image.shape))
+        print(f"contours pytorch {len(reference_contours)}, {args.backend} {len(candidate_contours)}, IoU {ious[-1]:.4f}")
+
+    equivalent = min(ious) >= args.min_iou
+    print(f"min IoU {min(ious):.4f}: {args.backend} is {'equivalent' if equivalent else 'NOT equivalent'} to pytorch")
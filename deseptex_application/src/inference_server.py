@@ -0,0 +1,60 @@
+'''
+Shared inference server for several stations (cutting tables) on one machine, each station runs main.py with
+INFERENCE_SERVER = True and its own STATION_NAME. The models are loaded once here instead of once per station.
+Run from deseptex_application: python src/inference_server.py
+'''
+import os
+import time
+import argparse
+from functools import partial
+
+from modules.inferencer import inferencer_t
+from modules.inference_server import inference_server_t
+from modules.result_cache import result_cache_t
+from modules.model_export import BACKENDS
+from modules.settings import (SHARED_IMAGE_SHAPE, INFERENCE_BACKEND, CALIBRATION_FRAMES_DIR, INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY, INFERENCE_MAX_BATCH, INFERENCE_BATCH_WINDOW,
+                              RESULT_CACHE, RESULT_CACHE_MB, RESULT_CACHE_THRESHOLD, RESULT_CACHE_MIN_IOU, RESULT_CACHE_DISK_PATH, RESULT_CACHE_DISK_MB,
+                              classification_image_shape, segmentation_image_shape)
+
+
+MODEL_PATHS = ("./models/class_pants_avant_arriere_chemises_v1_1.pt", "./models/pants_avant_v3_1.pt", "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt")
+
+
+def station_result_cache(context, station):
+    # one cache per station, on disk in a directory of its own
+    disk_path = os.path.join(RESULT_CACHE_DISK_PATH, station) if RESULT_CACHE_DISK_PATH is not None else None
+    return result_cache_t(context, RESULT_CACHE_MB, RESULT_CACHE_THRESHOLD, RESULT_CACHE_MIN_IOU, disk_path=disk_path, disk_mb=RESULT_CACHE_DISK_MB)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=INFERENCE_SERVER_ADDRESS[1])
+    parser.add_argument("--backend", choices=BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument("--calibration-frames", default=CALIBRATION_FRAMES_DIR, help="directory of saved frames for INT8 calibration")
+    parser.add_argument("--models", nargs=4, default=MODEL_PATHS, metavar=("CLASSIFIER", "PANTS_AVANT", "PANTS_ARRIERE", "CHEMISES"))
+    parser.add_argument("--max-batch", type=int, default=INFERENCE_MAX_BATCH)
+    parser.add_argument("--batch-window", type=float, default=INFERENCE_BATCH_WINDOW, help="seconds a snap waits for others to batch with")
+    parser.add_argument("--no-cache", action="store_true", help="disable the result cache, e.g. for load tests that repeat frames")
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="seconds between the latency reports")
+    args = parser.parse_args()
+
+    import torch
+    torch.set_num_threads(os.cpu_count() or 1)
+
+    # every segmentation model is loaded up front, the stations snap all garment classes
+    start = time.perf_counter()
+    inferencer = inferencer_t(args.models[0], classification_image_shape, args.models[1], args.models[2], args.models[3], segmentation_image_shape, args.backend, args.calibration_frames)
+    inferencer.warm_up(SHARED_IMAGE_SHAPE)
+    for class_name in inferencer.unloaded_classes():
+        inferencer.preload(class_name, SHARED_IMAGE_SHAPE)
+    make_result_cache = partial(station_result_cache, inferencer.result_context()) if RESULT_CACHE and not args.no_cache else None
+    print(f"Models ready after {time.perf_counter() - start:.1f} s")
+
+    server = inference_server_t(inferencer, (INFERENCE_SERVER_ADDRESS[0], args.port), INFERENCE_SERVER_AUTHKEY, args.max_batch, args.batch_window, make_result_cache).start()
+    try:
+        server.serve(stats_interval=args.stats_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(server.report())
+        server.close()
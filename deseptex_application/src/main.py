@@ -1,58 +1,96 @@
+import os
 import json
-import cv2 as cv
+import time
 import tkinter as tk
 import numpy as np
-from multiprocessing import Array, Lock, Manager, Event
+from multiprocessing import Event
 
 from modules.gui import gui_t
-from modules.inferencer import inferencer_t
 from modules.laser_cutter import laser_cutter_t
+from modules.cutter_queue import cutter_queue_t
+from modules.snapshot_archive import snapshot_archive_t
+from modules.path_optimizer import path_optimizer_t
+from modules.frame_ring import frame_ring_t
+from modules.contour_store import contour_store_t
+from modules.tracer import tracer, trace_collector_t
 from processes.camera_process import CameraProcess
+from processes.inference_process import InferenceProcess
+from modules.inference_client import inference_client_t
 
-from modules.settings import ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE, classification_image_shape, segmentation_image_shape
-
-import ctypes
+from modules.settings import ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE, FRAME_RING_SLOTS, CUTTER_TIMEOUT, CUTTER_RETRIES, CUTTER_MATCH_REPLIES, CUTTER_QUEUE, CUTTER_JOB_TIMEOUT, CUTTER_KEEP_SVGS, ARCHIVE, ARCHIVE_PATH, ARCHIVE_CODEC, ARCHIVE_QUEUE, ARCHIVE_DISK_MB, TESTING, CUT_SIMPLIFY_TOLERANCE_MM, CUT_OPTIMIZE_ORDER, INFERENCE_BACKEND, CALIBRATION_FRAMES_DIR, INFERENCE_SERVER, INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY, STATION_NAME, TRACING, TRACE_PATH, classification_image_shape, segmentation_image_shape
 
 if __name__ == '__main__':
     import multiprocessing
     multiprocessing.set_start_method('spawn')
+    startup_time = time.perf_counter()
 
-    
+    # spans of every process end up in the collector of this process
+    trace_collector = trace_collector_t()
+    tracer.configure("main", trace_collector.queue)
 
     # Initialize shared memory
-    shared_array = Array(ctypes.c_uint8, int(np.prod(SHARED_IMAGE_SHAPE)))
-    lock = Lock()
-    manager = Manager()
-    contour_data = manager.list()
+    frame_ring = frame_ring_t(SHARED_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    preview_ring = frame_ring_t(GUI_IMAGE_SHAPE, FRAME_RING_SLOTS)
+    contour_data = contour_store_t() # only the GUI process edits the contours, no manager round trips needed
     running_event = Event()
     running_event.set()
     quit_event = Event()
     quit_event.clear()
     
-    # Initialize camera calibration
-    with open("./calibration/camera_calibration.json") as f:
-        calibration_dict = json.load(f)
-    mtx = np.asarray(calibration_dict["mtx"])
-    dist = np.asarray(calibration_dict["dist"])
-    newcameramtx, _ = cv.getOptimalNewCameraMatrix(mtx, dist, (ORIGINAL_IMAGE_SHAPE[1],ORIGINAL_IMAGE_SHAPE[0]), 1, (SHARED_IMAGE_SHAPE[1],SHARED_IMAGE_SHAPE[0]))
-    
     # Initialize cutter machine
     with open("./calibration/persp_matrix.json") as f:
         persp_matrix_dict = json.load(f)
     M = np.asarray(persp_matrix_dict["matrix"])
-    laser_cutter = laser_cutter_t("127.0.0.1", 19840, 19841, M)
+    laser_cutter = laser_cutter_t("127.0.0.1", 19840, 19841, M,
+                                  input_scale=(ORIGINAL_IMAGE_SHAPE[1] / GUI_IMAGE_SHAPE[1], ORIGINAL_IMAGE_SHAPE[0] / GUI_IMAGE_SHAPE[0]),
+                                  timeout=CUTTER_TIMEOUT, retries=CUTTER_RETRIES, match_replies=CUTTER_MATCH_REPLIES,
+                                  path_optimizer=path_optimizer_t(CUT_SIMPLIFY_TOLERANCE_MM, CUT_OPTIMIZE_ORDER))
+    cutter_queue = cutter_queue_t(laser_cutter, CUTTER_JOB_TIMEOUT, CUTTER_KEEP_SVGS, send=not TESTING) if CUTTER_QUEUE else None
 
-    # Initialize camera process
-    cam_proc = CameraProcess(shared_array, mtx, dist, newcameramtx, lock, running_event, quit_event)
+    # snapped frames and their contours are written in the background
+    snapshot_archive = snapshot_archive_t(ARCHIVE_PATH, ARCHIVE_QUEUE, ARCHIVE_DISK_MB, ARCHIVE_CODEC) if ARCHIVE else None
+
+    # Initialize camera process, calibration loading and camera discovery happen in the child
+    cam_proc = CameraProcess(frame_ring, preview_ring, "./calibration/camera_calibration.json", running_event, quit_event, trace_collector.queue)
     cam_proc.start()
     
-    # Initialize inferencer and GUI
-    inferencer = inferencer_t("./models/class_pants_avant_arriere_chemises_v1_1.pt", classification_image_shape,
-                              "./models/pants_avant_v3_1.pt", "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt", segmentation_image_shape)
+    # Initialize inference process, the models are loaded and warmed up once in the child
+    # or snap through the inference server shared by the stations, it reads the frames from the frame ring
+    if INFERENCE_SERVER:
+        inference_proc = inference_client_t(frame_ring, STATION_NAME, INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY)
+    else:
+        inference_proc = InferenceProcess(frame_ring, "./models/class_pants_avant_arriere_chemises_v1_1.pt", classification_image_shape,
+                                          "./models/pants_avant_v3_1.pt", "./models/pants_arriere_v1_1.pt", "./models/chemises_v2_1.pt", segmentation_image_shape,
+                                          quit_event, INFERENCE_BACKEND, trace_collector.queue, CALIBRATION_FRAMES_DIR)
+    inference_proc.start()
+    
+    # Initialize GUI right away, it shows the readiness of the camera and the models while they start up
     root = tk.Tk()
-    app = gui_t(root, inferencer, shared_array, lock, contour_data, running_event, laser_cutter)
+    app = gui_t(root, inference_proc, cam_proc, frame_ring, preview_ring, contour_data, running_event, laser_cutter, startup_time, trace_collector, cutter_queue, snapshot_archive)
     root.mainloop()
 
     # Clean up
     quit_event.set()
-    cam_proc.join()
\ No newline at end of file
+    if INFERENCE_SERVER:
+        inference_proc.close()
+    for proc in [cam_proc] if INFERENCE_SERVER else [cam_proc, inference_proc]:
+        while proc.is_alive():
+            trace_collector.drain() # a child only exits once the spans it queued are read
+            proc.join(0.1)
+    
+    if TRACING:
+        tracer.flush()
+        trace_collector.drain(timeout=0.5)
+        trace_path = os.path.join(TRACE_PATH, time.strftime("trace_%Y%m%d_%H%M%S.json"))
+        trace_collector.export_chrome(trace_path)
+        print(trace_collector.report())
+        print(f"Trace written to {trace_path}")
+    if snapshot_archive is not None:
+        snapshot_archive.close()
+        print(f"snapshot archive: {snapshot_archive.stats()}")
+    # the client can only be closed once no job is waiting for the cutter anymore
+    if cutter_queue is None or cutter_queue.close():
+        laser_cutter.close()
+    frame_ring.close()
+    preview_ring.close()
+    contour_data.close()
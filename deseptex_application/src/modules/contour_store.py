@@ -0,0 +1,226 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+
+
+HEADER_FIELDS = 4 # [number of vertices, number of polygons, vertex capacity, polygon capacity]
+SHARED_MAX_VERTICES = 1 << 20 # 8 MB of vertices, pages that are never written are not backed by memory
+SHARED_MAX_POLYGONS = 4096
+
+
+class contour_store_t:
+    '''
+    All contours in one flat float32 (N, 2) vertex array plus an offsets array (CSR layout):
+    polygon i is vertices[offsets[i]:offsets[i+1]]. Indexing returns a view, vertex inserts and
+    deletes shift the tail in place and the buffers grow by doubling.
+    With shared=True the buffers live in multiprocessing.shared_memory, other processes attach by name.
+    A shared store is allocated at its maximum size once and never moves, so a reader attached by name
+    always sees the current contours; going past max_vertices or max_polygons raises.
+    '''
+    def __init__(self, vertex_capacity=1024, polygon_capacity=64, shared=False, name=None,
+                 max_vertices=SHARED_MAX_VERTICES, max_polygons=SHARED_MAX_POLYGONS):
+        self.shared = shared or name is not None
+        self.shm = None
+        self.owner = name is None
+        if name is None:
+            if self.shared:
+                vertex_capacity, polygon_capacity = max_vertices, max_polygons
+            self.allocate(vertex_capacity, polygon_capacity)
+            self.header[:] = (0, 0, vertex_capacity, polygon_capacity)
+            self.offsets[0] = 0
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+            self.bind(self.shm.buf, int(header[2]), int(header[3]))
+
+
+    @classmethod
+    def from_contours(cls, contours, shared=False):
+        store = cls(shared=shared)
+        store.set_contours(contours)
+        return store
+
+
+    def allocate(self, vertex_capacity, polygon_capacity):
+        nbytes = HEADER_FIELDS * 8 + (polygon_capacity + 1) * 8 + vertex_capacity * 2 * 4
+        if self.shared:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            buffer = self.shm.buf
+        else:
+            buffer = bytearray(nbytes)
+        self.bind(buffer, vertex_capacity, polygon_capacity)
+
+
+    def bind(self, buffer, vertex_capacity, polygon_capacity):
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        self.offsets = np.ndarray((polygon_capacity + 1,), dtype=np.int64, buffer=buffer, offset=HEADER_FIELDS * 8)
+        self.vertices = np.ndarray((vertex_capacity, 2), dtype=np.float32, buffer=buffer, offset=HEADER_FIELDS * 8 + (polygon_capacity + 1) * 8)
+
+
+    def reserve(self, num_vertices, num_polygons):
+        # amortized growth: double the capacity and copy the used part over
+        vertex_capacity, polygon_capacity = int(self.header[2]), int(self.header[3])
+        if num_vertices <= vertex_capacity and num_polygons <= polygon_capacity:
+            return
+        if self.shared:
+            # moving a shared store to a new block would leave the readers on the old one
+            raise ValueError(f"shared contour store is full: {num_vertices} vertices, {num_polygons} polygons "
+                             f"(max {vertex_capacity}, {polygon_capacity})")
+        while vertex_capacity < num_vertices:
+            vertex_capacity *= 2
+        while polygon_capacity < num_polygons:
+            polygon_capacity *= 2
+
+        n, p = self.num_vertices, len(self)
+        old_vertices, old_offsets = self.vertices[:n].copy(), self.offsets[:p + 1].copy()
+        self.allocate(vertex_capacity, polygon_capacity)
+        self.header[:] = (n, p, vertex_capacity, polygon_capacity)
+        self.offsets[:p + 1] = old_offsets
+        self.vertices[:n] = old_vertices
+
+
+    @property
+    def num_vertices(self):
+        return int(self.header[0])
+
+
+    @property
+    def name(self):
+        return self.shm.name if self.shm is not None else None
+
+
+    def __len__(self):
+        return int(self.header[1])
+
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("contour index out of range")
+        return self.vertices[self.offsets[i]:self.offsets[i + 1]]
+
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+    def lengths(self):
+        return np.diff(self.offsets[:len(self) + 1])
+
+
+    def flat(self):
+        # every vertex of every polygon, in order, as one (N, 2) view
+        return self.vertices[:self.num_vertices]
+
+
+    def to_list(self):
+        return [polygon.copy() for polygon in self]
+
+
+    def clear(self):
+        self.header[0] = 0
+        self.header[1] = 0
+
+
+    def set_contours(self, contours):
+        contours = [np.asarray(contour, dtype=np.float32).reshape(-1, 2) for contour in contours]
+        lengths = [len(contour) for contour in contours]
+        self.clear()
+        self.reserve(sum(lengths), len(contours))
+        self.offsets[1:len(contours) + 1] = np.cumsum(lengths)
+        if contours:
+            self.vertices[:sum(lengths)] = np.concatenate(contours)
+        self.header[0] = sum(lengths)
+        self.header[1] = len(contours)
+
+
+    def append(self, contour):
+        contour = np.asarray(contour, dtype=np.float32).reshape(-1, 2)
+        n, p = self.num_vertices, len(self)
+        self.reserve(n + len(contour), p + 1)
+        self.vertices[n:n + len(contour)] = contour
+        self.offsets[p + 1] = n + len(contour)
+        self.header[0] = n + len(contour)
+        self.header[1] = p + 1
+
+
+    def __delitem__(self, i):
+        if i < 0:
+            i += len(self)
+        n, p = self.num_vertices, len(self)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        self.vertices[start:n - (end - start)] = self.vertices[end:n]
+        self.offsets[i + 1:p] = self.offsets[i + 2:p + 1] - (end - start)
+        self.header[0] = n - (end - start)
+        self.header[1] = p - 1
+
+
+    def __setitem__(self, i, contour):
+        # replace polygon i, its vertex count may change
+        contour = np.asarray(contour, dtype=np.float32).reshape(-1, 2)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        delta = len(contour) - (end - start)
+        n, p = self.num_vertices, len(self)
+        if delta > 0:
+            self.reserve(n + delta, p)
+        self.vertices[end + delta:n + delta] = self.vertices[end:n]
+        self.vertices[start:start + len(contour)] = contour
+        self.offsets[i + 1:p + 1] += delta
+        self.header[0] = n + delta
+
+
+    def set_vertex(self, i, j, xy):
+        self.vertices[self.offsets[i] + j] = xy
+
+
+    def insert_vertex(self, i, j, xy):
+        n, p = self.num_vertices, len(self)
+        self.reserve(n + 1, p)
+        k = int(self.offsets[i]) + j
+        self.vertices[k + 1:n + 1] = self.vertices[k:n]
+        self.vertices[k] = xy
+        self.offsets[i + 1:p + 1] += 1
+        self.header[0] = n + 1
+
+
+    def delete_vertex(self, i, j):
+        n, p = self.num_vertices, len(self)
+        k = int(self.offsets[i]) + j
+        self.vertices[k:n - 1] = self.vertices[k + 1:n]
+        self.offsets[i + 1:p + 1] -= 1
+        self.header[0] = n - 1
+
+
+    def scale(self, sx, sy):
+        # in place, one vectorized pass over all vertices
+        self.flat()[:] *= np.array((sx, sy), dtype=np.float32)
+        return self
+
+
+    # non-shared stores are pickled by value, shared ones by name
+    def __getstate__(self):
+        if self.shm is not None:
+            return {"name": self.shm.name}
+        return {"contours": self.to_list()}
+
+
+    def __setstate__(self, state):
+        if "name" in state:
+            self.__init__(name=state["name"])
+        else:
+            self.__init__()
+            self.set_contours(state["contours"])
+
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.header = self.offsets = self.vertices = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass # a reader still holds a view, the mapping is released when it is garbage collected
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import numpy as np
+
+from modules.contour_store import contour_store_t
+from modules.motion_trigger import motion_trigger_t
+from modules.cutter_queue import cutter_queue_t
+from modules.snapshot_archive import snapshot_archive_t
+from modules.tracer import tracer
+from modules.settings import SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE, CUTTER_JOB_TIMEOUT
+
+
+
+class conveyor_t:
+    '''
+    Hands-free mode: the preview frames go to the motion trigger, a garment that was placed is snapped and inferred,
+    and a confident result is exported and sent to the cutter without a click. A result below the confidence thresholds
+    waits in the edit flow until the operator finishes (finish_review) or skips it (skip). A result without any contour
+    is an empty table (e.g. a cut garment was taken away), it is not a garment and the camera keeps watching.
+    poll() is called periodically by the GUI or a headless driver and returns "snapped", "cut", "review", "empty" or None.
+    Every garment gets a timing record, they are appended to log_path as JSON lines. With a cutter_queue the cut is
+    only queued, cut_s is then the time to hand it over.
+    '''
+    def __init__(self, frame_ring, preview_ring, inference_proc, laser_cutter, contour_data:contour_store_t, running_event,
+                 motion_trigger:motion_trigger_t, min_class_prob=0.8, min_seg_conf=0.5, send_to_cutter=True, log_path=None,
+                 cutter_queue:cutter_queue_t|None=None, snapshot_archive:snapshot_archive_t|None=None):
+        self.frame_ring = frame_ring
+        self.preview_ring = preview_ring
+        self.inference_proc = inference_proc
+        self.laser_cutter = laser_cutter
+        self.contour_data = contour_data # GUI coordinates, like the contours of a manual snap
+        self.running_event = running_event
+        self.motion_trigger = motion_trigger
+        self.min_class_prob = min_class_prob
+        self.min_seg_conf = min_seg_conf
+        self.send_to_cutter = send_to_cutter
+        self.log_path = log_path
+        self.cutter_queue = cutter_queue # when given, the cut is only queued and the next garment is watched for right away
+        self.snapshot_archive = snapshot_archive
+        self.predicted = [] # contours of the garment being handled as the models returned them
+        self.state = "watching" # watching, inferring or review
+        self.shown_seq = 0 # last preview frame given to the motion trigger
+        self.request_id = None
+        self.current = None # timing record of the garment being handled
+        self.garments = [] # timing records of the handled garments
+        self.empty_snaps = 0 # triggers that found no garment
+        self.start_time = time.perf_counter()
+
+
+    def poll(self):
+        if self.state == "watching":
+            return self.watch()
+        if self.state == "inferring":
+            return self.collect()
+        return None
+
+
+    def watch(self):
+        seq, _, preview = self.preview_ring.latest()
+        if preview is None or seq == self.shown_seq:
+            return None
+        self.shown_seq = seq
+        if not self.motion_trigger.update(preview):
+            return None
+
+        # the garment lies still, pause the camera and infer the frame of this preview, never from the result
+        # cache: nobody checks an automatic cut and the next garment of the same class may lie where the last one did
+        self.running_event.clear()
+        frame_seq = seq # the preview carries the sequence number of its frame
+        self.current = {"time": time.time(), "seq": frame_seq, "placed": time.perf_counter(), "start": tracer.now()}
+        self.request_id = self.inference_proc.submit(frame_seq, use_cache=False)
+        self.state = "inferring"
+        return "snapped"
+
+
+    def confident(self, contours, confidence):
+        if confidence is None or confidence["class"] is None:
+            return False
+        return confidence["class_prob"] >= self.min_class_prob and confidence["seg_conf"] is not None and confidence["seg_conf"] >= self.min_seg_conf
+
+
+    def collect(self):
+        contours = self.inference_proc.poll(self.request_id)
+        if contours is None:
+            return None
+        self.request_id = None
+        if len(contours) == 0:
+            # nothing to cut, back to watching without asking the operator
+            self.empty_snaps += 1
+            self.current = None
+            self.state = "watching"
+            self.running_event.set()
+            return "empty"
+        confidence = self.inference_proc.last_confidence
+        self.current["inference_s"] = time.perf_counter() - self.current["placed"]
+        self.current["contours"] = len(contours)
+        self.predicted = contours
+        self.current.update(confidence or {})
+        tracer.record("conveyor.inference", self.current["start"], tracer.now(), {"seq": self.current["seq"]})
+
+        self.contour_data.set_contours(contours)
+        self.contour_data.scale(GUI_IMAGE_SHAPE[1] / SHARED_IMAGE_SHAPE[1], GUI_IMAGE_SHAPE[0] / SHARED_IMAGE_SHAPE[0])
+        if self.confident(contours, confidence):
+            self.cut()
+            return "cut"
+        self.state = "review"
+        self.review_start = time.perf_counter()
+        return "review"
+
+
+    def cut(self):
+        start = time.perf_counter()
+        if self.cutter_queue is not None:
+            self.current["job"] = self.cutter_queue.submit(self.contour_data).job_id
+        else:
+            self.laser_cutter.prepare_svg(self.contour_data)
+            if self.send_to_cutter:
+                try:
+                    self.laser_cutter.start_cutter()
+                    # the cutter acknowledges the LOADFILE once the garment is cut, like a job of the cutter queue
+                    self.laser_cutter.send_svg_to_cutter(timeout=CUTTER_JOB_TIMEOUT)
+                except TimeoutError as e:
+                    print(e)
+                    self.current["cutter_error"] = str(e)
+        self.current["cut_s"] = time.perf_counter() - start
+        self.finish_garment("cut")
+
+
+    def finish_review(self):
+        # the operator checked (and maybe corrected) the contours and pressed Finish
+        self.current["review_s"] = time.perf_counter() - self.review_start
+        self.cut()
+
+
+    def skip(self):
+        # the operator rejected the garment in review, or the mode was switched off while inferring
+        if self.state == "inferring":
+            self.inference_proc.cancel(self.request_id)
+            self.request_id = None
+        if self.state in ("inferring", "review"):
+            self.finish_garment("skipped")
+
+
+    def finish_garment(self, outcome):
+        record = self.current
+        record["outcome"] = outcome
+        record["total_s"] = time.perf_counter() - record.pop("placed")
+        record.pop("start")
+        self.garments.append(record)
+        self.current = None
+        if self.log_path is not None:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        print(f"garment {len(self.garments)}: {outcome}, {record.get('class')}, {record['total_s']:.1f} s, {self.garments_per_hour():.0f} garments/hour")
+
+        if self.snapshot_archive is not None:
+            self.snapshot_archive.submit(self.frame_ring, record["seq"], self.predicted, self.contour_data.to_list() if outcome == "cut" else None,
+                                         {"mode": "auto", **record})
+        
+        # next garment
+        self.predicted = []
+        self.contour_data.clear()
+        self.state = "watching"
+        self.running_event.set()
+
+
+    def garments_per_hour(self):
+        cut = sum(1 for record in self.garments if record["outcome"] == "cut")
+        return cut / max(time.perf_counter() - self.start_time, 1e-9) * 3600
+
+
+    def summary(self):
+        records = [record for record in self.garments if record["outcome"] == "cut"]
+        stats = {"garments": len(self.garments), "cut": len(records),
+                 "reviewed": sum(1 for record in records if "review_s" in record),
+                 "skipped": sum(1 for record in self.garments if record["outcome"] == "skipped"),
+                 "garments_per_hour": self.garments_per_hour()}
+        for key in ("inference_s", "cut_s", "total_s"):
+            values = [record[key] for record in records if key in record]
+            stats[key + "_p50"] = float(np.percentile(values, 50)) if values else None
+        return stats
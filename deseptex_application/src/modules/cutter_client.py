@@ -0,0 +1,111 @@
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future
+
+
+
+class cutter_client_t:
+    '''
+    Long-lived UDP client for the laser cutter software.
+    Owns one outbound socket and one inbound socket bound to udp_in_port for the lifetime of the process.
+    Requests are sent one at a time by a background thread, stale datagrams are drained before every send and the next
+    reply answers the request. With match_replies only a reply that starts with the command (e.g. START:OK) is taken,
+    this needs a cutter that echoes its commands. Requests are retried on timeout and completed through a
+    concurrent.futures.Future.
+    '''
+    def __init__(self, ip, udp_out_port, udp_in_port, timeout=5.0, retries=2, match_replies=False):
+        self.ip = ip
+        self.udp_out_port = udp_out_port
+        self.udp_in_port = udp_in_port
+        self.timeout = timeout
+        self.retries = retries
+        self.match_replies = match_replies
+
+        self.out_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.in_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.in_sock.bind((self.ip, self.udp_in_port))
+
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.serve_requests, name="cutter_client", daemon=True)
+        self.worker.start()
+
+
+    def send_async(self, message, timeout=None, retries=None):
+        '''
+        Queues message and returns a Future that resolves to (reply, address, round trip seconds)
+        or fails with TimeoutError once all retries went unanswered.
+        '''
+        future = Future()
+        self.requests.put((message, self.timeout if timeout is None else timeout, self.retries if retries is None else retries, future))
+        return future
+
+
+    def send(self, message, timeout=None, retries=None):
+        return self.send_async(message, timeout, retries).result()
+
+
+    def serve_requests(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            message, timeout, retries, future = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.exchange(message, timeout, retries))
+            except Exception as e:
+                future.set_exception(e)
+
+
+    def exchange(self, message, timeout, retries):
+        command = message.split(":", 1)[0].encode() if self.match_replies else None
+        for attempt in range(retries + 1):
+            # replies that arrived after an earlier request timed out belong to that request, drop them
+            self.drain()
+
+            start = time.perf_counter()
+            self.out_sock.sendto(message.encode(), (self.ip, self.udp_out_port))
+            reply = self.receive_reply(command, start + timeout)
+            if reply is None:
+                print(f"No reply from cutter to '{message}' (try {attempt + 1} of {retries + 1})")
+                continue
+            data, addr = reply
+            return data, addr, time.perf_counter() - start
+        raise TimeoutError(f"Cutter did not answer '{message}' after {retries + 1} tries")
+
+
+    def receive_reply(self, command, deadline):
+        # the next datagram, with a command the datagrams that do not start with it are late replies and are dropped
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            self.in_sock.settimeout(remaining)
+            try:
+                data, addr = self.in_sock.recvfrom(1024)
+            except (socket.timeout, ConnectionResetError):
+                return None
+            if command is None or data.startswith(command):
+                return data, addr
+            print(f"Dropped cutter reply {data!r} while waiting for {command.decode()}")
+
+
+    def drain(self):
+        self.in_sock.setblocking(False)
+        try:
+            while True:
+                self.in_sock.recvfrom(1024)
+        except (BlockingIOError, OSError):
+            pass
+        finally:
+            self.in_sock.setblocking(True)
+
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+        self.out_sock.close()
+        self.in_sock.close()
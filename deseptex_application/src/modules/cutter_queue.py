@@ -0,0 +1,145 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+
+from modules.laser_cutter import laser_cutter_t
+from modules.contour_store import contour_store_t
+from modules.tracer import tracer
+
+
+
+JOB_STATES = ("queued", "sent", "acknowledged", "failed")
+
+
+class cutter_job_t:
+    def __init__(self, job_id, svg_path, contours):
+        self.job_id = job_id
+        self.svg_path = svg_path
+        self.contours = contours # copy in GUI coordinates, dropped once the SVG is written
+        self.state = "queued"
+        self.error = None
+        self.queued_time = time.perf_counter()
+        self.sent_time = None
+        self.done_time = None
+
+
+
+class cutter_queue_t:
+    '''
+    Background job queue in front of laser_cutter_t, so Finish returns right away and the next garment can be snapped
+    and edited while the cutter works. Every job gets its own SVG file, written by the worker thread, and the jobs are
+    handed to the cutter one after the other in submission order. A job is "sent" while the cutter has it and
+    "acknowledged" once the cutter answered the LOADFILE, job_timeout bounds how long that may take.
+    Only the keep_svgs most recent SVG files of finished jobs are kept.
+    '''
+    def __init__(self, laser_cutter:laser_cutter_t, job_timeout=600.0, keep_svgs=50, send=True):
+        self.laser_cutter = laser_cutter
+        self.job_timeout = job_timeout
+        self.keep_svgs = keep_svgs
+        self.send = send # False only writes the SVGs, like the GUI did with TESTING
+        self.svg_dir = os.path.dirname(laser_cutter.svg_path) or "."
+        self.prefix = time.strftime("job_%Y%m%d_%H%M%S") # names stay unique across restarts
+        self.jobs = [] # every job of the session, in submission order
+        self.last_job_id = 0
+        self.pending = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="cutter_queue", daemon=True)
+        self.thread.start()
+
+
+    def submit(self, contours):
+        # the contours are copied, the GUI clears and refills its store for the next garment right away
+        if isinstance(contours, contour_store_t):
+            contours = contours.to_list()
+        contours = [np.array(contour) for contour in contours]
+        self.last_job_id += 1
+        job = cutter_job_t(self.last_job_id, os.path.join(self.svg_dir, f"{self.prefix}_{self.last_job_id:04d}.svg"), contours)
+        self.jobs.append(job)
+        self.pending.put(job)
+        return job
+
+
+    def run(self):
+        while True:
+            job = self.pending.get()
+            if job is None:
+                return
+            if self.stop_event.is_set():
+                job.state, job.error = "failed", "not sent, the application was closed"
+                continue
+            try:
+                self.process(job)
+            except (TimeoutError, OSError) as e:
+                job.state, job.error = "failed", str(e)
+                print(f"cutter job {job.job_id} failed: {e}")
+            job.done_time = time.perf_counter()
+            self.remove_old_svgs()
+
+
+    def process(self, job):
+        with tracer.span("cutter.build_svg", job=job.job_id, contours=len(job.contours)):
+            svg = self.laser_cutter.build_svg(job.contours)
+        if self.laser_cutter.path_optimizer is not None:
+            print(self.laser_cutter.path_optimizer.report(self.laser_cutter.last_path_stats))
+        with tracer.span("cutter.write_svg", job=job.job_id):
+            self.laser_cutter.write_svg(svg, job.svg_path)
+        job.contours = None
+
+        job.state = "sent"
+        job.sent_time = time.perf_counter()
+        if self.send:
+            self.laser_cutter.start_cutter()
+            # no resend while the cutter may be cutting, a second LOADFILE would cut the garment twice
+            self.laser_cutter.send_svg_to_cutter(job.svg_path, timeout=self.job_timeout, retries=0)
+        job.state = "acknowledged"
+
+
+    def remove_old_svgs(self):
+        finished = [job for job in self.jobs if job.state in ("acknowledged", "failed") and job.svg_path is not None]
+        for job in finished[:-self.keep_svgs] if self.keep_svgs > 0 else finished:
+            if os.path.exists(job.svg_path):
+                os.remove(job.svg_path)
+            job.svg_path = None
+
+
+    def counts(self):
+        counts = dict.fromkeys(JOB_STATES, 0)
+        for job in self.jobs:
+            counts[job.state] += 1
+        return counts
+
+
+    def status(self):
+        # one line for the GUI
+        counts = self.counts()
+        text = "   ".join(f"{counts[state]} {state}" for state in JOB_STATES)
+        failed = [job for job in self.jobs if job.state == "failed"]
+        if failed:
+            text += f"   (job {failed[-1].job_id}: {failed[-1].error})"
+        return "cutter: " + text
+
+
+    def wait(self, timeout=None):
+        # blocks until every submitted job is acknowledged or failed, returns False on timeout
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while any(job.state in ("queued", "sent") for job in self.jobs):
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+    def close(self, timeout=1.0):
+        '''
+        Drops the jobs that were not sent yet. Returns False when a job is still at the cutter after timeout,
+        the laser cutter client must not be closed then.
+        '''
+        self.stop_event.set()
+        self.pending.put(None)
+        self.thread.join(timeout)
+        unfinished = [job.job_id for job in self.jobs if job.state == "sent"]
+        if unfinished:
+            print(f"cutter job {unfinished[0]} was still at the cutter at exit")
+        return not self.thread.is_alive()
@@ -0,0 +1,99 @@
+import random
+import socket
+import threading
+import time
+
+
+
+class fake_cutter_t:
+    '''
+    Loopback stand-in for the laser cutter software.
+    Listens on listen_port and answers START and LOADFILE messages on reply_port,
+    after a configurable latency and with a configurable probability of dropping the request.
+    With cut_time a LOADFILE is answered once the file is cut, messages that arrive meanwhile wait for the cut.
+    '''
+    def __init__(self, ip="127.0.0.1", listen_port=19840, reply_port=19841, latency=0.0, loss=0.0, seed=None, cut_time=0.0):
+        self.ip = ip
+        self.listen_port = listen_port
+        self.reply_port = reply_port
+        self.latency = latency
+        self.loss = loss
+        self.cut_time = cut_time
+        self.random = random.Random(seed)
+
+        self.received = [] # every message that was received, dropped or not
+        self.dropped = 0
+        self.cut_files = [] # files of the LOADFILE messages, in the order they were cut
+
+        self.in_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.in_sock.bind((self.ip, self.listen_port))
+        self.in_sock.settimeout(0.2)
+        self.out_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.serve, name="fake_cutter", daemon=True)
+
+
+    def start(self):
+        self.thread.start()
+        return self
+
+
+    def serve(self):
+        while not self.stop_event.is_set():
+            try:
+                data, _ = self.in_sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+
+            message = data.decode(errors="replace")
+            self.received.append(message)
+            if self.random.random() < self.loss:
+                self.dropped += 1
+                continue
+
+            reply = self.handle(message)
+            if reply is None:
+                continue
+            if self.latency > 0:
+                time.sleep(self.latency)
+            self.out_sock.sendto(reply.encode(), (self.ip, self.reply_port))
+
+
+    def handle(self, message):
+        if message == "START":
+            return "START:OK"
+        if message.startswith("LOADFILE:"):
+            if self.cut_time > 0:
+                time.sleep(self.cut_time)
+            self.cut_files.append(message[len("LOADFILE:"):])
+            return "LOADFILE:OK"
+        return None
+
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.in_sock.close()
+        self.out_sock.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Loopback fake laser cutter")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--listen-port", type=int, default=19840)
+    parser.add_argument("--reply-port", type=int, default=19841)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every reply")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability of dropping a request")
+    parser.add_argument("--cut-time", type=float, default=0.0, help="seconds a LOADFILE takes to cut before it is answered")
+    args = parser.parse_args()
+
+    cutter = fake_cutter_t(args.ip, args.listen_port, args.reply_port, args.latency, args.loss, cut_time=args.cut_time).start()
+    print(f"Fake cutter listening on {args.ip}:{args.listen_port}, replying on {args.reply_port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        cutter.stop()
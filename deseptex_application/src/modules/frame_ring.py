@@ -0,0 +1,160 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+
+
+HEADER_SLOTS = 2 # [latest slot index, latest sequence number]
+WRITING = -1 # slot sequence number while the writer is filling the slot
+
+
+class frame_ring_t:
+    '''
+    Ring of frame slots in multiprocessing.shared_memory with one writer and any number of readers.
+    Every slot carries the sequence number of the frame it holds, the header holds the index of
+    the latest complete frame. The writer never fills the latest slot, so readers never wait on
+    the writer; a reader can check afterwards whether the slot it used was overwritten.
+    '''
+    def __init__(self, shape, num_slots=3, dtype=np.uint8, name=None):
+        self.shape = tuple(shape)
+        self.num_slots = num_slots
+        self.dtype = np.dtype(dtype)
+        self.frame_nbytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        header_nbytes = (HEADER_SLOTS + num_slots) * np.dtype(np.int64).itemsize
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_nbytes + num_slots * self.frame_nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.attach()
+
+        if self.owner:
+            self.header[0] = -1
+            self.header[1] = 0
+            self.slot_seqs[:] = 0
+        self.next_seq = int(self.header[1]) + 1
+
+
+    def attach(self):
+        counters = np.ndarray((HEADER_SLOTS + self.num_slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.header = counters[:HEADER_SLOTS]
+        self.slot_seqs = counters[HEADER_SLOTS:]
+        self.frames = np.ndarray((self.num_slots, *self.shape), dtype=self.dtype, buffer=self.shm.buf, offset=counters.nbytes)
+
+
+    # the ring is passed to child processes by name, they attach to the same shared memory block
+    def __getstate__(self):
+        return {"shape": self.shape, "num_slots": self.num_slots, "dtype": self.dtype.str, "name": self.shm.name}
+
+
+    def __setstate__(self, state):
+        self.__init__(state["shape"], state["num_slots"], state["dtype"], state["name"])
+
+
+    @property
+    def name(self):
+        return self.shm.name
+
+
+    def begin_write(self):
+        '''
+        Returns (slot, view) of a slot that is not the latest complete frame.
+        Fill the view (e.g. as dst= of an OpenCV call) and call commit(slot) afterwards.
+        '''
+        latest = int(self.header[0])
+        slot = (latest + 1) % self.num_slots
+        self.slot_seqs[slot] = WRITING
+        return slot, self.frames[slot]
+
+
+    def commit(self, slot, seq=None):
+        # seq publishes the frame under the number of a frame in another ring, e.g. the preview of a full-resolution frame
+        seq = self.next_seq if seq is None else seq
+        self.next_seq = seq + 1
+        self.slot_seqs[slot] = seq
+        # publish the slot before the sequence number, readers that see the new number find the new slot
+        self.header[0] = slot
+        self.header[1] = seq
+        return seq
+
+
+    def write(self, frame):
+        slot, view = self.begin_write()
+        np.copyto(view, frame)
+        return self.commit(slot)
+
+
+    def latest_seq(self):
+        # 0 means no frame has been published yet
+        return int(self.header[1])
+
+
+    def latest(self):
+        '''
+        Returns (seq, slot, view) of the latest complete frame without copying, or (0, -1, None).
+        The view stays valid while is_current(slot, seq) is True.
+        '''
+        while True:
+            slot = int(self.header[0])
+            if slot < 0:
+                return 0, -1, None
+            seq = int(self.slot_seqs[slot])
+            if seq > 0:
+                return seq, slot, self.frames[slot]
+
+
+    def is_current(self, slot, seq):
+        return int(self.slot_seqs[slot]) == seq
+
+
+    def find(self, seq):
+        # slot that still holds frame seq, or -1 when it was overwritten
+        slots = np.flatnonzero(self.slot_seqs == seq)
+        return int(slots[0]) if len(slots) else -1
+
+
+    def read(self, seq=None, out=None):
+        '''
+        Copies frame seq (default: the latest) into out and returns (seq, frame).
+        Returns (0, None) when the frame is not (or no longer) available.
+        '''
+        while True:
+            if seq is None:
+                frame_seq, slot, view = self.latest()
+                if view is None:
+                    return 0, None
+            else:
+                frame_seq, slot = seq, self.find(seq)
+                if slot < 0:
+                    return 0, None
+                view = self.frames[slot]
+
+            if out is None:
+                frame = view.copy()
+            else:
+                np.copyto(out, view)
+                frame = out
+
+            # the writer may have recycled the slot during the copy, try again in that case
+            if self.is_current(slot, frame_seq):
+                return frame_seq, frame
+            if seq is not None:
+                return 0, None
+
+
+    def read_if_new(self, last_seq, out=None):
+        # skip the copy entirely when nothing new was published since last_seq
+        if self.latest_seq() == last_seq:
+            return last_seq, None
+        return self.read(out=out)
+
+
+    def close(self):
+        # drop the numpy views first, shared memory cannot be closed while they are exported
+        self.header = self.slot_seqs = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass # a reader still holds a view, the mapping is released when it is garbage collected
+        if self.owner:
+            self.shm.unlink()
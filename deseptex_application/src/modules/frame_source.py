@@ -0,0 +1,299 @@
+import os
+import glob
+import time
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+import cv2 as cv
+from collections import OrderedDict
+
+from modules.settings import TESTING, FRAME_SOURCE, ORIGINAL_IMAGE_SHAPE, REPLAY_PATH, REPLAY_FPS, REPLAY_CACHE_MB, CAMERA_PIXEL_FORMAT, CAMERA_FPS
+
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def no_release():
+    pass
+
+
+def is_timeout(error):
+    # arena_api raises its own exception class for GC_ERR_TIMEOUT rather than the builtin TimeoutError
+    if isinstance(error, TimeoutError):
+        return True
+    return "timeout" in type(error).__name__.lower() or "timeout" in str(error).lower()
+
+
+
+class frame_source_t(ABC):
+    '''
+    Where CameraProcess gets its BGR frames from. get_frame returns (frame, release) or (None, None)
+    when no frame arrived within timeout; release() is called once the frame is no longer read.
+    A source is pickled to the camera process before start(), so devices and threads are only created in start().
+    A source with a raw pixel_format (see BAYER_PATTERNS in modules/undistorter.py) returns single-channel sensor frames.
+    fps is the rate the frames come at, 0 when they come as fast as they are read.
+    '''
+    pixel_format = "BGR8"
+    fps = 0.0
+
+
+    def start(self):
+        pass
+
+
+    @abstractmethod
+    def get_frame(self, timeout=None):
+        pass
+
+
+    def stop(self):
+        pass
+
+
+
+class arena_source_t(frame_source_t):
+    '''
+    The Lucid camera through arena_api. The frame is a view on the device buffer, release requeues the buffer.
+    A device with the same get_buffer/requeue_buffer interface can be passed in, see modules/mock_camera.py.
+    '''
+    def __init__(self, width=ORIGINAL_IMAGE_SHAPE[1], height=ORIGINAL_IMAGE_SHAPE[0], fps=CAMERA_FPS, exposure_time=600000.0, device=None, pixel_format=CAMERA_PIXEL_FORMAT):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.exposure_time = exposure_time
+        self.pixel_format = pixel_format # BGR8 needs no colour swap, a Bayer format is demosaiced by the undistorter
+        self.device = device
+        self.owns_device = device is None
+
+
+    def start(self):
+        if self.owns_device:
+            # open camera, waits up to a minute for a device to be connected
+            from arena_api.system import system # type: ignore
+            self.system = system
+            devices = self.create_devices_with_tries()
+            self.device = system.select_device(devices)
+            self.nodemap = self.device.nodemap
+            self.setup()
+        self.device.start_stream()
+        print("Camera stream started")
+
+
+    def create_devices_with_tries(self):
+        '''
+        Waits for the user to connect a device before
+            raising an exception if it fails
+        '''
+        tries = 0
+        tries_max = 6
+        sleep_time_secs = 10
+        devices = None
+        while tries < tries_max:  # Wait for device for 60 seconds
+            devices = self.system.create_device()
+            if not devices:
+                print(
+                    f'Try {tries+1} of {tries_max}: waiting for {sleep_time_secs} '
+                    f'secs for a device to be connected!')
+                for sec_count in range(sleep_time_secs):
+                    time.sleep(1)
+                    print(f'{sec_count + 1 } seconds passed ',
+                        '.' * sec_count, end='\r')
+                tries += 1
+            else:
+                return devices
+        else:
+            raise Exception('No device found! Please connect a device and run '
+                            'the example again.')
+
+
+    def setup(self):
+        nodes = self.nodemap.get_node(['Width', 'Height', 'PixelFormat', 'AcquisitionFrameRateEnable', 'AcquisitionFrameRate', 'ExposureAuto', 'ExposureTime'])
+
+        nodes['Width'].value = self.width
+        nodes['Height'].value = self.height
+        nodes['PixelFormat'].value = self.pixel_format
+
+        # Get device stream nodemap
+        tl_stream_nodemap = self.device.tl_stream_nodemap
+        tl_stream_nodemap['StreamAutoNegotiatePacketSize'].value = True
+        tl_stream_nodemap['StreamPacketResendEnable'].value = True
+
+        # set framerate
+        nodes['AcquisitionFrameRateEnable'].value = True
+        nodes['AcquisitionFrameRate'].value = self.fps
+
+        # set exposure time
+        nodes['ExposureAuto'].value = 'Off'
+        nodes['ExposureTime'].value = self.exposure_time
+
+
+    @staticmethod
+    def buffer_view(buffer):
+        # NumPy view on the memory of a device buffer, only valid until the buffer is requeued
+        channels = buffer.bits_per_pixel // 8
+        return np.ctypeslib.as_array(buffer.pdata, shape=(buffer.height, buffer.width, channels))
+
+
+    def get_frame(self, timeout=None):
+        # the device takes the timeout in milliseconds, without one it waits as long as the driver default
+        try:
+            buffer = self.device.get_buffer() if timeout is None else self.device.get_buffer(timeout=max(int(timeout * 1000), 1))
+        except Exception as error:
+            if not is_timeout(error):
+                raise
+            return None, None
+        return self.buffer_view(buffer), lambda: self.device.requeue_buffer(buffer)
+
+
+    def stop(self):
+        self.device.stop_stream()
+        if self.owns_device:
+            self.system.destroy_device()
+
+
+
+class replay_source_t(frame_source_t):
+    '''
+    Replays a directory of images, a video file or a glob, in a loop. Frames are decoded once by a prefetch thread
+    into an LRU cache with a memory budget, so replaying a set that fits in the budget costs no decoding at all.
+    fps is the target rate, 0 replays as fast as the consumer reads.
+    '''
+    def __init__(self, path, fps=0.0, cache_mb=2048, shape=None, prefetch=4, loop=True):
+        self.path = path
+        self.fps = fps
+        self.cache_bytes = cache_mb * 1024 * 1024
+        self.shape = tuple(shape) if shape is not None else None # frames of another size are resized to it once, when decoded
+        self.prefetch = prefetch
+        self.loop = loop
+        self.hits = 0 # frames that were already decoded when they were asked for
+        self.decoded = 0
+
+
+    def resolve(self):
+        # list of image paths, or a single video file
+        if os.path.isdir(self.path):
+            return sorted(p for p in glob.glob(os.path.join(self.path, "*")) if p.lower().endswith(IMAGE_EXTENSIONS)), None
+        if self.path.lower().endswith(VIDEO_EXTENSIONS):
+            return None, self.path
+        return sorted(glob.glob(self.path)), None
+
+
+    def start(self):
+        self.image_paths, self.video_path = self.resolve()
+        if self.video_path is not None:
+            self.capture = cv.VideoCapture(self.video_path)
+            self.next_video_index = 0
+            self.num_frames = int(self.capture.get(cv.CAP_PROP_FRAME_COUNT))
+        else:
+            self.num_frames = len(self.image_paths)
+        if self.num_frames == 0:
+            raise FileNotFoundError(f"no frames to replay in {self.path}")
+
+        self.cache = OrderedDict() # frame index -> decoded frame, least recently used first
+        self.cached_bytes = 0
+        self.position = 0
+        self.next_time = 0.0
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.prefetch_loop, name="replay_prefetch", daemon=True)
+        self.thread.start()
+
+
+    def decode(self, index):
+        if self.video_path is not None:
+            if index != self.next_video_index:
+                self.capture.set(cv.CAP_PROP_POS_FRAMES, index)
+            ok, frame = self.capture.read()
+            self.next_video_index = index + 1
+            if not ok:
+                raise IOError(f"could not decode frame {index} of {self.video_path}")
+        else:
+            frame = cv.imread(self.image_paths[index])
+            if frame is None:
+                raise IOError(f"could not decode {self.image_paths[index]}")
+        if self.shape is not None and frame.shape != self.shape:
+            frame = cv.resize(frame, (self.shape[1], self.shape[0]), interpolation=cv.INTER_AREA)
+        return frame
+
+
+    def insert(self, index, frame):
+        self.cache[index] = frame
+        self.cached_bytes += frame.nbytes
+        # evict the least recently used frames, but never the one just decoded
+        while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted.nbytes
+
+
+    def wanted(self):
+        # the first of the next prefetch frames that is not decoded yet
+        if not self.loop and self.position >= self.num_frames:
+            return None
+        window = min(self.prefetch, self.num_frames)
+        if self.cache:
+            # never prefetch more than the budget holds, that would evict frames before they are read
+            frame_bytes = next(iter(self.cache.values())).nbytes
+            window = min(window, max(1, self.cache_bytes // frame_bytes))
+        for offset in range(window):
+            index = (self.position + offset) % self.num_frames
+            if index not in self.cache:
+                return index
+        return None
+
+
+    def prefetch_loop(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                index = self.wanted()
+                if index is None:
+                    self.condition.wait(0.1)
+                    continue
+            frame = self.decode(index)
+            with self.condition:
+                self.insert(index, frame)
+                self.decoded += 1
+                self.condition.notify_all()
+
+
+    def get_frame(self, timeout=None):
+        # keep the target rate, a slow consumer just gets the next frame right away
+        if self.fps > 0:
+            now = time.perf_counter()
+            if self.next_time > now:
+                time.sleep(self.next_time - now)
+            self.next_time = max(self.next_time, now) + 1.0 / self.fps
+
+        with self.condition:
+            index = self.position
+            if not self.loop and index >= self.num_frames:
+                return None, None
+            if index in self.cache:
+                self.hits += 1
+            if not self.condition.wait_for(lambda: index in self.cache or self.stop_event.is_set(), timeout):
+                return None, None
+            if self.stop_event.is_set():
+                return None, None
+            self.cache.move_to_end(index)
+            frame = self.cache[index]
+            self.position = index + 1 if not self.loop else (index + 1) % self.num_frames
+            self.condition.notify_all()
+        return frame, no_release
+
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
+        if self.video_path is not None:
+            self.capture.release()
+
+
+
+def make_frame_source():
+    # the source picked in the settings, TESTING always replays the test images
+    if TESTING or FRAME_SOURCE == "replay":
+        return replay_source_t(REPLAY_PATH, REPLAY_FPS, REPLAY_CACHE_MB, ORIGINAL_IMAGE_SHAPE)
+    return arena_source_t()
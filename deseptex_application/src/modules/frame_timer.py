@@ -0,0 +1,31 @@
+import time
+from collections import deque
+
+
+
+class frame_timer_t:
+    '''
+    Rolling frame-time counter, call tick() once per rendered frame.
+    '''
+    def __init__(self, window=30):
+        self.stamps = deque(maxlen=window + 1)
+
+
+    def tick(self):
+        self.stamps.append(time.perf_counter())
+
+
+    def mean_frame_time(self):
+        # seconds between frames over the window, 0 when there are fewer than two frames
+        if len(self.stamps) < 2:
+            return 0.0
+        return (self.stamps[-1] - self.stamps[0]) / (len(self.stamps) - 1)
+
+
+    def fps(self):
+        frame_time = self.mean_frame_time()
+        return 1.0 / frame_time if frame_time > 0 else 0.0
+
+
+    def reset(self):
+        self.stamps.clear()
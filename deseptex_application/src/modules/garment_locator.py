@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import cv2 as cv
+
+
+
+class garment_locator_t:
+    '''
+    Finds the garment on the cutting table by differencing a downscaled frame against a stored empty-table reference.
+    locate returns a padded box around everything that differs from the reference, so the segmentation model
+    only sees the garment instead of a letterboxed frame that is mostly table.
+    '''
+    def __init__(self, reference_path=None, scale=0.125, threshold=25, padding=64, min_area_fraction=0.001, max_area_fraction=0.8):
+        self.reference_path = reference_path
+        self.scale = scale
+        self.threshold = threshold
+        self.padding = padding # pixels around the garment at full resolution, the post-processing dilation must fit in it
+        self.min_area_fraction = min_area_fraction # smaller blobs are noise, e.g. dust or a reflection
+        self.max_area_fraction = max_area_fraction # a box this large is not worth cropping
+        self.reference = None
+        if reference_path is not None and os.path.exists(reference_path):
+            self.reference = cv.imread(reference_path)
+
+
+    def prepare(self, image):
+        small = cv.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv.INTER_AREA)
+        return cv.GaussianBlur(small, (5, 5), 0)
+
+
+    def set_reference(self, image):
+        # image of the empty table, stored downscaled next to the calibration so it survives a restart
+        self.reference = self.prepare(image)
+        if self.reference_path is not None:
+            os.makedirs(os.path.dirname(self.reference_path) or ".", exist_ok=True)
+            cv.imwrite(self.reference_path, self.reference)
+
+
+    def foreground(self, image):
+        small = self.prepare(image)
+        if self.reference is None or small.shape != self.reference.shape:
+            return None
+        difference = cv.absdiff(small, self.reference).max(axis=2)
+        _, mask = cv.threshold(difference, self.threshold, 255, cv.THRESH_BINARY)
+        mask = cv.morphologyEx(mask, cv.MORPH_OPEN, cv.getStructuringElement(cv.MORPH_ELLIPSE, (3, 3)))
+        return cv.morphologyEx(mask, cv.MORPH_CLOSE, cv.getStructuringElement(cv.MORPH_ELLIPSE, (7, 7)))
+
+
+    def locate(self, image):
+        '''
+        Returns (x0, y0, x1, y1) of the garment in image coordinates, or None to use the full frame
+        (no reference yet, nothing found, or the garment covers most of the table).
+        '''
+        mask = self.foreground(image)
+        if mask is None:
+            return None
+        _, _, stats, _ = cv.connectedComponentsWithStats(mask)
+        blobs = stats[1:][stats[1:, cv.CC_STAT_AREA] >= self.min_area_fraction * mask.size]
+        if len(blobs) == 0:
+            return None
+
+        x0, y0 = blobs[:, cv.CC_STAT_LEFT].min(), blobs[:, cv.CC_STAT_TOP].min()
+        x1 = (blobs[:, cv.CC_STAT_LEFT] + blobs[:, cv.CC_STAT_WIDTH]).max()
+        y1 = (blobs[:, cv.CC_STAT_TOP] + blobs[:, cv.CC_STAT_HEIGHT]).max()
+        height, width = image.shape[:2]
+        x0 = max(int(np.floor(x0 / self.scale)) - self.padding, 0)
+        y0 = max(int(np.floor(y0 / self.scale)) - self.padding, 0)
+        x1 = min(int(np.ceil(x1 / self.scale)) + self.padding, width)
+        y1 = min(int(np.ceil(y1 / self.scale)) + self.padding, height)
+        if (x1 - x0) * (y1 - y0) > self.max_area_fraction * width * height:
+            return None
+        return (x0, y0, x1, y1)
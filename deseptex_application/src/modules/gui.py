@@ -1,36 +1,79 @@
+import time
 import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
 import numpy as np
-import cv2 as cv
-from multiprocessing.synchronize import Event as MpEvent, Lock as MpLock
-from multiprocessing.sharedctypes import SynchronizedArray
-from multiprocessing.managers import ListProxy
+from multiprocessing.synchronize import Event as MpEvent
 
-from modules.inferencer import inferencer_t
+from processes.inference_process import InferenceProcess
+from modules.inference_client import inference_client_t
+from processes.camera_process import CameraProcess
 from modules.laser_cutter import laser_cutter_t
-from modules.settings import TESTING, ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE
+from modules.cutter_queue import cutter_queue_t
+from modules.snapshot_archive import snapshot_archive_t
+from modules.frame_ring import frame_ring_t
+from modules.vertex_index import vertex_index_t
+from modules.contour_store import contour_store_t
+from modules.frame_timer import frame_timer_t
+from modules.motion_trigger import motion_trigger_t
+from modules.conveyor import conveyor_t
+from modules.inference_server import station_reference_path
+from modules.tracer import tracer, traced, trace_collector_t
+from modules.settings import TESTING, TRACING, TRACE_OVERLAY, RESULT_CACHE, SHARED_IMAGE_SHAPE, GUI_IMAGE_SHAPE, GARMENT_REFERENCE_PATH, CUTTER_JOB_TIMEOUT
+from modules.settings import INFERENCE_SERVER, STATION_NAME, CONVEYOR_STABLE_FRAMES, CONVEYOR_MOTION_THRESHOLD, CONVEYOR_MIN_CLASS_PROB, CONVEYOR_MIN_SEG_CONF, CONVEYOR_LOG_PATH
+
+
+
+OVERLAY_STAGES = ("inference.read_frame", "inferencer.classify", "inferencer.segment", "inferencer.postproc", "gui.show_contours", "gui.snap")
 
 class gui_t:
     def __init__(self, root:tk.Tk,
-                 inferencer:inferencer_t,
-                 shared_array:SynchronizedArray,
-                 lock:MpLock,
-                 contour_data:ListProxy,
+                 inference_proc:InferenceProcess|inference_client_t,
+                 camera_proc:CameraProcess,
+                 frame_ring:frame_ring_t,
+                 preview_ring:frame_ring_t,
+                 contour_data:contour_store_t,
                  running_event:MpEvent,
-                 laser_cutter:laser_cutter_t):
+                 laser_cutter:laser_cutter_t,
+                 startup_time:float,
+                 trace_collector:trace_collector_t|None=None,
+                 cutter_queue:cutter_queue_t|None=None,
+                 snapshot_archive:snapshot_archive_t|None=None):
         
         self.root = root
-        self.inferencer = inferencer
-        self.shared_array = shared_array
-        self.lock = lock
-        self.contour_data = contour_data
+        self.inference_proc = inference_proc
+        self.camera_proc = camera_proc
+        self.frame_ring = frame_ring # full resolution frames, only read by the inference process on a snap
+        self.preview_ring = preview_ring # RGB frames at GUI_IMAGE_SHAPE made by the camera process
+        self.contour_data = contour_data # GUI coordinates, edited in place
         self.running_event = running_event
         self.laser_cutter = laser_cutter
+        self.cutter_queue = cutter_queue # Finish only queues the job when given
+        self.snapshot_archive = snapshot_archive
+        self.snapshot = None # what the archive gets of the snap on the canvas, once it is finished or dropped
+        self.trace_collector = trace_collector
         
         self.update_job = None
+        self.shown_seq = 0 # sequence number of the frame currently on the canvas
+        self.snapped_seq = 0 # sequence number of the frame the contours belong to
+        self.snapped_contours = []
+        self.pending_request = None # (request id, frame sequence number) of the snap being inferred
+        self.snap_start = 0 # tracer time of the last snap request
         self.edit_mode = False
         self.refresh_time = 100  # milliseconds
+        self.poll_time = 50  # milliseconds
+        self.startup_time = startup_time # time.perf_counter() at the start of main
+        self.first_snap_logged = False
+        
+        # hands-free mode: a garment that lies still is snapped, confident results go to the cutter without a click
+        self.auto_mode = False
+        # the empty-table reference is where the garment locator stored it, the server keeps one per station;
+        # Auto stays disabled until there is one, without it an empty table after a cut would be snapped as well
+        reference_path = station_reference_path(STATION_NAME) if INFERENCE_SERVER else GARMENT_REFERENCE_PATH
+        self.motion_trigger = motion_trigger_t(CONVEYOR_STABLE_FRAMES, CONVEYOR_MOTION_THRESHOLD, empty_reference_path=reference_path)
+        self.conveyor = conveyor_t(frame_ring, preview_ring, inference_proc, laser_cutter, contour_data, running_event, self.motion_trigger,
+                                   CONVEYOR_MIN_CLASS_PROB, CONVEYOR_MIN_SEG_CONF, send_to_cutter=not TESTING, log_path=CONVEYOR_LOG_PATH,
+                                   cutter_queue=cutter_queue, snapshot_archive=snapshot_archive)
 
         self.root.title("Image Viewer")
         self.root.geometry("1000x700")
@@ -41,15 +84,30 @@ class gui_t:
         self.quit_button = ttk.Button(self.top_frame, text="Quit", command=self.root.quit)
         self.quit_button.pack(side="right")
 
-        self.snap_button = ttk.Button(self.top_frame, text="Snap", command=self.toggle_running)
+        self.snap_button = ttk.Button(self.top_frame, text="Snap", command=self.toggle_running, state="disabled") # enabled once camera and models are ready
         self.snap_button.pack(side="left")
 
         self.edit_button = ttk.Button(self.top_frame, text="Edit", command=self.toggle_edit, state="disabled")
         self.edit_button.pack(side="left")
 
-        self.finish_button = ttk.Button(self.top_frame, text="Finish", command=self.send_to_laser_cutter)
+        self.finish_button = ttk.Button(self.top_frame, text="Finish", command=self.send_to_laser_cutter, state="disabled") # enabled while the contours of a snap are shown
         self.finish_button.pack(side="left")
 
+        self.reference_button = ttk.Button(self.top_frame, text="Empty table", command=self.store_reference, state="disabled") # stores the reference of the garment locator
+        self.reference_button.pack(side="left")
+
+        self.auto_button = ttk.Button(self.top_frame, text="Auto", command=self.toggle_auto, state="disabled")
+        self.auto_button.pack(side="left")
+
+        self.status_label = ttk.Label(self.top_frame, text="")
+        self.status_label.pack(side="left", padx=10)
+
+        self.fps_label = ttk.Label(self.top_frame, text="")
+        self.fps_label.pack(side="right", padx=10)
+
+        self.cutter_label = ttk.Label(self.top_frame, text="")
+        self.cutter_label.pack(side="right", padx=10)
+
         self.canvas_frame = ttk.Frame(self.root)
         self.canvas_frame.pack(fill="both", expand=True)
 
@@ -61,48 +119,236 @@ class gui_t:
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_up)
 
+        # canvas items are created once and updated in place
+        self.tk_img = None
+        self.image_item = None
+        self.polygon_items = [] # one canvas item per contour (None for contours with less than 3 points)
+        self.dirty_polygons = set() # indices of contours whose canvas item needs new coordinates
+        self.redraw_job = None
+        self.view_timer = frame_timer_t()
+        self.drag_timer = frame_timer_t()
+
         self.point_radius = 5
-        self.hover_circle = None
+        self.hover_circle = self.canvas.create_oval(0, 0, 0, 0, outline='blue', width=2, state='hidden')
         self.dragging_point = None  # (polygon_index, point_index)
+        self.hit_threshold = 10 # pixels
+        self.vertex_index = vertex_index_t(self.hit_threshold) # kept in sync with contour_data by the edit handlers
+
+        # stage breakdown of the last snap, only when tracing
+        self.trace_overlay = None
+        if TRACING and TRACE_OVERLAY and self.trace_collector is not None:
+            self.trace_overlay = self.canvas.create_text(10, 10, anchor="nw", fill="yellow", font=("Courier", 10), text="")
+            self.update_trace_overlay()
 
+        self.camera_status = "starting"
+        self.models_status = "loading"
+        self.status_text = None
+        self.update_status()
         self.update_content()
+        if self.cutter_queue is not None:
+            self.update_cutter_status()
         
         self.root.bind("<BackSpace>", self.on_backspace)
         self.root.bind("<Delete>", self.on_delete)
         self.root.bind("n", self.on_n)
 
+    def update_status(self):
+        # poll the readiness of the background components until both are up (or one of them died),
+        # then keep an eye on the connection to the inference server
+        elapsed = time.perf_counter() - self.startup_time
+        if self.camera_status == "starting":
+            if self.camera_proc.ready_event.is_set():
+                self.camera_status = "ready"
+                print(f"Time to first frame: {elapsed:.1f} s")
+            elif not self.camera_proc.is_alive():
+                self.camera_status = "failed"
+        if self.models_status == "loading":
+            if self.inference_proc.ready_event.is_set():
+                self.models_status = "ready"
+                print(f"Models ready after {elapsed:.1f} s")
+            elif not self.inference_proc.is_alive():
+                self.models_status = "failed"
+        elif self.models_status == "ready" and not self.inference_proc.is_alive():
+            # snaps get no contours until the station is back on the server
+            self.models_status = "disconnected" if INFERENCE_SERVER else "failed"
+        elif self.models_status == "disconnected" and self.inference_proc.ready_event.is_set():
+            self.models_status = "ready"
+            print("Reconnected to the inference server")
+        
+        status_text = f"camera: {self.camera_status}   models: {self.models_status}"
+        if status_text != self.status_text:
+            self.status_text = status_text
+            self.status_label.config(text=status_text)
+            if self.camera_status == "ready" and self.models_status == "ready":
+                self.snap_button.config(state="normal")
+                self.reference_button.config(state="normal")
+                if self.motion_trigger.empty is not None:
+                    self.auto_button.config(state="normal")
+        if "failed" not in (self.camera_status, self.models_status):
+            self.root.after(200, self.update_status)
+
+
+    @traced("gui.toggle_running")
     def toggle_running(self):
+        if self.auto_mode:
+            # in auto mode the button only skips the garment being handled
+            if self.conveyor.state != "watching":
+                self.conveyor.skip()
+                self.show_running()
+            return
+        
         if self.running_event.is_set():
-            # get image from shared memory
-            with self.lock:
-                img_np = np.frombuffer(self.shared_array.get_obj(), dtype=np.uint8).reshape(SHARED_IMAGE_SHAPE).copy() #type: ignore
-            
-            # do inference
-            self.contour_data = self.inferencer.run_inference_with_postproc(img_np)
+            # snap the frame of the latest preview, the preview shares its sequence number and its frame is always
+            # complete; the inference process reads the frame itself
+            seq = self.preview_ring.latest_seq()
+            if seq == 0:
+                return
             
-            # resize contour data to match the GUI image shape
-            for i in range(len(self.contour_data)):
-                self.contour_data[i] = np.array(self.contour_data[i]) * (GUI_IMAGE_SHAPE[1] / SHARED_IMAGE_SHAPE[1], GUI_IMAGE_SHAPE[0] / SHARED_IMAGE_SHAPE[0]) #type: ignore
-                self.contour_data[i] = self.contour_data[i].astype(np.int32)
-
-            # draw resulting contours on the canvas
-            self.update_polygons()
-            
-            # update other variables
+            # pause the camera and show the snapped frame, not a frame the camera published in the meantime
             self.running_event.clear()
-            self.edit_button.config(state="normal")
-            self.snap_button.config(text="Resume")
+            self.update_image(seq)
             if self.update_job is not None:
                 self.root.after_cancel(self.update_job)
                 self.update_job = None
+            self.snap_button.config(text="Resume")
+            
+            # do inference in the inference process, unless the contours of this frame are already known
+            if seq == self.snapped_seq:
+                self.show_contours()
+                self.begin_snapshot(seq, self.snapped_contours, None)
+            else:
+                self.snap_start = tracer.now()
+                self.pending_request = (self.inference_proc.submit(seq), seq)
+                self.root.after(self.poll_time, self.poll_inference)
         else:
+            # drop the running snap, its result is no longer needed
+            if self.pending_request is not None:
+                self.inference_proc.cancel(self.pending_request[0])
+                self.pending_request = None
+            self.archive_snapshot("not_cut")
+            
             self.running_event.set()
-            self.edit_button.config(state="disabled")
-            self.edit_mode = False
-            self.snap_button.config(text="Snap")
+            self.contour_data.clear()
+            self.show_running()
+
+
+    def show_running(self):
+        # back to the live view after a snap
+        self.vertex_index.clear()
+        self.update_polygons() # clear the polygons of the previous snap
+        self.view_timer.reset()
+        self.edit_button.config(state="disabled")
+        self.finish_button.config(state="disabled")
+        self.edit_mode = False
+        self.snap_button.config(text="Snap")
+        if self.update_job is None:
             self.update_content()
 
 
+    def toggle_auto(self):
+        self.auto_mode = not self.auto_mode
+        if self.auto_mode:
+            if not self.running_event.is_set():
+                self.toggle_running() # leave the manual snap
+            self.auto_button.config(text="Auto: on")
+            self.poll_conveyor()
+        else:
+            self.conveyor.skip()
+            self.auto_button.config(text="Auto")
+            self.show_running()
+            print(self.conveyor.summary())
+
+
+    def poll_conveyor(self):
+        if not self.auto_mode:
+            return
+        event = self.conveyor.poll()
+        if event == "snapped":
+            self.update_image(self.conveyor.current["seq"])
+            if self.update_job is not None:
+                self.root.after_cancel(self.update_job)
+                self.update_job = None
+            self.snap_button.config(text="Skip")
+        elif event in ("cut", "empty"):
+            self.show_running()
+        elif event == "review":
+            # low confidence, the operator corrects the contours and presses Finish (or Skip)
+            self.vertex_index.build(self.contour_data)
+            self.update_polygons()
+            self.edit_button.config(state="normal")
+            self.finish_button.config(state="normal")
+            self.edit_mode = True
+        if event is not None:
+            self.status_label.config(text=f"auto: {self.conveyor.state}   {self.conveyor.garments_per_hour():.0f} garments/hour")
+        self.root.after(self.poll_time, self.poll_conveyor)
+
+
+    def store_reference(self):
+        # the latest frame becomes the empty-table reference, only press this with nothing on the table
+        seq = self.preview_ring.latest_seq()
+        if seq != 0:
+            self.inference_proc.store_reference(seq)
+            _, preview = self.preview_ring.read(seq)
+            if preview is not None:
+                self.motion_trigger.set_empty(preview)
+                self.auto_button.config(state="normal")
+
+
+    def poll_inference(self):
+        if self.pending_request is None:
+            return # cancelled in the meantime
+        
+        request_id, seq = self.pending_request
+        contours = self.inference_proc.poll(request_id)
+        if contours is None:
+            self.root.after(self.poll_time, self.poll_inference)
+            return
+        
+        self.pending_request = None
+        tracer.record("gui.snap", self.snap_start, tracer.now(), {"seq": seq})
+        self.snapped_contours = contours
+        self.snapped_seq = seq
+        self.show_contours()
+        self.begin_snapshot(seq, contours, (tracer.now() - self.snap_start) / 1e9)
+        
+        if RESULT_CACHE:
+            print(f"result cache: {self.inference_proc.cache_hits.value} hits, {self.inference_proc.cache_misses.value} misses")
+        
+        if not self.first_snap_logged:
+            self.first_snap_logged = True
+            print(f"Time to first snap: {time.perf_counter() - self.startup_time:.1f} s")
+
+
+    def begin_snapshot(self, seq, contours, inference_s):
+        if self.snapshot_archive is None:
+            return
+        confidence = self.inference_proc.last_confidence or {}
+        self.snapshot = {"seq": seq, "predicted": contours, "shown": time.perf_counter(),
+                         "meta": {"mode": "manual", **confidence, "inference_s": inference_s}}
+
+
+    def archive_snapshot(self, outcome):
+        # the frame is still in the frame ring, the archive copies it and writes it in the background
+        if self.snapshot is None:
+            return
+        meta = {**self.snapshot["meta"], "outcome": outcome, "review_s": time.perf_counter() - self.snapshot["shown"]}
+        self.snapshot_archive.submit(self.frame_ring, self.snapshot["seq"], self.snapshot["predicted"], self.contour_data.to_list(), meta)
+        self.snapshot = None
+
+
+    def show_contours(self):
+        with tracer.span("gui.show_contours"):
+            # resize contour data to match the GUI image shape, one vectorized pass over the store
+            self.contour_data.set_contours(self.snapped_contours)
+            self.contour_data.scale(GUI_IMAGE_SHAPE[1] / SHARED_IMAGE_SHAPE[1], GUI_IMAGE_SHAPE[0] / SHARED_IMAGE_SHAPE[0])
+
+            # draw resulting contours on the canvas
+            self.vertex_index.build(self.contour_data)
+            self.update_polygons()
+        self.edit_button.config(state="normal")
+        self.finish_button.config(state="normal")
+
+
     def toggle_edit(self):
         self.edit_mode = not self.edit_mode
 
@@ -115,22 +361,93 @@ class gui_t:
             self.update_job = None
     
     
-    def update_image(self):
-        with self.lock:
-            img_np = np.frombuffer(self.shared_array.get_obj(), dtype=np.uint8).reshape(SHARED_IMAGE_SHAPE).copy() #type: ignore
-        resized_img_np = cv.resize(img_np, (GUI_IMAGE_SHAPE[1],GUI_IMAGE_SHAPE[0]))
-        img = Image.fromarray(cv.cvtColor(resized_img_np, cv.COLOR_BGR2RGB))
-        self.tk_img = ImageTk.PhotoImage(img)
-        self.canvas.delete("all")
-        self.canvas.create_image(0, 0, anchor='nw', image=self.tk_img)
+    def update_image(self, seq=None):
+        # the preview of frame seq (default: the latest), nothing to do when it is already shown
+        if seq is None:
+            seq, _, preview = self.preview_ring.latest()
+        else:
+            slot = self.preview_ring.find(seq)
+            preview = self.preview_ring.frames[slot] if slot >= 0 else None
+        if preview is None or seq == self.shown_seq:
+            return
+        self.shown_seq = seq
+        
+        with tracer.span("gui.update_image", seq=seq):
+            # the preview is already resized and converted to RGB, it is read straight from the shared slot
+            img = Image.fromarray(preview)
+            
+            # one PhotoImage and one canvas item for the whole session, new frames are pasted into it
+            if self.tk_img is None:
+                self.tk_img = ImageTk.PhotoImage(img)
+                self.image_item = self.canvas.create_image(0, 0, anchor='nw', image=self.tk_img)
+                self.canvas.tag_lower(self.image_item)
+            else:
+                self.tk_img.paste(img)
+        self.view_timer.tick()
+        self.update_fps_label()
+    
+    
+    def update_cutter_status(self):
+        self.cutter_label.config(text=self.cutter_queue.status())
+        self.root.after(500, self.update_cutter_status)
+    
+    
+    def update_fps_label(self):
+        self.fps_label.config(text=f"view {self.view_timer.fps():.1f} fps   drag {self.drag_timer.fps():.0f} fps")
+    
+    
+    def update_trace_overlay(self):
+        # merge the spans of all processes and show the most recent duration of every snap stage
+        tracer.flush()
+        self.trace_collector.drain()
+        lines = [f"{stage.split('.')[-1]:12s} {self.trace_collector.last[stage]:8.1f} ms" for stage in OVERLAY_STAGES if stage in self.trace_collector.last]
+        lines.append(f"{'preview':12s} {self.view_timer.fps():8.1f} fps")
+        self.canvas.itemconfigure(self.trace_overlay, text="\n".join(lines))
+        self.canvas.tag_raise(self.trace_overlay)
+        self.root.after(500, self.update_trace_overlay)
+    
+    
+    def polygon_coords(self, cnt):
+        return np.asarray(cnt).ravel().tolist()
+    
+    
+    def create_polygon_item(self, cnt):
+        if len(cnt) <= 2:
+            return None
+        return self.canvas.create_polygon(self.polygon_coords(cnt), outline='red', fill='', width=2, tags="polygon")
     
     
     def update_polygons(self):
+        # full rebuild, only needed when a new set of contours is shown
         self.canvas.delete("polygon")
-        for cnt in self.contour_data:
-            if len(cnt) > 2:
-                flat = [coord for point in cnt for coord in point]
-                self.canvas.create_polygon(flat, outline='red', fill='', width=2, tags="polygon")
+        self.polygon_items = [self.create_polygon_item(cnt) for cnt in self.contour_data]
+        self.dirty_polygons.clear()
+    
+    
+    def update_polygon(self, poly_idx):
+        # coalesce redraws: the coordinates are pushed to the canvas once per idle cycle
+        self.dirty_polygons.add(poly_idx)
+        if self.redraw_job is None:
+            self.redraw_job = self.root.after_idle(self.flush_polygons)
+    
+    
+    def flush_polygons(self):
+        self.redraw_job = None
+        for poly_idx in self.dirty_polygons:
+            if poly_idx >= len(self.polygon_items):
+                continue
+            cnt = self.contour_data[poly_idx]
+            item = self.polygon_items[poly_idx]
+            if item is None or len(cnt) <= 2:
+                if item is not None:
+                    self.canvas.delete(item)
+                self.polygon_items[poly_idx] = self.create_polygon_item(cnt)
+            else:
+                self.canvas.coords(item, self.polygon_coords(cnt))
+        self.dirty_polygons.clear()
+        if self.dragging_point is not None:
+            self.drag_timer.tick()
+            self.update_fps_label()
     
     
     def on_mouse_move(self, event):
@@ -164,38 +481,33 @@ class gui_t:
         if not self.edit_mode or self.dragging_point is None:
             return
         poly_idx, pt_idx = self.dragging_point
-        polygon = self.contour_data[poly_idx]
-        polygon[pt_idx] = [event.x, event.y]
-        self.contour_data[poly_idx] = polygon # assignment necessary on this level to update the manager list
-        self.update_polygons()
+        self.contour_data.set_vertex(poly_idx, pt_idx, (event.x, event.y))
+        self.vertex_index.move_vertex(poly_idx, pt_idx, event.x, event.y)
+        self.update_polygon(poly_idx)
         self.show_hover_circle(event.x, event.y)
 
 
     def on_mouse_up(self, event):
         self.dragging_point = None
+        self.drag_timer.reset()
         self.hide_hover_circle()
     
     
     def show_hover_circle(self, x, y):
-        self.hide_hover_circle()
-        self.hover_circle = self.canvas.create_oval(
-            x - self.point_radius, y - self.point_radius,
-            x + self.point_radius, y + self.point_radius,
-            outline='blue', width=2)
+        self.canvas.coords(self.hover_circle,
+                           x - self.point_radius, y - self.point_radius,
+                           x + self.point_radius, y + self.point_radius)
+        self.canvas.itemconfigure(self.hover_circle, state='normal')
+        self.canvas.tag_raise(self.hover_circle)
 
 
     def hide_hover_circle(self):
-        if self.hover_circle is not None:
-            self.canvas.delete(self.hover_circle)
-            self.hover_circle = None
+        self.canvas.itemconfigure(self.hover_circle, state='hidden')
             
             
-    def find_closest_point(self, x, y, threshold=10):
-        for poly_idx, contour in enumerate(self.contour_data):
-            for pt_idx, (px, py) in enumerate(contour):
-                if (x - px)**2 + (y - py)**2 <= threshold**2:
-                    return (poly_idx, pt_idx)
-        return None
+    def find_closest_point(self, x, y, threshold=None):
+        # nearest vertex within threshold, looked up in the spatial index instead of scanning every vertex
+        return self.vertex_index.nearest(x, y, self.hit_threshold if threshold is None else threshold)
 
     
     def on_backspace(self, event):  
@@ -208,17 +520,10 @@ class gui_t:
         closest = self.find_closest_point(x, y)
         if closest:
             poly_idx, pt_idx = closest
-            polygon = self.contour_data[poly_idx]
-
-            if len(polygon) > 3:  # Ensure it remains a valid polygon
-                # check if polygon is a list
-                if not isinstance(polygon, list):
-                    polygon_list = polygon.tolist()
-                else:
-                    polygon_list = polygon
-                del polygon_list[pt_idx]
-                self.contour_data[poly_idx] = np.array(polygon_list, dtype=np.int32) # type: ignore
-                self.update_polygons()
+            if len(self.contour_data[poly_idx]) > 3:  # Ensure it remains a valid polygon
+                self.contour_data.delete_vertex(poly_idx, pt_idx)
+                self.vertex_index.update_polygon(poly_idx, self.contour_data[poly_idx])
+                self.update_polygon(poly_idx)
                 self.hide_hover_circle()
 
     
@@ -233,7 +538,11 @@ class gui_t:
         if closest:
             poly_idx, _ = closest
             del self.contour_data[poly_idx]
-            self.update_polygons()
+            self.vertex_index.remove_polygon(poly_idx)
+            item = self.polygon_items.pop(poly_idx)
+            if item is not None:
+                self.canvas.delete(item)
+            self.dirty_polygons = {i - (i > poly_idx) for i in self.dirty_polygons if i != poly_idx}
             self.hide_hover_circle()
     
     
@@ -249,19 +558,38 @@ class gui_t:
                                 [x + size, y - size],
                                 [x + size, y + size],
                                 [x - size, y + size]], dtype=np.int32)
-        self.contour_data.append(new_contour) # type: ignore
-        self.update_polygons()
+        self.contour_data.append(new_contour)
+        self.vertex_index.add_polygon(new_contour)
+        self.polygon_items.append(self.create_polygon_item(new_contour))
     
     
     def send_to_laser_cutter(self):
-        resized_contour_data = []
-        for i in range(len(self.contour_data)):
-            new_contour = np.array(self.contour_data[i]) * (ORIGINAL_IMAGE_SHAPE[1] / GUI_IMAGE_SHAPE[1], ORIGINAL_IMAGE_SHAPE[0] / GUI_IMAGE_SHAPE[0])
-            new_contour = np.concatenate((new_contour, new_contour[:1]), axis=0)
-            resized_contour_data.append(new_contour)
-            resized_contour_data[i] = resized_contour_data[i].astype(np.int32)
-
-        self.laser_cutter.prepare_svg(resized_contour_data)
+        if self.auto_mode:
+            # finishes the review of a low-confidence garment, the conveyor sends it and watches for the next one
+            if self.conveyor.state == "review":
+                self.conveyor.finish_review()
+                self.show_running()
+            return
+        
+        # only the contours of the snap on screen are cut, and only once: a second Finish would cut the garment twice
+        if self.running_event.is_set() or self.pending_request is not None:
+            return
+        self.finish_button.config(state="disabled")
+        
+        if self.cutter_queue is not None:
+            # the SVG is written and sent in the background, the next garment can be snapped right away
+            job = self.cutter_queue.submit(self.contour_data)
+            print(f"cutter job {job.job_id} queued")
+            self.archive_snapshot("cut")
+            return
+        
+        # the laser cutter maps the whole store to machine coordinates in one precomputed transform
+        self.laser_cutter.prepare_svg(self.contour_data)
         if not TESTING:
-            self.laser_cutter.start_cutter()
-            self.laser_cutter.send_svg_to_cutter()
\ No newline at end of file
+            try:
+                self.laser_cutter.start_cutter()
+                # the cutter acknowledges the LOADFILE once the garment is cut, CUTTER_TIMEOUT is far too short for that
+                self.laser_cutter.send_svg_to_cutter(timeout=CUTTER_JOB_TIMEOUT)
+            except TimeoutError as e:
+                print(e)
+        self.archive_snapshot("cut")
@@ -0,0 +1,164 @@
+import time
+import threading
+from multiprocessing import Value
+from multiprocessing.connection import Client
+
+from modules.frame_ring import frame_ring_t
+
+
+
+class inference_client_t:
+    '''
+    Station side of the shared inference server (modules/inference_server.py), with the interface of InferenceProcess
+    so the GUI does not care which one it gets. The frame ring is passed to the server once, by the name of its shared
+    memory; a snap only sends the sequence number of the frame. When the server goes away the station reconnects in the background.
+    '''
+    def __init__(self, frame_ring:frame_ring_t, station, address, authkey, connect_timeout=60.0):
+        self.frame_ring = frame_ring
+        self.station = station
+        self.address = address
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout # the server may still be loading its models
+        self.conn = None
+        self.results = {} # results read while waiting for something else, by request id
+        self.pending = set() # ids of the requests the server has not answered yet
+        self.last_request_id = 0
+        self.last_confidence = None # confidence of the result poll returned last, see inferencer_t.confidence_of
+        self.ready_event = threading.Event() # set while the server has accepted the station, cleared when the connection is lost
+        self.disconnected = False # the connection was lost, a new one is being made in the background
+        self.closed = False
+        self.cache_hits = Value('q', 0) # counters of the result cache of this station on the server
+        self.cache_misses = Value('q', 0)
+
+
+    def start(self):
+        self.connect_thread = threading.Thread(target=self.connect, args=(self.connect_timeout,), name="inference_client_connect", daemon=True)
+        self.connect_thread.start()
+
+
+    def connect(self, timeout=None):
+        # without a timeout it keeps trying, a server that went away may take a while to load its models again
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.closed:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except OSError:
+                if deadline is not None and time.perf_counter() > deadline:
+                    print(f"No inference server at {self.address}")
+                    return
+                time.sleep(0.5)
+                continue
+            try:
+                conn.send(("hello", self.station, self.frame_ring))
+                conn.recv() # ("ready",)
+            except (EOFError, OSError):
+                conn.close() # the server went away during the handshake, try again
+                continue
+            self.conn = conn
+            self.disconnected = False
+            self.ready_event.set()
+            return
+
+
+    def disconnect(self, error):
+        # the server went away: the requests still waiting get an empty result and a new connection is made in the background
+        if self.conn is None:
+            return
+        print(f"Inference server connection lost: {error!r}")
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        self.conn = None
+        self.disconnected = True
+        self.ready_event.clear()
+        for request_id in self.pending:
+            self.results[request_id] = ([], None)
+        self.pending.clear()
+        self.connect_thread = threading.Thread(target=self.connect, name="inference_client_reconnect", daemon=True)
+        self.connect_thread.start()
+
+
+    def is_alive(self):
+        return self.conn is not None or (self.connect_thread.is_alive() and not self.disconnected)
+
+
+    def send(self, message):
+        # False when there is no connection (anymore)
+        if self.conn is None:
+            return False
+        try:
+            self.conn.send(message)
+        except (EOFError, OSError) as e:
+            self.disconnect(e)
+            return False
+        return True
+
+
+    def submit(self, seq, use_cache=True):
+        self.last_request_id += 1
+        if self.send(("snap", self.last_request_id, seq, use_cache)):
+            self.pending.add(self.last_request_id)
+        else:
+            self.results[self.last_request_id] = ([], None)
+        return self.last_request_id
+
+
+    def store_reference(self, seq):
+        self.send(("reference", seq))
+
+
+    def cancel(self, request_id):
+        self.pending.discard(request_id)
+        self.send(("cancel", request_id))
+
+
+    def receive(self):
+        message = self.conn.recv()
+        if message[0] == "result":
+            _, request_id, _, contours, confidence, (hits, misses) = message
+            self.pending.discard(request_id)
+            self.results[request_id] = (contours, confidence)
+            self.cache_hits.value, self.cache_misses.value = hits, misses
+        return message
+
+
+    def poll(self, request_id):
+        '''
+        Non-blocking check for the result of request_id.
+        Returns the contours, or None while the request is still running. Their confidence is in self.last_confidence.
+        A request that was waiting when the connection to the server was lost gets no contours.
+        '''
+        try:
+            while self.conn is not None and self.conn.poll():
+                self.receive()
+        except (EOFError, OSError) as e:
+            self.disconnect(e)
+        # results of older (cancelled) requests are dropped
+        for old_id in [i for i in self.results if i < request_id]:
+            del self.results[old_id]
+        if request_id not in self.results:
+            return None
+        contours, self.last_confidence = self.results.pop(request_id)
+        return contours
+
+
+    def server_stats(self):
+        # blocks until the server answers, results that arrive meanwhile are kept for poll; None without a connection
+        if not self.send(("stats",)):
+            return None
+        try:
+            while True:
+                message = self.receive()
+                if message[0] == "stats":
+                    return message[1]
+        except (EOFError, OSError) as e:
+            self.disconnect(e)
+            return None
+
+
+    def close(self):
+        self.closed = True
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,296 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+from collections import deque, Counter, defaultdict
+from multiprocessing.connection import Listener, wait
+
+from modules.garment_locator import garment_locator_t
+from modules.tracer import tracer
+from modules.settings import GARMENT_ROI, GARMENT_REFERENCE_PATH
+
+
+
+def station_reference_path(station):
+    # every table has its own empty-table reference
+    root, extension = os.path.splitext(GARMENT_REFERENCE_PATH)
+    return f"{root}_{station}{extension}"
+
+
+def percentile_ms(values, q):
+    return float(np.percentile(values, q)) * 1000 if len(values) else 0.0
+
+
+
+class client_t:
+    '''
+    A connected station: its connection, its frame ring in shared memory, its queued snaps and latency stats.
+    '''
+    def __init__(self, conn):
+        self.conn = conn
+        self.station = None # set by the hello message
+        self.frame_ring = None
+        self.garment_locator = None
+        self.result_cache = None # every station has its own, another table never gets its contours
+        self.pending = deque() # (request id, seq, frame, arrival time, use cache) in arrival order
+        self.cancelled_id = 0 # queued snaps with an id up to this value are dropped
+        self.waits = deque(maxlen=1000) # seconds from arrival to the start of the batch
+        self.latencies = deque(maxlen=1000) # seconds from arrival to the result
+        self.served = 0
+
+
+    def attach(self, station, frame_ring):
+        self.station = station
+        self.frame_ring = frame_ring
+        if os.name == "posix":
+            # the ring belongs to the station, the resource tracker of this process must not unlink it at exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(frame_ring.shm._name, "shared_memory") #type: ignore
+        if GARMENT_ROI:
+            self.garment_locator = garment_locator_t(station_reference_path(station))
+
+
+    def close(self):
+        self.conn.close()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+
+
+
+class inference_server_t:
+    '''
+    One inferencer shared by several stations. A station connects with inference_client_t and passes its frame ring,
+    a snap only sends the sequence number of the frame and the frame is read from the shared memory of the station.
+    Snaps that arrive within batch_window of each other are inferred together, up to max_batch, with one classifier
+    call and one segmentation call per garment class. Batches take one snap per station in turn, so a station with many
+    queued snaps cannot starve the others. make_result_cache(station) returns the result cache of a station that connects.
+    '''
+    def __init__(self, inferencer, address, authkey, max_batch=4, batch_window=0.05, make_result_cache=None):
+        self.inferencer = inferencer
+        self.address = address
+        self.authkey = authkey
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.make_result_cache = make_result_cache
+        self.clients = []
+        self.next_client = 0 # index of the client that goes first in the next batch
+        self.new_connections = queue.Queue()
+        self.batch_sizes = Counter()
+        self.busy_time = 0.0
+        self.start_time = time.perf_counter()
+
+
+    def start(self):
+        self.listener = Listener(self.address, authkey=self.authkey)
+        self.accept_thread = threading.Thread(target=self.accept_loop, name="inference_server_accept", daemon=True)
+        self.accept_thread.start()
+        print(f"Inference server listening on {self.listener.address}")
+        return self
+
+
+    def accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return # listener closed
+            except Exception as e:
+                print(f"Rejected a connection: {e}") # e.g. a wrong authkey
+                continue
+            self.new_connections.put(conn)
+
+
+    def serve(self, stop_event=None, stats_interval=None):
+        last_stats = time.perf_counter()
+        while stop_event is None or not stop_event.is_set():
+            while not self.new_connections.empty():
+                self.clients.append(client_t(self.new_connections.get()))
+
+            self.receive(self.wait_time())
+            batch = self.next_batch()
+            if batch:
+                self.run_batch(batch)
+                tracer.flush()
+
+            if stats_interval is not None and time.perf_counter() - last_stats > stats_interval:
+                last_stats = time.perf_counter()
+                if any(client.served for client in self.clients):
+                    print(self.report())
+
+
+    def wait_time(self):
+        # block on the connections until the batch window of the oldest queued snap closes
+        arrivals = [client.pending[0][3] for client in self.clients if client.pending]
+        if not arrivals:
+            return 0.1
+        return max(0.0, min(arrivals) + self.batch_window - time.perf_counter())
+
+
+    def receive(self, timeout):
+        connections = {client.conn: client for client in self.clients}
+        if not connections:
+            time.sleep(timeout)
+            return
+        for conn in wait(list(connections), timeout):
+            client = connections[conn]
+            try:
+                while True:
+                    self.handle(client, conn.recv())
+                    if not conn.poll():
+                        break
+            except (EOFError, OSError):
+                self.disconnect(client)
+
+
+    def disconnect(self, client):
+        if client not in self.clients:
+            return
+        print(f"Station {client.station} disconnected")
+        self.clients.remove(client)
+        client.close()
+
+
+    def send(self, client, message):
+        try:
+            client.conn.send(message)
+        except OSError:
+            self.disconnect(client)
+
+
+    def handle(self, client, message):
+        kind = message[0]
+        if kind == "hello":
+            _, station, frame_ring = message
+            client.attach(station, frame_ring)
+            if self.make_result_cache is not None:
+                client.result_cache = self.make_result_cache(station)
+            print(f"Station {station} connected")
+            self.send(client, ("ready",))
+
+        elif kind == "snap":
+            _, request_id, seq, use_cache = message
+            # copy the frame now, the station may overwrite the slot once it resumes
+            seq, frame = client.frame_ring.read(seq)
+            if frame is None:
+                self.send(client, ("result", request_id, seq, [], None, self.cache_counts(client)))
+            else:
+                client.pending.append((request_id, seq, frame, time.perf_counter(), use_cache))
+
+        elif kind == "cancel":
+            client.cancelled_id = max(client.cancelled_id, message[1])
+            client.pending = deque(item for item in client.pending if item[0] > client.cancelled_id)
+
+        elif kind == "reference":
+            seq, frame = client.frame_ring.read(message[1])
+            if frame is not None and client.garment_locator is not None:
+                client.garment_locator.set_reference(frame)
+                if client.result_cache is not None:
+                    client.result_cache.clear() # the garment crop of this station changes with its reference
+                print(f"Empty-table reference of station {client.station} stored")
+
+        elif kind == "stats":
+            self.send(client, ("stats", self.stats()))
+
+
+    def next_batch(self):
+        # snaps wait for others to batch with until the window of the oldest one closes or the batch is full
+        queued = sum(len(client.pending) for client in self.clients)
+        if queued == 0 or (queued < self.max_batch and self.wait_time() > 0):
+            return []
+
+        # one snap per station in turn, starting with a different station every batch
+        order = self.clients[self.next_client:] + self.clients[:self.next_client]
+        self.next_client = (self.next_client + 1) % len(self.clients)
+        batch = []
+        while len(batch) < self.max_batch and any(client.pending for client in order):
+            for client in order:
+                if client.pending and len(batch) < self.max_batch:
+                    batch.append((client, client.pending.popleft()))
+        return batch
+
+
+    def infer(self, frames, garment_locators, result_caches=None):
+        # cutting contours and their confidence for every frame, one classifier call and one segmentation call per garment class
+        inferencer = self.inferencer
+        contours = [None] * len(frames)
+        confidences = [None] * len(frames)
+        fingerprints = [None] * len(frames)
+        result_caches = result_caches or [None] * len(frames)
+        for i, (frame, result_cache) in enumerate(zip(frames, result_caches)):
+            if result_cache is not None:
+                fingerprints[i] = result_cache.fingerprint(frame, garment_locators[i])
+                contours[i] = result_cache.lookup(fingerprints[i])
+                confidences[i] = result_cache.meta if contours[i] is not None else None
+
+        todo = [i for i in range(len(frames)) if contours[i] is None]
+        groups = defaultdict(list)
+        class_probs = {}
+        for i, selected_class in zip(todo, inferencer.classify([frames[i] for i in todo]) if todo else []):
+            class_probs[i] = inferencer.class_probs[len(class_probs)]
+            if selected_class is None:
+                contours[i] = []
+                confidences[i] = inferencer.confidence_of(None, class_probs[i], None, None)
+            else:
+                groups[selected_class].append(i)
+
+        for selected_class, indices in groups.items():
+            relevant_indices = inferencer.relevant_indices[selected_class]
+            results = inferencer.segment_batch([frames[i] for i in indices], selected_class, [garment_locators[i] for i in indices])
+            for i, (result, roi) in zip(indices, results):
+                contours[i] = inferencer.postprocess(result, relevant_indices, frames[i].shape, roi)
+                confidences[i] = inferencer.confidence_of(selected_class, class_probs[i], result, relevant_indices)
+                if result_caches[i] is not None:
+                    result_caches[i].insert(fingerprints[i], contours[i], confidences[i])
+        return list(zip(contours, confidences))
+
+
+    def run_batch(self, batch):
+        start = time.perf_counter()
+        with tracer.span("server.batch", size=len(batch)):
+            outputs = self.infer([item[2] for _, item in batch], [client.garment_locator for client, _ in batch], [client.result_cache if item[4] else None for client, item in batch])
+        end = time.perf_counter()
+        self.busy_time += end - start
+        self.batch_sizes[len(batch)] += 1
+
+        for (client, (request_id, seq, _, arrival, _)), (result, confidence) in zip(batch, outputs):
+            client.waits.append(start - arrival)
+            client.latencies.append(end - arrival)
+            client.served += 1
+            if request_id > client.cancelled_id and client in self.clients:
+                self.send(client, ("result", request_id, seq, result, confidence, self.cache_counts(client)))
+
+
+    def cache_counts(self, client):
+        if client.result_cache is None:
+            return (0, 0)
+        return (client.result_cache.hits, client.result_cache.misses)
+
+
+    def stats(self):
+        uptime = time.perf_counter() - self.start_time
+        return {"uptime_s": uptime,
+                "busy_fraction": self.busy_time / uptime if uptime > 0 else 0.0,
+                "batch_sizes": dict(self.batch_sizes),
+                "stations": {client.station: {"served": client.served, "queued": len(client.pending),
+                                              "cache": client.result_cache.stats() if client.result_cache is not None else None,
+                                              "wait_p50_ms": percentile_ms(client.waits, 50),
+                                              "latency_p50_ms": percentile_ms(client.latencies, 50),
+                                              "latency_p95_ms": percentile_ms(client.latencies, 95)}
+                             for client in self.clients if client.station is not None}}
+
+
+    def report(self):
+        stats = self.stats()
+        lines = [f"busy {stats['busy_fraction']:.0%} of {stats['uptime_s']:.0f} s, batch sizes {dict(sorted(stats['batch_sizes'].items()))}"]
+        for station, s in stats["stations"].items():
+            lines.append(f"{station:16s} served {s['served']:6d}   queued {s['queued']:3d}   wait p50 {s['wait_p50_ms']:8.1f} ms   "
+                         f"latency p50 {s['latency_p50_ms']:8.1f} ms   p95 {s['latency_p95_ms']:8.1f} ms")
+        return "\n".join(lines)
+
+
+    def close(self):
+        self.listener.close()
+        for client in list(self.clients):
+            client.close()
+        self.clients.clear()
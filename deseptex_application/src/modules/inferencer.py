@@ -1,31 +1,91 @@
 import numpy as np
-import cv2 as cv
 
-from ultralytics import YOLO
+from modules.model_export import load_model, weights_hash
+from modules.postprocessor import postprocessor_t
+from modules.garment_locator import garment_locator_t
+from modules.tracer import tracer
+from modules.settings import POSTPROC_MODE, POSTPROC_KERNEL, GARMENT_ROI, GARMENT_REFERENCE_PATH
 
 
 
 class inferencer_t:
-    def __init__(self, classifier_model_path, classifier_image_shape, pants_avant_model_path, pants_arriere_model_path, chemises_model_path, segmentation_image_shape):
-        self.classifier_model = YOLO(classifier_model_path)
+    def __init__(self, classifier_model_path, classifier_image_shape, pants_avant_model_path, pants_arriere_model_path, chemises_model_path, segmentation_image_shape,
+                 backend="pytorch", calibration_frames=None, postprocessor=None, garment_locator=None):
+        # backend is pytorch, onnx, openvino or openvino_int8, exported models are cached next to the .pt files
+        self.backend = backend
+        self.calibration_frames = calibration_frames
+        self.postprocessor = postprocessor if postprocessor is not None else postprocessor_t(POSTPROC_MODE, POSTPROC_KERNEL)
+        
+        # segment only a padded crop around the garment once an empty-table reference is stored
+        if garment_locator is None and GARMENT_ROI:
+            garment_locator = garment_locator_t(GARMENT_REFERENCE_PATH)
+        self.garment_locator = garment_locator
+        self.roi = None # (x0, y0, x1, y1) the last segmentation ran on, None for the full frame
+        self.class_probs = [] # probability of the selected class of every image of the last classify call
+        self.confidence = None # {"class", "class_prob", "seg_conf"} of the last run_inference, see confidence_of
+        self.classifier_model_path = classifier_model_path
+        self.classifier_model = load_model(classifier_model_path, backend, classifier_image_shape, "classify")
         self.classifier_image_shape = classifier_image_shape
-        self.pants_avant_model = YOLO(pants_avant_model_path)
-        self.pants_arriere_model = YOLO(pants_arriere_model_path)
-        self.chemises_model = YOLO(chemises_model_path)
         self.segmentation_image_shape = segmentation_image_shape
         
+        # segmentation models are loaded on first use, see get_segmentation_model and preload
+        self.segmentation_model_paths = {"pants_avant": pants_avant_model_path,
+                                         "pants_arriere": pants_arriere_model_path,
+                                         "chemise": chemises_model_path}
+        self.segmentation_models = {}
+        
         self.chemises_indices = [1, 3] # boutons, extremites manches
         self.pants_avant_indices = [1, 2, 5] # boutons, rivets, tirette
         self.pants_arriere_indices = [1, 2] # boutons, rivets
+        self.relevant_indices = {"pants_avant": self.pants_avant_indices,
+                                 "pants_arriere": self.pants_arriere_indices,
+                                 "chemise": self.chemises_indices}
     
     
-    def run_inference(self, image):
-        # First, classify the image to determine which segmentation model to use
-        classification_result = self.classifier_model.predict(image, conf=0.25, iou=0.6, imgsz=self.classifier_image_shape, verbose=False)[0]
-        
-        # Get probabilities and class names
+    def get_segmentation_model(self, class_name):
+        if class_name not in self.segmentation_models:
+            with tracer.span("inferencer.load_model", garment=class_name):
+                self.segmentation_models[class_name] = load_model(self.segmentation_model_paths[class_name], self.backend,
+                                                                  self.segmentation_image_shape, "segment", self.calibration_frames)
+        return self.segmentation_models[class_name]
+    
+    
+    def unloaded_classes(self):
+        return [class_name for class_name in self.segmentation_model_paths if class_name not in self.segmentation_models]
+    
+    
+    def preload(self, class_name, image_shape=None):
+        # load the segmentation model of class_name and run a forward pass on a dummy frame,
+        # so the first real snap does not pay for lazy initialisation
+        model = self.get_segmentation_model(class_name)
+        if image_shape is not None:
+            dummy = np.zeros(image_shape, dtype=np.uint8)
+            model.predict([dummy], conf=0.25, iou=0.6, imgsz=self.segmentation_image_shape, verbose=False)
+    
+    
+    def warm_up(self, image_shape):
+        dummy = np.zeros(image_shape, dtype=np.uint8)
+        self.classifier_model.predict(dummy, conf=0.25, iou=0.6, imgsz=self.classifier_image_shape, verbose=False)
+    
+    
+    def result_context(self):
+        # everything besides the frame the contours depend on, keys the result cache (modules/result_cache.py)
+        model_paths = [self.classifier_model_path] + list(self.segmentation_model_paths.values())
+        postprocessor = self.postprocessor
+        return ([weights_hash(path) for path in model_paths], self.backend, self.classifier_image_shape, self.segmentation_image_shape,
+                postprocessor.mode, postprocessor.kernel_shape, postprocessor.dilation_radius, postprocessor.mask_scale, self.garment_locator is not None)
+    
+    
+    def store_reference(self, image):
+        # image of the empty cutting table, for the garment locator
+        if self.garment_locator is not None:
+            self.garment_locator.set_reference(image)
+    
+    
+    def select_class(self, classification_result):
+        # garment class with the highest probability and its probability, None when there is no segmentation model for it
         if classification_result.probs is None:
-            return None, None
+            return None, 0.0
 
         if classification_result.probs.data.is_cuda:
             probs = classification_result.probs.data.cpu().numpy()
@@ -36,23 +96,93 @@ class inferencer_t:
         # get highest probability class
         max_index = probs.argmax()
         selected_class = class_names[max_index]
-        
-        # Based on the selected class, choose the appropriate segmentation model
-        if selected_class == "pants_avant":
-            segmentation_model = self.pants_avant_model
-            relevant_indices = self.pants_avant_indices
-        elif selected_class == "pants_arriere":
-            segmentation_model = self.pants_arriere_model
-            relevant_indices = self.pants_arriere_indices
-        elif selected_class == "chemise":
-            segmentation_model = self.chemises_model
-            relevant_indices = self.chemises_indices
-        else:
+        if selected_class not in self.segmentation_model_paths:
+            return None, float(probs[max_index])
+        return selected_class, float(probs[max_index])
+    
+    
+    def classify(self, images):
+        # garment class of every image, PyTorch classifies them in one batch, the exported models have a fixed batch size of 1
+        with tracer.span("inferencer.classify", images=len(images)):
+            if self.backend == "pytorch":
+                results = self.classifier_model.predict(list(images), conf=0.25, iou=0.6, imgsz=self.classifier_image_shape, verbose=False)
+            else:
+                results = [self.classifier_model.predict(image, conf=0.25, iou=0.6, imgsz=self.classifier_image_shape, verbose=False)[0] for image in images]
+        selected = [self.select_class(result) for result in results]
+        self.class_probs = [prob for _, prob in selected]
+        return [selected_class for selected_class, _ in selected]
+    
+    
+    def segment(self, image, selected_class):
+        '''
+        Returns the segmentation result and the relevant class indices. When the garment was located, the result
+        is in the coordinates of the crop self.roi, see relevant_polygons.
+        '''
+        (result, self.roi), = self.segment_batch([image], selected_class)
+        return result, self.relevant_indices[selected_class]
+    
+    
+    def segment_batch(self, images, selected_class, garment_locators=None):
+        '''
+        Segments images of the same garment class in one call and returns a (result, roi) per image.
+        garment_locators has one locator (or None) per image, by default self.garment_locator is used for all of them.
+        '''
+        segmentation_model = self.get_segmentation_model(selected_class)
+        if garment_locators is None:
+            garment_locators = [self.garment_locator] * len(images)
+        
+        # crop to the garment, the table around it only costs resolution in the letterboxed model input
+        crops, rois, sizes = [], [], []
+        for image, garment_locator in zip(images, garment_locators):
+            roi = None
+            if garment_locator is not None:
+                with tracer.span("inferencer.locate"):
+                    roi = garment_locator.locate(image)
+            imgsz = self.segmentation_image_shape
+            if roi is not None:
+                x0, y0, x1, y1 = roi
+                image = image[y0:y1, x0:x1]
+                # a crop smaller than the model input is not upscaled, exported models have a fixed input size though
+                if self.backend == "pytorch":
+                    imgsz = min(imgsz, -(-max(image.shape[:2]) // 32) * 32)
+            crops.append(image)
+            rois.append(roi)
+            sizes.append(imgsz)
+        
+        # Run segmentation, in one batch at the size of the largest crop, the exported models have a fixed batch size of 1
+        with tracer.span("inferencer.segment", garment=selected_class, images=len(images)):
+            if self.backend == "pytorch":
+                results = segmentation_model.predict(crops, conf=0.25, iou=0.6, imgsz=max(sizes), verbose=False)
+            else:
+                results = [segmentation_model.predict([crop], conf=0.25, iou=0.6, imgsz=self.segmentation_image_shape, verbose=False)[0] for crop in crops]
+        return list(zip(results, rois))
+    
+    
+    @staticmethod
+    def confidence_of(selected_class, class_prob, result, relevant_indices):
+        # the classifier probability and the lowest confidence of the relevant detections (None without any),
+        # lets the conveyor decide whether a result can be cut without a look from the operator
+        seg_conf = None
+        if result is not None and result.boxes is not None and len(result.boxes):
+            confs = [conf for conf, c in zip(result.boxes.conf.tolist(), result.boxes.cls.tolist()) if int(c) in relevant_indices]
+            seg_conf = min(confs) if confs else None
+        return {"class": selected_class, "class_prob": class_prob, "seg_conf": seg_conf}
+    
+    
+    def run_inference(self, image, is_cancelled=None):
+        # First, classify the image to determine which segmentation model to use
+        self.roi = None
+        selected_class = self.classify([image])[0]
+        self.confidence = self.confidence_of(selected_class, self.class_probs[0], None, None)
+        if selected_class is None:
             return None, None
         
-        # Run segmentation
-        segmentation_result = segmentation_model.predict([image], conf=0.25, iou=0.6, imgsz=self.segmentation_image_shape, verbose=False)[0]
-        return segmentation_result, relevant_indices
+        # the caller can abort between the classifier and the (much slower) segmentation model
+        if is_cancelled is not None and is_cancelled():
+            return None, None
+        result, relevant_indices = self.segment(image, selected_class)
+        self.confidence = self.confidence_of(selected_class, self.class_probs[0], result, relevant_indices)
+        return result, relevant_indices
         
     
     def run_inference_without_postproc(self, image):
@@ -66,41 +196,42 @@ class inferencer_t:
             return contours
         
         for index, mask in enumerate(result.masks): #type: ignore
-            contour = mask.xy.pop()
+            contour = mask.xy.pop() + self.roi_offset(self.roi)
             contour = contour.astype(np.int32)
             contours.append(contour)
             
         return contours
     
     
-    def run_inference_with_postproc(self, image):
-        result, relevant_indices = self.run_inference(image)
+    def run_inference_with_postproc(self, image, is_cancelled=None):
+        result, relevant_indices = self.run_inference(image, is_cancelled)
         
         if result is None or relevant_indices is None:
             return []
         
-        if result.masks is None or result.boxes is None:
+        if is_cancelled is not None and is_cancelled():
             return []
         
+        return self.postprocess(result, relevant_indices, image.shape, self.roi)
+    
+    
+    def postprocess(self, result, relevant_indices, image_shape, roi=None):
+        # cutting contours in full-frame coordinates from a segmentation result on the crop roi
+        if result is None or result.masks is None or result.boxes is None:
+            return []
         
-        # only get the masks for the classes in the relevant indices
-        masks = result.masks
-        masks_xy = masks.xy
-        mask_image = np.zeros_like(image)
-        
-        boxes = result.boxes
-        for i in range(len(boxes)):
-            predicted_class = int(boxes.cls[i].item())
-            if predicted_class in relevant_indices:
-                cv.fillPoly(mask_image, np.array([masks_xy[i]], dtype=np.int32), (0, 255, 0)) #type: ignore
-        
-        # dilation
-        kernel = np.ones((3,3), np.uint8)
-        dilated_mask_image = cv.dilate(mask_image, kernel, iterations=12)
-        
-        # find contours in dilated mask image
-        gray = cv.cvtColor(dilated_mask_image, cv.COLOR_BGR2GRAY)
-        _, thresh = cv.threshold(gray, 1, 255, cv.THRESH_BINARY)
-        contours, _ = cv.findContours(thresh, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        contours = [contour.reshape(-1, 2) for contour in contours]
-        return contours
\ No newline at end of file
+        with tracer.span("inferencer.postproc"):
+            return self.postprocessor.process(self.relevant_polygons(result, relevant_indices, roi), image_shape)
+    
+    
+    @staticmethod
+    def roi_offset(roi):
+        return np.array(roi[:2], dtype=np.float32) if roi is not None else np.zeros(2, dtype=np.float32)
+    
+    
+    def relevant_polygons(self, result, relevant_indices, roi=None):
+        # only get the masks for the classes in the relevant indices, mapped back to full-frame coordinates
+        masks_xy = result.masks.xy
+        classes = [int(c) for c in result.boxes.cls.tolist()]
+        offset = self.roi_offset(roi)
+        return [masks_xy[i] + offset for i in range(len(classes)) if classes[i] in relevant_indices]
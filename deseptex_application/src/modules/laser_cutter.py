@@ -1,63 +1,141 @@
-import socket
+import os
 import numpy as np
+import cv2 as cv
+
+from modules.cutter_client import cutter_client_t
+from modules.path_optimizer import path_optimizer_t
+from modules.contour_store import contour_store_t
+from modules.tracer import tracer
 
 
 
 class laser_cutter_t:
-    def __init__(self, ip, udp_out_port, udp_in_port, M):
+    def __init__(self, ip, udp_out_port, udp_in_port, M, input_scale=(1.0, 1.0), svg_path="./svg/test.svg", timeout=5.0, retries=2, match_replies=False, path_optimizer:path_optimizer_t|None=None, cutter_svg_dir="../../svg"):
         self.ip = ip
         self.udp_out_port = udp_out_port
         self.udp_in_port = udp_in_port
+        self.timeout = timeout
+        self.retries = retries
+        self.match_replies = match_replies
+        self.client = None
+        self.path_optimizer = path_optimizer
+        self.last_path_stats = None
         self.M = M
+        self.svg_path = svg_path
+        self.cutter_svg_dir = cutter_svg_dir # the directory of svg_path as seen from the cutter software
+        self.width_mm = 1400
+        self.height_mm = 900
+        self.set_input_scale(input_scale)
+    
+    
+    def get_client(self):
+        # one bound socket pair for the whole process, created on first use
+        if self.client is None:
+            self.client = cutter_client_t(self.ip, self.udp_out_port, self.udp_in_port, self.timeout, self.retries, self.match_replies)
+        return self.client
+    
+    
+    def start_cutter_async(self):
+        return self.get_client().send_async("START")
     
     
     def start_cutter(self):
-        MESSAGE = "START"
-
-        outSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        inSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-        inSock.bind((self.ip, self.udp_in_port))
-
-        outSock.sendto((MESSAGE).encode(), (self.ip, self.udp_out_port))
-        data, addr = inSock.recvfrom(1024)
-        print("start cutter: ", data, addr)
+        with tracer.span("cutter.start"):
+            data, addr, round_trip = self.start_cutter_async().result()
+        print("start cutter: ", data, addr, f"{round_trip*1000:.1f} ms")
+    
+    
+    def set_input_scale(self, input_scale):
+        # fold the input scaling, the perspective matrix and the mirroring of the x axis into one matrix,
+        # x_machine = 1400 - X/W is projective as well: (1400*W - X)/W
+        scale = np.diag([input_scale[0], input_scale[1], 1.0])
+        mirror = np.array([[-1.0, 0.0, self.width_mm],
+                           [0.0, 1.0, 0.0],
+                           [0.0, 0.0, 1.0]])
+        self.input_scale = tuple(input_scale)
+        self.transform = mirror @ np.asarray(self.M, dtype=np.float64) @ scale
+    
+    
+    def to_machine(self, contours):
+        # map all contour points to machine coordinates (mm) in one pass, a contour store is used as is
+        if isinstance(contours, contour_store_t):
+            lengths = contours.lengths().tolist()
+            points = contours.flat().astype(np.float64)
+        else:
+            lengths = [len(points) for points in contours]
+            points = np.concatenate([np.asarray(points, dtype=np.float64).reshape(-1, 2) for points in contours]) if contours else np.empty((0, 2))
+        if sum(lengths) == 0:
+            return [np.empty((0, 2)) for _ in lengths]
+        
+        machine_points = cv.perspectiveTransform(points.reshape(-1, 1, 2), self.transform).reshape(-1, 2)
+        return np.split(machine_points, np.cumsum(lengths)[:-1])
+    
+    
+    def format_svg(self, machine_paths):
+        # build the whole document in memory, every path is closed by repeating its first point
+        parts = [f'<svg width="{self.width_mm}mm" height="{self.height_mm}mm" xmlns="http://www.w3.org/2000/svg">',
+                 f'<path d="M0 0 {self.width_mm} 0 {self.width_mm} {self.height_mm} 0 {self.height_mm}" fill="none" style="stroke:blue" />'] # for some reason it is necessary to draw a rectangle such that the svg aligns with cutter software
+        
+        for points in machine_paths:
+            if len(points) == 0:
+                continue
+            closed = np.concatenate((points, points[:1]))
+            coordinates = " ".join(["%.3f %.3f"] * len(closed)) % tuple(closed.ravel())
+            parts.append(f'<path d="M{coordinates}" fill="none" style="stroke:red" />')
+        parts.append("</svg>")
+        return "".join(parts).encode()
+    
+    
+    def build_svg(self, contours):
+        machine_paths = self.to_machine(contours)
+        if self.path_optimizer is None:
+            return self.format_svg(machine_paths)
+        
+        # simplify and order the paths in machine coordinates, keep the before/after numbers for the report
+        optimized_paths, stats = self.path_optimizer.optimize(machine_paths)
+        svg = self.format_svg(optimized_paths)
+        stats["bytes_before"] = len(self.format_svg(machine_paths))
+        stats["bytes_after"] = len(svg)
+        self.last_path_stats = stats
+        return svg
     
     
     def prepare_svg(self, contours):
-        with open("./svg/test.svg", "w+") as f:
-            f.write(f'<svg width="{1400}mm" height="{900}mm" xmlns="http://www.w3.org/2000/svg">')
-
-            f.write('<path d="M0 0 1400 0 1400 900 0 900" fill="none" style="stroke:blue" />') # for some reason it is necessary to draw a rectangle such that the svg aligns with cutter software
-
-            for points in contours:
-                f.write('<path d="M')
-                for i in range(len(points)):
-                    
-                    # get camera point
-                    x_cam, y_cam = points[i]
-                    cam_point = np.array([x_cam, y_cam, 1])
-                    
-                    # convert to machine point
-                    machine_point = np.matmul(self.M, cam_point)
-                    x = 1400 - (machine_point[0]/machine_point[2])
-                    y = machine_point[1]/machine_point[2]
-
-                    # write point to svg
-                    f.write(f"{x} {y} ")
-                f.write('" fill="none" style="stroke:red" />')
-            f.write("</svg>")
+        with tracer.span("cutter.build_svg", contours=len(contours)):
+            svg = self.build_svg(contours)
+        
+        with tracer.span("cutter.write_svg"):
+            self.write_svg(svg)
+        
+        if self.path_optimizer is not None:
+            print(self.path_optimizer.report(self.last_path_stats))
+        return svg
+    
+    
+    def write_svg(self, svg, path=None):
+        # write to a temporary file and rename it, the cutter software never sees a half written file
+        path = path if path is not None else self.svg_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(svg)
+        os.replace(tmp_path, path)
     
     
-    def send_svg_to_cutter(self):
+    def send_svg_to_cutter_async(self, path=None, timeout=None, retries=0):
         # MESSAGE = "LOADFILE:C:\\Users\\techniphys\\Documents\\DeSepTex - Photos\\test.svg"
-        MESSAGE = "LOADFILE:../../svg/test.svg"
-
-        outSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        inSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-        inSock.bind((self.ip, self.udp_in_port))
-
-        outSock.sendto((MESSAGE).encode(), (self.ip, self.udp_out_port))
-        data, addr = inSock.recvfrom(1024)
-        print("send svg to cutter: ", data, addr)
\ No newline at end of file
+        # no resend by default, the cutter may still be cutting and a second LOADFILE would cut the garment twice
+        name = os.path.basename(path if path is not None else self.svg_path)
+        return self.get_client().send_async(f"LOADFILE:{self.cutter_svg_dir}/{name}", timeout, retries)
+    
+    
+    def send_svg_to_cutter(self, path=None, timeout=None, retries=0):
+        with tracer.span("cutter.load_file"):
+            data, addr, round_trip = self.send_svg_to_cutter_async(path, timeout, retries).result()
+        print("send svg to cutter: ", data, addr, f"{round_trip*1000:.1f} ms")
+    
+    
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
@@ -0,0 +1,80 @@
+import time
+import ctypes
+import numpy as np
+from collections import deque
+
+from modules.undistorter import BAYER_PATTERNS, bayer_mosaic
+
+
+
+class mock_buffer_t:
+    '''
+    Same fields as an arena_api buffer that the capture path uses: pdata, width, height and bits_per_pixel.
+    '''
+    def __init__(self, array):
+        self.array = array
+        self.height, self.width = array.shape[:2]
+        self.bits_per_pixel = 8 * (array.shape[2] if array.ndim == 3 else 1)
+        self.pdata = array.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+
+
+
+class mock_device_t:
+    '''
+    Stand-in for an arena_api device with the get_buffer/requeue_buffer interface, for benchmarking the capture path
+    without the Lucid camera. The buffers are filled once from the given BGR frames, in the requested pixel format (RGB8, BGR8 or a Bayer format),
+    like the driver owns a fixed set of DMA buffers; get_buffer fails when every buffer is still held by the caller.
+    '''
+    def __init__(self, frames, num_buffers=3, pixel_format="BGR8", fps=None):
+        self.pixel_format = pixel_format
+        self.fps = fps
+        self.buffers = []
+        for i in range(num_buffers):
+            frame = frames[i % len(frames)]
+            if pixel_format in BAYER_PATTERNS:
+                array = bayer_mosaic(frame, pixel_format)
+            else:
+                array = np.ascontiguousarray(frame[..., ::-1] if pixel_format == "RGB8" else frame)
+            self.buffers.append(mock_buffer_t(array))
+        self.free = deque(self.buffers)
+        self.outstanding = set()
+        self.streaming = False
+        self.gets = 0
+        self.requeues = 0
+        self.last_get = 0.0
+
+
+    def start_stream(self):
+        self.streaming = True
+
+
+    def stop_stream(self):
+        self.streaming = False
+
+
+    def get_buffer(self, timeout=2000):
+        if not self.streaming:
+            raise RuntimeError("stream not started")
+        if not self.free:
+            raise TimeoutError(f"no free buffer, {len(self.outstanding)} buffers were not requeued")
+        if self.fps:
+            delay = self.last_get + 1.0 / self.fps - time.perf_counter()
+            if delay > timeout / 1000:
+                time.sleep(timeout / 1000)
+                raise TimeoutError(f"no frame within {timeout} ms")
+            if delay > 0:
+                time.sleep(delay)
+        self.last_get = time.perf_counter()
+
+        buffer = self.free.popleft()
+        self.outstanding.add(id(buffer))
+        self.gets += 1
+        return buffer
+
+
+    def requeue_buffer(self, buffer):
+        if id(buffer) not in self.outstanding:
+            raise ValueError("buffer was not handed out by this device")
+        self.outstanding.remove(id(buffer))
+        self.free.append(buffer)
+        self.requeues += 1
@@ -0,0 +1,115 @@
+import os
+import shutil
+import hashlib
+import tempfile
+
+from ultralytics import YOLO
+
+
+
+BACKENDS = ("pytorch", "onnx", "openvino", "openvino_int8")
+
+
+def weights_hash(weights_path, length=12):
+    h = hashlib.sha1()
+    with open(weights_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:length]
+
+
+def calibration_hash(frames_dir, length=12):
+    # names and sizes of the calibration frames, other frames give another INT8 export
+    h = hashlib.sha1()
+    for name in sorted(os.listdir(frames_dir)):
+        h.update(f"{name}:{os.path.getsize(os.path.join(frames_dir, name))}\n".encode())
+    return h.hexdigest()[:length]
+
+
+def resolve_backend(backend, task, calibration_frames=None):
+    # INT8 needs calibration frames and is only done for segmentation, the others use the fp32 OpenVINO export
+    if backend == "openvino_int8" and (task != "segment" or calibration_frames is None):
+        reason = "no calibration frames" if task == "segment" else f"no INT8 calibration for the {task} model"
+        print(f"openvino_int8 requested but {reason}, using the fp32 OpenVINO model")
+        return "openvino"
+    return backend
+
+
+def exported_path(weights_path, backend, imgsz, calibration_frames=None):
+    '''
+    Location of the exported model next to the .pt file, keyed by the weights hash and input size,
+    INT8 models also by the calibration frames. OpenVINO models are directories, Ultralytics recognises them by the
+    _openvino_model suffix.
+    '''
+    stem = os.path.splitext(weights_path)[0]
+    key = f"{stem}_{weights_hash(weights_path)}_{imgsz}"
+    if backend == "onnx":
+        return key + ".onnx"
+    if backend == "openvino":
+        return key + "_openvino_model"
+    if backend == "openvino_int8":
+        if calibration_frames is None:
+            raise ValueError("openvino_int8 needs calibration_frames")
+        return key + f"_int8_{calibration_hash(calibration_frames)}_openvino_model"
+    raise ValueError(f"Unknown backend '{backend}', choose from {BACKENDS}")
+
+
+def write_calibration_yaml(frames_dir, names):
+    # Ultralytics INT8 calibration takes a dataset yaml, the saved frames serve as both splits
+    fd, path = tempfile.mkstemp(suffix=".yaml")
+    with os.fdopen(fd, "w") as f:
+        f.write(f"path: {os.path.abspath(frames_dir)}\ntrain: .\nval: .\nnames:\n")
+        for index, name in names.items():
+            f.write(f"  {index}: {name}\n")
+    return path
+
+
+def export_model(weights_path, backend, imgsz, calibration_frames=None):
+    target = exported_path(weights_path, backend, imgsz, calibration_frames)
+    model = YOLO(weights_path)
+
+    kwargs = {"imgsz": imgsz}
+    calibration_yaml = None
+    if backend == "onnx":
+        kwargs.update(format="onnx", dynamic=False, simplify=True)
+    elif backend == "openvino":
+        kwargs.update(format="openvino")
+    elif backend == "openvino_int8":
+        # the classifier would need a class-folder dataset for calibration, it is never stored under an int8 name
+        if model.task != "segment":
+            raise ValueError(f"openvino_int8 is only supported for segmentation models, {weights_path} is a {model.task} model")
+        calibration_yaml = write_calibration_yaml(calibration_frames, model.names)
+        kwargs.update(format="openvino", int8=True, data=calibration_yaml)
+    else:
+        raise ValueError(f"Unknown backend '{backend}', choose from {BACKENDS}")
+
+    print(f"Exporting {weights_path} to {backend} at {imgsz} px")
+    try:
+        produced = model.export(**kwargs)
+    finally:
+        if calibration_yaml is not None:
+            os.remove(calibration_yaml)
+
+    # move the export to its hashed name, replacing a stale copy
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    shutil.move(str(produced), target)
+    return target
+
+
+def load_model(weights_path, backend="pytorch", imgsz=None, task=None, calibration_frames=None):
+    '''
+    Loads the model for the requested backend. The model is exported the first time and
+    the cached export is used transparently afterwards, a change of the weights triggers a new export.
+    openvino_int8 without calibration frames, and for the classifier, loads the fp32 OpenVINO model.
+    '''
+    if backend == "pytorch":
+        return YOLO(weights_path, task=task)
+
+    backend = resolve_backend(backend, task, calibration_frames)
+    path = exported_path(weights_path, backend, imgsz, calibration_frames)
+    if not os.path.exists(path):
+        path = export_model(weights_path, backend, imgsz, calibration_frames)
+    return YOLO(path, task=task)
@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import cv2 as cv
+
+
+
+class motion_trigger_t:
+    '''
+    Detects a garment being placed on the table: every frame is compared to the previous one on a small grey thumbnail,
+    after a change the table has to stay still for stable_frames frames. A still table that looks like the empty-table
+    reference does not trigger, e.g. after the last garment was taken away; without a reference every still table after
+    a change does.
+    '''
+    def __init__(self, stable_frames=2, motion_threshold=4.0, empty_threshold=6.0, thumbnail_size=(160, 120), empty_reference_path=None):
+        self.stable_frames = stable_frames
+        self.motion_threshold = motion_threshold # mean grey-level difference between two frames that counts as movement
+        self.empty_threshold = empty_threshold # mean grey-level difference to the empty table below which the table is empty
+        self.thumbnail_size = thumbnail_size # fixed size, so frames of any resolution and aspect ratio compare
+        self.previous = None
+        self.armed = False # the table changed since the last trigger
+        self.stable_count = 0
+        self.empty = None
+        if empty_reference_path is not None and os.path.exists(empty_reference_path):
+            self.set_empty(cv.imread(empty_reference_path))
+
+
+    def thumbnail(self, frame):
+        # the mean over the channels does not care whether the frame is RGB (preview) or BGR (reference)
+        return cv.resize(frame, self.thumbnail_size, interpolation=cv.INTER_AREA).mean(axis=2, dtype=np.float32)
+
+
+    def set_empty(self, frame):
+        self.empty = self.thumbnail(frame)
+
+
+    def update(self, frame):
+        '''
+        Feeds the next camera frame, returns True once a garment lies still on the table.
+        '''
+        thumbnail = self.thumbnail(frame)
+        previous, self.previous = self.previous, thumbnail
+        if previous is None:
+            return False
+
+        if np.abs(thumbnail - previous).mean() > self.motion_threshold:
+            self.armed = True
+            self.stable_count = 0
+            return False
+        if not self.armed:
+            return False
+        self.stable_count += 1
+        if self.stable_count < self.stable_frames:
+            return False
+
+        self.armed = False
+        self.stable_count = 0
+        return self.empty is None or np.abs(thumbnail - self.empty).mean() > self.empty_threshold
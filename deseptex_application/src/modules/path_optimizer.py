@@ -0,0 +1,110 @@
+import numpy as np
+import cv2 as cv
+
+
+
+class path_optimizer_t:
+    '''
+    Prepares closed cut paths in machine coordinates (mm) for the cutter.
+    Every path is simplified within a chord tolerance, the paths are ordered with a nearest-neighbour tour
+    improved by 2-opt, and every path starts at the vertex closest to where the previous one ended.
+    '''
+    def __init__(self, tolerance_mm=0.1, optimize_order=True, start_point=(0.0, 0.0), max_2opt_passes=20):
+        self.tolerance_mm = tolerance_mm
+        self.optimize_order = optimize_order
+        self.start_point = np.asarray(start_point, dtype=np.float64)
+        self.max_2opt_passes = max_2opt_passes
+
+
+    def simplify(self, path):
+        if self.tolerance_mm <= 0 or len(path) <= 3:
+            return path
+        simplified = cv.approxPolyDP(path.astype(np.float32).reshape(-1, 1, 2), self.tolerance_mm, True).reshape(-1, 2)
+        # never collapse a path to a line
+        return simplified.astype(np.float64) if len(simplified) >= 3 else path
+
+
+    def nearest_vertex(self, path, point):
+        return int(np.argmin(((path - point)**2).sum(axis=1)))
+
+
+    def nearest_neighbour_order(self, paths):
+        # greedy tour: always cut the path with the vertex closest to the current head position next
+        remaining = list(range(len(paths)))
+        order, entries = [], []
+        position = self.start_point
+        while remaining:
+            distances = [((paths[i] - position)**2).sum(axis=1).min() for i in remaining]
+            best = remaining.pop(int(np.argmin(distances)))
+            entry = self.nearest_vertex(paths[best], position)
+            order.append(best)
+            entries.append(paths[best][entry])
+            position = paths[best][entry] # a closed path ends where it started
+        return order, entries
+
+
+    def two_opt(self, order, entries):
+        # open tour from the start point through the fixed entry points of the paths
+        points = np.vstack([self.start_point, *entries])
+        tour = list(range(len(points)))
+        dist = lambda a, b: float(np.hypot(*(points[tour[a]] - points[tour[b]])))
+
+        for _ in range(self.max_2opt_passes):
+            improved = False
+            for i in range(1, len(tour) - 1):
+                for j in range(i + 1, len(tour)):
+                    before = dist(i - 1, i) + (dist(j, j + 1) if j + 1 < len(tour) else 0.0)
+                    after = dist(i - 1, j) + (dist(i, j + 1) if j + 1 < len(tour) else 0.0)
+                    if after < before - 1e-9:
+                        tour[i:j + 1] = tour[i:j + 1][::-1]
+                        improved = True
+            if not improved:
+                break
+        return [order[k - 1] for k in tour[1:]]
+
+
+    def travel_distance(self, paths):
+        # head travel between paths, every closed path starts and ends at its first vertex
+        position = self.start_point
+        total = 0.0
+        for path in paths:
+            if len(path):
+                total += float(np.hypot(*(path[0] - position)))
+                position = path[0]
+        return total
+
+
+    def optimize(self, paths):
+        '''
+        Returns the optimized paths and a dict with the vertex count and travel distance before and after.
+        '''
+        paths = [np.asarray(path, dtype=np.float64).reshape(-1, 2) for path in paths]
+        paths = [path for path in paths if len(path)]
+        stats = {"paths": len(paths),
+                 "vertices_before": sum(len(path) for path in paths),
+                 "travel_mm_before": self.travel_distance(paths)}
+
+        paths = [self.simplify(path) for path in paths]
+        if self.optimize_order and len(paths) > 1:
+            order, entries = self.nearest_neighbour_order(paths)
+            order = self.two_opt(order, entries)
+            paths = [paths[i] for i in order]
+
+        # start every path at the vertex closest to the end of the previous one
+        position = self.start_point
+        for i, path in enumerate(paths):
+            paths[i] = np.roll(path, -self.nearest_vertex(path, position), axis=0)
+            position = paths[i][0]
+
+        stats["vertices_after"] = sum(len(path) for path in paths)
+        stats["travel_mm_after"] = self.travel_distance(paths)
+        return paths, stats
+
+
+    @staticmethod
+    def report(stats):
+        text = (f"cut paths: {stats['paths']}, vertices {stats['vertices_before']} -> {stats['vertices_after']}, "
+                f"travel {stats['travel_mm_before']:.0f} -> {stats['travel_mm_after']:.0f} mm")
+        if "bytes_before" in stats:
+            text += f", svg {stats['bytes_before']} -> {stats['bytes_after']} bytes"
+        return text
@@ -0,0 +1,102 @@
+import math
+import numpy as np
+import cv2 as cv
+
+
+
+POSTPROC_MODES = ("legacy", "crop", "mask")
+KERNEL_SHAPES = ("rect", "disk")
+
+
+class postprocessor_t:
+    '''
+    Turns the segmentation polygons of the relevant classes into dilated cutting contours.
+    legacy: full-resolution 3-channel image and 12 iterations of a 3x3 dilation, as it was originally done
+    crop:   single-channel image cropped to the union of the polygons, dilated in one pass
+    mask:   like crop, but rasterized on a grid downscaled by mask_scale, contours are scaled back with subpixel precision
+    The rect kernel is one (2r+1)x(2r+1) dilation and gives exactly the legacy contours in crop mode,
+    the disk kernel thresholds a distance transform at r and gives a uniform margin around the polygons.
+    '''
+    def __init__(self, mode="crop", kernel_shape="rect", dilation_radius=12, mask_scale=0.5):
+        if mode not in POSTPROC_MODES:
+            raise ValueError(f"Unknown post-processing mode '{mode}', choose from {POSTPROC_MODES}")
+        if kernel_shape not in KERNEL_SHAPES:
+            raise ValueError(f"Unknown kernel shape '{kernel_shape}', choose from {KERNEL_SHAPES}")
+        self.mode = mode
+        self.kernel_shape = kernel_shape
+        self.dilation_radius = dilation_radius
+        self.mask_scale = mask_scale
+
+
+    def process(self, polygons, image_shape):
+        # polygons are (N, 2) float arrays in image coordinates
+        polygons = [np.asarray(polygon, dtype=np.float32).reshape(-1, 2) for polygon in polygons]
+        polygons = [polygon for polygon in polygons if len(polygon)]
+        if not polygons:
+            return []
+        if self.mode == "legacy":
+            return self.process_legacy(polygons, image_shape)
+        if self.mode == "crop":
+            return self.process_crop(polygons, image_shape)
+        return self.process_mask(polygons, image_shape)
+
+
+    def dilate(self, mask, radius):
+        if self.kernel_shape == "rect":
+            # separable, as cheap as a single 3x3 pass
+            size = 2 * round(radius) + 1
+            return cv.dilate(mask, cv.getStructuringElement(cv.MORPH_RECT, (size, size)))
+        # a large elliptical kernel is slow, thresholding the distance to the nearest polygon pixel is not
+        distance = cv.distanceTransform(cv.bitwise_not(mask), cv.DIST_L2, cv.DIST_MASK_5)
+        return (distance <= radius).astype(np.uint8) * 255
+
+
+    def process_legacy(self, polygons, image_shape):
+        mask_image = np.zeros(image_shape, dtype=np.uint8)
+        for polygon in polygons:
+            cv.fillPoly(mask_image, np.array([polygon], dtype=np.int32), (0, 255, 0)) #type: ignore
+
+        # dilation
+        kernel = np.ones((3,3), np.uint8)
+        dilated_mask_image = cv.dilate(mask_image, kernel, iterations=self.dilation_radius)
+
+        # find contours in dilated mask image
+        gray = cv.cvtColor(dilated_mask_image, cv.COLOR_BGR2GRAY)
+        _, thresh = cv.threshold(gray, 1, 255, cv.THRESH_BINARY)
+        contours, _ = cv.findContours(thresh, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        return [contour.reshape(-1, 2) for contour in contours]
+
+
+    def process_crop(self, polygons, image_shape):
+        int_polygons = [polygon.astype(np.int32) for polygon in polygons]
+
+        # union of the polygon boxes, padded so the dilation never reaches the crop border
+        points = np.concatenate(int_polygons)
+        pad = self.dilation_radius + 1
+        x0, y0 = np.maximum(points.min(axis=0) - pad, 0)
+        x1, y1 = np.minimum(points.max(axis=0) + pad + 1, (image_shape[1], image_shape[0]))
+        if x1 <= x0 or y1 <= y0:
+            return []
+
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv.fillPoly(mask, int_polygons, 255, offset=(-int(x0), -int(y0))) #type: ignore
+        mask = self.dilate(mask, self.dilation_radius)
+
+        contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE, offset=(int(x0), int(y0)))
+        return [contour.reshape(-1, 2) for contour in contours]
+
+
+    def process_mask(self, polygons, image_shape):
+        scale = self.mask_scale
+        height, width = math.ceil(image_shape[0] * scale), math.ceil(image_shape[1] * scale)
+        radius = self.dilation_radius * scale
+
+        # rasterize on the coarse grid with 4 fractional bits, pixel centres sit at integer coordinates
+        shift = 4
+        fixed_polygons = [np.round((polygon * scale - 0.5) * (1 << shift)).astype(np.int32) for polygon in polygons]
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv.fillPoly(mask, fixed_polygons, 255, shift=shift) #type: ignore
+        mask = self.dilate(mask, radius)
+
+        contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        return [(contour.reshape(-1, 2).astype(np.float32) + 0.5) / scale - 0.5 for contour in contours]
@@ -0,0 +1,170 @@
+import os
+import glob
+import json
+import uuid
+import hashlib
+import numpy as np
+import cv2 as cv
+from collections import OrderedDict
+
+
+
+class result_cache_t:
+    '''
+    LRU cache of the cutting contours of recent snaps, so snapping the same garment again returns its contours right away.
+    A frame is fingerprinted by a grayscale thumbnail and the outline of the garment on it (the foreground mask of the
+    garment locator, or the pixels that differ from the table colour without an empty-table reference). A lookup only
+    hits a near-identical frame: no thumbnail pixel may differ by more than threshold grey levels and the outlines
+    must overlap by at least min_iou, a garment that was moved or swapped is a miss. context identifies the models and
+    the post-processing parameters, entries of another context are never returned. Memory is bounded by capacity_mb,
+    with disk_path the entries are also kept on disk (bounded by disk_mb) and survive a restart. meta (e.g. the
+    confidence of the result) is stored with the contours and is in self.meta after a hit.
+    '''
+    def __init__(self, context, capacity_mb=64, threshold=6, min_iou=0.98, thumbnail_width=384, disk_path=None, disk_mb=512):
+        self.context = hashlib.sha1(repr((context, thumbnail_width)).encode()).hexdigest()[:12]
+        self.capacity_bytes = capacity_mb * 1024 * 1024
+        self.threshold = threshold
+        self.min_iou = min_iou
+        self.thumbnail_width = thumbnail_width
+        self.table_threshold = 25 # grey levels from the table colour that count as garment, like garment_locator_t
+        self.disk_path = disk_path
+        self.disk_bytes = disk_mb * 1024 * 1024
+        self.entries = OrderedDict() # key -> (fingerprint, contours, nbytes, meta), least recently used first
+        self.meta = None
+        self.cached_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0 # hits that were only on disk, part of hits
+        self.misses = 0
+        self.evictions = 0
+
+        # only the fingerprints of the disk entries are kept in memory, the contours are loaded on a hit
+        self.disk_index = OrderedDict() # file path -> fingerprint, oldest first
+        if disk_path is not None:
+            os.makedirs(disk_path, exist_ok=True)
+            for path in sorted(glob.glob(os.path.join(disk_path, self.context + "_*.npz")), key=os.path.getmtime):
+                try:
+                    with np.load(path) as entry:
+                        self.disk_index[path] = (entry["thumbnail"], entry["mask"])
+                except (OSError, KeyError, ValueError):
+                    os.remove(path) # cut off by a crash
+
+
+    def fingerprint(self, image, garment_locator=None):
+        '''
+        (thumbnail, garment mask) of image. The thumbnail averages the sensor noise away, an edge that moved by a
+        fraction of a thumbnail pixel still changes it by far more than threshold.
+        '''
+        height = max(1, round(image.shape[0] * self.thumbnail_width / image.shape[1]))
+        thumbnail = cv.resize(image, (self.thumbnail_width, height), interpolation=cv.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv.cvtColor(thumbnail, cv.COLOR_BGR2GRAY)
+
+        mask = garment_locator.foreground(image) if garment_locator is not None else None
+        if mask is not None:
+            mask = cv.resize(mask, (thumbnail.shape[1], thumbnail.shape[0]), interpolation=cv.INTER_NEAREST) > 0
+        else:
+            # no reference, the table is most of the frame and its colour the median
+            mask = cv.absdiff(thumbnail, np.full_like(thumbnail, int(np.median(thumbnail)))) > self.table_threshold
+        return thumbnail, mask
+
+
+    def distance(self, a, b):
+        # largest grey-level difference of any thumbnail pixel, inf when the garment outlines do not overlap enough
+        (thumbnail_a, mask_a), (thumbnail_b, mask_b) = a, b
+        if thumbnail_a.shape != thumbnail_b.shape or mask_a.shape != mask_b.shape:
+            return np.inf
+        union = np.count_nonzero(mask_a | mask_b)
+        if union > 0 and np.count_nonzero(mask_a & mask_b) / union < self.min_iou:
+            return np.inf
+        return float(cv.norm(thumbnail_a, thumbnail_b, cv.NORM_INF))
+
+
+    def closest(self, fingerprints, fingerprint):
+        # key of the most similar fingerprint within the threshold, or None
+        best_key, best_distance = None, self.threshold
+        for key, candidate in fingerprints:
+            distance = self.distance(candidate, fingerprint)
+            if distance <= best_distance:
+                best_key, best_distance = key, distance
+        return best_key
+
+
+    def lookup(self, fingerprint):
+        '''
+        Returns the contours stored for a frame similar to fingerprint, or None on a miss.
+        '''
+        key = self.closest(((key, entry[0]) for key, entry in self.entries.items()), fingerprint)
+        if key is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.meta = self.entries[key][3]
+            return self.entries[key][1]
+
+        path = self.closest(self.disk_index.items(), fingerprint)
+        if path is not None:
+            try:
+                with np.load(path) as entry:
+                    contours = np.split(entry["points"], np.cumsum(entry["lengths"])[:-1]) if len(entry["lengths"]) else []
+                    meta = json.loads(str(entry["meta"]))
+            except (OSError, KeyError, ValueError):
+                del self.disk_index[path]
+            else:
+                self.insert_memory(path, self.disk_index[path], contours, meta)
+                self.meta = meta
+                self.hits += 1
+                self.disk_hits += 1
+                return contours
+        self.misses += 1
+        return None
+
+
+    def insert(self, fingerprint, contours, meta=None):
+        contours = [np.asarray(contour).reshape(-1, 2) for contour in contours]
+        key = self.write_disk(fingerprint, contours, meta) if self.disk_path is not None else uuid.uuid4().hex
+        self.insert_memory(key, fingerprint, contours, meta)
+
+
+    def insert_memory(self, key, fingerprint, contours, meta=None):
+        nbytes = sum(array.nbytes for array in fingerprint) + sum(contour.nbytes for contour in contours)
+        self.entries[key] = (fingerprint, contours, nbytes, meta)
+        self.cached_bytes += nbytes
+        # evict the least recently used entries, but never the one just inserted
+        while self.cached_bytes > self.capacity_bytes and len(self.entries) > 1:
+            _, (_, _, evicted_bytes, _) = self.entries.popitem(last=False)
+            self.cached_bytes -= evicted_bytes
+            self.evictions += 1
+
+
+    def write_disk(self, fingerprint, contours, meta=None):
+        path = os.path.join(self.disk_path, f"{self.context}_{uuid.uuid4().hex}.npz")
+        lengths = np.array([len(contour) for contour in contours], dtype=np.int64)
+        points = np.concatenate(contours) if contours else np.empty((0, 2), dtype=np.float32)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, thumbnail=fingerprint[0], mask=fingerprint[1], points=points, lengths=lengths, meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+        self.disk_index[path] = fingerprint
+
+        # remove the oldest entries once the directory is over its budget
+        sizes = {p: os.path.getsize(p) for p in self.disk_index if os.path.exists(p)}
+        total = sum(sizes.values())
+        while total > self.disk_bytes and len(self.disk_index) > 1:
+            oldest, _ = self.disk_index.popitem(last=False)
+            total -= sizes.get(oldest, 0)
+            if os.path.exists(oldest):
+                os.remove(oldest)
+        return path
+
+
+    def clear(self):
+        # the results are stale, e.g. after a new empty-table reference changed the garment crop
+        self.entries.clear()
+        self.cached_bytes = 0
+        for path in self.disk_index:
+            if os.path.exists(path):
+                os.remove(path)
+        self.disk_index.clear()
+
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "disk_entries": len(self.disk_index), "memory_mb": self.cached_bytes / (1024 * 1024)}
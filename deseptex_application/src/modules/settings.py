@@ -6,6 +6,64 @@ GUI_IMAGE_SHAPE = (1200, 1600, 3)
 
 classification_image_shape = 224 # fixed by model training
 segmentation_image_shape = 1280 # fixed by model training
+PRELOAD_SEGMENTATION_CLASS = "chemise" # most frequent garment, its segmentation model is loaded at startup, the others lazily
+INFERENCE_BACKEND = "pytorch" # pytorch, onnx, openvino or openvino_int8 (needs CALIBRATION_FRAMES_DIR, else fp32 openvino), see src/export_models.py
+CALIBRATION_FRAMES_DIR = None # e.g. "./data/calibration", saved frames for the INT8 calibration of the segmentation models
+POSTPROC_MODE = "crop" # legacy, crop or mask, see modules/postprocessor.py
+POSTPROC_KERNEL = "rect" # rect reproduces the legacy 12 x 3x3 dilation exactly, disk gives a uniform margin
+GARMENT_ROI = True # segment only a padded crop around the garment, once an empty-table reference is stored from the GUI
+GARMENT_REFERENCE_PATH = "./calibration/empty_table.png" # downscaled image of the empty cutting table
+RESULT_CACHE = False # opt-in: reuse the contours when the same garment is snapped again without being touched, see modules/result_cache.py
+RESULT_CACHE_MB = 64 # memory budget of the cached results
+RESULT_CACHE_THRESHOLD = 6 # largest grey-level difference of any thumbnail pixel that still counts as the same frame, near-identical frames only
+RESULT_CACHE_MIN_IOU = 0.98 # overlap of the garment outlines of the two frames that still counts as the same garment position
+RESULT_CACHE_DISK_PATH = None # e.g. "./cache" to keep the results across restarts
+RESULT_CACHE_DISK_MB = 512 # disk budget, the oldest results are removed first
+
+INFERENCE_SERVER = False # snap through a shared inference server (src/inference_server.py) instead of an inference process per station
+INFERENCE_SERVER_ADDRESS = ("127.0.0.1", 29860)
+INFERENCE_SERVER_AUTHKEY = b"deseptex"
+STATION_NAME = "table1" # unique per station on the same server, also names the empty-table reference of the station
+INFERENCE_MAX_BATCH = 4 # snaps of different stations inferred together
+INFERENCE_BATCH_WINDOW = 0.05 # seconds a snap may wait for snaps of other stations to batch with
+
+CONVEYOR_STABLE_FRAMES = 2 # preview frames the table has to stay still after a change before the auto mode snaps
+CONVEYOR_MOTION_THRESHOLD = 4.0 # mean grey-level difference between two preview frames that counts as movement
+CONVEYOR_MIN_CLASS_PROB = 0.8 # below this classifier probability the auto mode leaves the garment for review
+CONVEYOR_MIN_SEG_CONF = 0.5 # same for the lowest confidence of the segmented cutting regions
+CONVEYOR_LOG_PATH = "./logs/conveyor.jsonl" # timings of every garment handled in auto mode
+
+ARCHIVE = True # keep every snapped frame with its predicted and edited contours for retraining, see modules/snapshot_archive.py
+ARCHIVE_PATH = "./archive"
+ARCHIVE_CODEC = "jpg" # jpg or png (lossless, slower)
+ARCHIVE_QUEUE = 4 # snapshots waiting for the writer, more are dropped so the GUI never waits
+ARCHIVE_DISK_MB = 50000 # disk budget, the oldest snapshots are removed first
+
+FRAME_RING_SLOTS = 3 # triple buffering: one slot being written, one latest, one still being read
+
+CUT_SIMPLIFY_TOLERANCE_MM = 0.1 # maximum chord deviation when simplifying cut paths, 0 disables simplification
+CUT_OPTIMIZE_ORDER = True # order the cut paths to minimize head travel
+CUTTER_TIMEOUT = 5.0 # seconds to wait for the cutter to acknowledge a message
+CUTTER_RETRIES = 2 # resends of START after a timeout before giving up, LOADFILE is never resent
+CUTTER_MATCH_REPLIES = False # only take replies that echo the command (START:OK), turn on once the real cutter is known to echo
+CUTTER_QUEUE = True # Finish hands the garment to a background job queue, the next one can be snapped while the cutter works
+CUTTER_JOB_TIMEOUT = 600.0 # seconds the cutter may take to acknowledge a job (the cut) before it is marked failed
+CUTTER_KEEP_SVGS = 50 # SVG files of finished jobs that are kept in ./svg
+
+UNDISTORT_MAPS_PATH = "./calibration/undistort_maps.npz" # cached remap tables, rebuilt when the calibration changes
+UNDISTORT_INTERPOLATION = "linear" # nearest, linear, cubic or lanczos4
+
+FRAME_SOURCE = "arena" # arena (the Lucid camera) or replay, with TESTING the test images are always replayed
+CAMERA_PIXEL_FORMAT = "BGR8" # or the raw BayerRG8: a third of the bytes per frame, demosaiced at half resolution in the undistortion
+CAMERA_FPS = 0.6 # acquisition frame rate, BayerRG8 leaves room for about three times as many frames on the link
+CAMERA_TIMEOUT_MARGIN = 1.0 # seconds a frame may come later than 1 / fps before the capture counts as timed out
+REPLAY_PATH = "./data/test_*.png" # directory, video file or glob of images for the replay source
+REPLAY_FPS = 1 / 3 # target rate of the replay source, 0 replays as fast as the pipeline can take the frames
+REPLAY_CACHE_MB = 2048 # memory budget of the decoded replay frames
+
+TRACING = False # record stage timings in every process, see modules/tracer.py
+TRACE_OVERLAY = True # with TRACING, show the stage breakdown of the last snap on the canvas
+TRACE_PATH = "./traces" # Chrome trace-event JSON written at exit, open it in chrome://tracing or ui.perfetto.dev
 
 
 
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import queue
+import threading
+import numpy as np
+import cv2 as cv
+from collections import deque
+
+from modules.frame_ring import frame_ring_t
+from modules.settings import GUI_IMAGE_SHAPE
+
+
+
+CODECS = {
+    # codec -> (file extension, imencode parameters)
+    "jpg": (".jpg", [cv.IMWRITE_JPEG_QUALITY, 95]),
+    "png": (".png", [cv.IMWRITE_PNG_COMPRESSION, 1]), # lossless, about three times slower than jpg
+}
+
+
+class snapshot_archive_t:
+    '''
+    Keeps every snapped frame with its predicted and its final (edited) contours for retraining and audits.
+    submit copies the frame out of the frame ring and queues it, a background thread encodes and writes it, so the GUI
+    never waits for the disk. When the queue is full the snapshot is dropped instead. Every snapshot is a frame file
+    and an npz with the contours (in frame coordinates), index.jsonl lists them with their class, confidence, timings
+    and outcome. Once the archive is over disk_mb the oldest snapshots are removed; their index lines are dropped
+    at the next start.
+    '''
+    def __init__(self, path, max_queue=4, disk_mb=50000, codec="jpg"):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}', choose from {list(CODECS)}")
+        self.path = path
+        self.disk_bytes = disk_mb * 1024 * 1024
+        self.extension, self.encode_params = CODECS[codec]
+        self.index_path = os.path.join(path, "index.jsonl")
+        self.prefix = time.strftime("%Y%m%d_%H%M%S") # names stay unique across restarts
+        self.last_id = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.evicted = 0
+        self.write_times = deque(maxlen=50) # seconds per snapshot in the writer thread
+
+        os.makedirs(path, exist_ok=True)
+        self.entries = deque() # (file paths, bytes) per snapshot on disk, oldest first
+        self.total_bytes = 0
+        self.load_index()
+
+        self.pending = queue.Queue(max_queue) # bounds the memory: at most max_queue frames wait for the writer
+        self.thread = threading.Thread(target=self.run, name="snapshot_archive", daemon=True)
+        self.thread.start()
+
+
+    def load_index(self):
+        # keep the lines of the snapshots that are still on disk, the index is rewritten without the others
+        lines = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # cut off by a crash
+                    paths = [os.path.join(self.path, entry["frame"]), os.path.join(self.path, entry["contours"])]
+                    if all(os.path.exists(p) for p in paths):
+                        size = sum(os.path.getsize(p) for p in paths)
+                        self.entries.append((paths, size))
+                        self.total_bytes += size
+                        lines.append(line)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.index_path)
+
+
+    def submit(self, frame_ring:frame_ring_t, seq, predicted, final=None, meta=None):
+        '''
+        Queues frame seq of frame_ring with the predicted contours (frame coordinates, as returned by the inference)
+        and the final contours (GUI coordinates, like the contour store). Returns False when the snapshot was dropped.
+        '''
+        self.submitted += 1
+        # no copy of the frame when it would be dropped anyway
+        if self.pending.full():
+            self.dropped += 1
+            return False
+        _, frame = frame_ring.read(seq)
+        if frame is None:
+            self.dropped += 1 # the camera already overwrote the frame
+            return False
+
+        scale = np.array([frame.shape[1] / GUI_IMAGE_SHAPE[1], frame.shape[0] / GUI_IMAGE_SHAPE[0]])
+        predicted = [np.asarray(contour, dtype=np.int32).reshape(-1, 2) for contour in predicted]
+        final = None if final is None else [np.rint(np.asarray(contour).reshape(-1, 2) * scale).astype(np.int32) for contour in final]
+        self.last_id += 1
+        entry = {"id": f"{self.prefix}_{self.last_id:05d}", "time": time.time(), "seq": seq, **(meta or {})}
+        try:
+            self.pending.put_nowait((entry, frame, predicted, final))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            start = time.perf_counter()
+            try:
+                self.write(*item)
+            except (OSError, cv.error) as e:
+                print(f"Could not archive snapshot {item[0]['id']}: {e}")
+                continue
+            self.write_times.append(time.perf_counter() - start)
+
+
+    def write(self, entry, frame, predicted, final):
+        entry["frame"] = entry["id"] + self.extension
+        entry["contours"] = entry["id"] + ".npz"
+        frame_path = os.path.join(self.path, entry["frame"])
+        contours_path = os.path.join(self.path, entry["contours"])
+
+        ok, encoded = cv.imencode(self.extension, frame, self.encode_params)
+        if not ok:
+            raise OSError(f"could not encode {entry['frame']}")
+        with open(frame_path + ".tmp", "wb") as f:
+            f.write(encoded)
+        os.replace(frame_path + ".tmp", frame_path)
+
+        # contours as flat int32 points plus the number of points per contour
+        arrays = {}
+        for name, contours in (("predicted", predicted), ("final", final)):
+            if contours is None:
+                continue
+            arrays[name + "_points"] = np.concatenate(contours) if contours else np.empty((0, 2), dtype=np.int32)
+            arrays[name + "_lengths"] = np.array([len(contour) for contour in contours], dtype=np.int32)
+        np.savez(contours_path + ".tmp.npz", **arrays)
+        os.replace(contours_path + ".tmp.npz", contours_path)
+
+        # the index line is written last, a listed snapshot is always complete
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        size = os.path.getsize(frame_path) + os.path.getsize(contours_path)
+        self.entries.append(([frame_path, contours_path], size))
+        self.total_bytes += size
+        self.written += 1
+        self.evict()
+
+
+    def evict(self):
+        # oldest first, never the snapshot just written
+        while self.total_bytes > self.disk_bytes and len(self.entries) > 1:
+            paths, size = self.entries.popleft()
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.total_bytes -= size
+            self.evicted += 1
+
+
+    def stats(self):
+        return {"submitted": self.submitted, "written": self.written, "dropped": self.dropped, "evicted": self.evicted,
+                "queued": self.pending.qsize(), "disk_mb": self.total_bytes / (1024 * 1024),
+                "write_ms": 1000 * float(np.mean(self.write_times)) if self.write_times else None}
+
+
+    def close(self, timeout=10.0):
+        # the queued snapshots are still written, at most max_queue of them
+        try:
+            self.pending.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
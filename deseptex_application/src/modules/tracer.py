@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import queue
+import functools
+import contextlib
+import numpy as np
+from collections import deque
+from multiprocessing import Queue
+
+from modules.settings import TRACING
+
+
+
+NULL_SPAN = contextlib.nullcontext() # returned by span() while tracing is disabled, nothing is allocated or timed
+HISTOGRAM_EDGES_MS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class span_t:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+
+class tracer_t:
+    '''
+    Records named spans of one process into a fixed-size ring buffer, flush() sends the new spans to the
+    trace collector of the main process. Every process has one module-level instance, see tracer below;
+    the child processes configure theirs at the start of run().
+    '''
+    def __init__(self, process_name="main", capacity=4096, sink=None, enabled=TRACING):
+        self.capacity = capacity
+        self.events = [None] * capacity # (name, start ns, duration ns, args)
+        self.count = 0
+        self.flushed = 0
+        self.configure(process_name, sink, enabled)
+
+
+    def configure(self, process_name, sink=None, enabled=TRACING):
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self.sink = sink
+        self.enabled = enabled and sink is not None
+
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return span_t(self, name, args)
+
+
+    def now(self):
+        # perf_counter_ns is one system-wide clock on Linux and Windows, so spans of all processes line up
+        return time.perf_counter_ns()
+
+
+    def record(self, name, start_ns, end_ns, args=None):
+        # for spans that do not fit a with block, e.g. from a snap request to its result
+        if not self.enabled:
+            return
+        self.events[self.count % self.capacity] = (name, start_ns, end_ns - start_ns, args or None)
+        self.count += 1
+
+
+    def flush(self):
+        if not self.enabled or self.count == self.flushed:
+            return
+        # spans that were overwritten since the last flush are lost
+        first = max(self.flushed, self.count - self.capacity)
+        self.sink.put((self.process_name, self.pid, [self.events[i % self.capacity] for i in range(first, self.count)]))
+        self.flushed = self.count
+
+
+tracer = tracer_t()
+
+
+def traced(name):
+    # decorator for functions that are one span as a whole
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+
+class trace_collector_t:
+    '''
+    Merges the spans of all processes in the main process, keeps rolling duration windows per span name
+    and exports everything as Chrome trace-event JSON (chrome://tracing or ui.perfetto.dev).
+    '''
+    def __init__(self, capacity=100000, window=200):
+        self.queue = Queue() # handed to every process as the sink of its tracer
+        self.events = deque(maxlen=capacity) # (pid, name, start ns, duration ns, args)
+        self.processes = {} # pid -> process name
+        self.window = window
+        self.durations = {} # span name -> rolling window of durations in ms
+        self.last = {} # span name -> duration of the most recent span in ms
+
+
+    def drain(self, timeout=0.0):
+        # a timeout lets the queue feeder threads catch up, e.g. for the final drain at exit
+        while True:
+            try:
+                process_name, pid, events = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self.processes[pid] = process_name
+            for name, start_ns, duration_ns, args in events:
+                self.events.append((pid, name, start_ns, duration_ns, args))
+                self.durations.setdefault(name, deque(maxlen=self.window)).append(duration_ns / 1e6)
+                self.last[name] = duration_ns / 1e6
+
+
+    def stats(self):
+        stats = {}
+        for name, durations in sorted(self.durations.items()):
+            samples = np.fromiter(durations, dtype=np.float64)
+            stats[name] = {"count": len(samples),
+                           "p50_ms": float(np.percentile(samples, 50)),
+                           "p95_ms": float(np.percentile(samples, 95)),
+                           "max_ms": float(samples.max()),
+                           "last_ms": self.last[name]}
+        return stats
+
+
+    def histogram(self, name):
+        # number of spans per HISTOGRAM_EDGES_MS bucket over the rolling window
+        counts, _ = np.histogram(np.fromiter(self.durations.get(name, ()), dtype=np.float64), bins=HISTOGRAM_EDGES_MS)
+        return counts
+
+
+    def report(self):
+        lines = []
+        for name, stats in self.stats().items():
+            buckets = " ".join(f"<{edge:g}:{count}" for edge, count in zip(HISTOGRAM_EDGES_MS[1:], self.histogram(name)) if count)
+            lines.append(f"{name:28s} n {stats['count']:4d}  p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  max {stats['max_ms']:8.1f} ms  [{buckets}]")
+        return "\n".join(lines)
+
+
+    def export_chrome(self, path):
+        trace_events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": process_name}}
+                        for pid, process_name in self.processes.items()]
+        for pid, name, start_ns, duration_ns, args in self.events:
+            event = {"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": 0,
+                     "ts": start_ns / 1000, "dur": duration_ns / 1000}
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,131 @@
+import os
+import hashlib
+import numpy as np
+import cv2 as cv
+
+
+
+INTERPOLATION_MODES = {
+    "nearest": cv.INTER_NEAREST,
+    "linear": cv.INTER_LINEAR,
+    "cubic": cv.INTER_CUBIC,
+    "lanczos4": cv.INTER_LANCZOS4,
+}
+
+BAYER_PATTERNS = {
+    # raw pixel format of the camera -> (row, column) of the red and of the blue pixel in every 2x2 cell
+    "BayerRG8": ((0, 0), (1, 1)),
+    "BayerBG8": ((1, 1), (0, 0)),
+    "BayerGR8": ((0, 1), (1, 0)),
+    "BayerGB8": ((1, 0), (0, 1)),
+}
+
+
+def bayer_mosaic(image, pixel_format="BayerRG8"):
+    # synthetic raw frame: one channel of the BGR image per pixel, in the colour filter pattern of pixel_format
+    (ry, rx), (by, bx) = BAYER_PATTERNS[pixel_format]
+    raw = image[..., 1].copy()
+    raw[ry::2, rx::2] = image[ry::2, rx::2, 2]
+    raw[by::2, bx::2] = image[by::2, bx::2, 0]
+    return raw
+
+
+
+class undistorter_t:
+    '''
+    Undistorts and downscales camera frames in a single cv.remap call.
+    The remap tables are built once at the output resolution as compact fixed-point maps
+    and cached on disk; they are only rebuilt when the calibration hash changes.
+    With bayer (a pixel format of BAYER_PATTERNS) the input is the raw sensor frame: every 2x2 cell becomes one BGR pixel
+    (superpixel demosaic, half the sensor resolution) and the remap reads that image through a scaled camera matrix.
+    '''
+    def __init__(self, mtx, dist, newcameramtx, input_shape, output_shape, maps_path=None, interpolation="linear", bayer=None):
+        self.mtx = np.asarray(mtx, dtype=np.float64)
+        self.dist = np.asarray(dist, dtype=np.float64)
+        self.newcameramtx = np.asarray(newcameramtx, dtype=np.float64)
+        self.input_shape = tuple(input_shape)
+        self.output_shape = tuple(output_shape)
+        self.maps_path = maps_path
+        self.bayer = bayer
+        self.set_interpolation(interpolation)
+        
+        self.remap_mtx = self.mtx
+        if bayer is not None:
+            if bayer not in BAYER_PATTERNS:
+                raise ValueError(f"Unknown Bayer pattern '{bayer}', choose from {list(BAYER_PATTERNS)}")
+            # the centre of superpixel (i, j) is sensor pixel (2i + 0.5, 2j + 0.5)
+            self.superpixel_shape = (self.input_shape[0] // 2, self.input_shape[1] // 2, 3)
+            half = np.array([[0.5, 0.0, -0.25], [0.0, 0.5, -0.25], [0.0, 0.0, 1.0]])
+            self.remap_mtx = half @ self.mtx
+            self.planes = [np.empty(self.superpixel_shape[:2], dtype=np.uint8) for _ in range(4)] # red, green, green, blue
+            self.superpixels = np.empty(self.superpixel_shape, dtype=np.uint8)
+
+        self.calibration_hash = self.compute_hash()
+        self.map1, self.map2 = self.load_or_build_maps()
+
+
+    def set_interpolation(self, interpolation):
+        if interpolation not in INTERPOLATION_MODES:
+            raise ValueError(f"Unknown interpolation mode '{interpolation}', choose from {list(INTERPOLATION_MODES)}")
+        self.interpolation = interpolation
+        self.interpolation_flag = INTERPOLATION_MODES[interpolation]
+
+
+    def compute_hash(self):
+        h = hashlib.sha1()
+        for array in (self.mtx, self.dist, self.newcameramtx):
+            h.update(np.ascontiguousarray(array).tobytes())
+        h.update(repr((self.input_shape[:2], self.output_shape[:2])).encode())
+        if self.bayer is not None:
+            h.update(self.bayer.encode())
+        return h.hexdigest()
+
+
+    def load_or_build_maps(self):
+        # reuse the cached maps if they were built from the same calibration
+        if self.maps_path is not None and os.path.exists(self.maps_path):
+            try:
+                with np.load(self.maps_path) as cached:
+                    if str(cached["calibration_hash"]) == self.calibration_hash:
+                        return cached["map1"], cached["map2"]
+            except (OSError, KeyError, ValueError) as e:
+                print(f"Could not load undistortion maps from {self.maps_path}: {e}")
+
+        map1, map2 = self.build_maps()
+        if self.maps_path is not None:
+            self.save_maps(map1, map2)
+        return map1, map2
+
+
+    def build_maps(self):
+        # the maps are built straight at the output resolution, the new camera matrix
+        # already accounts for the scaling from the sensor to the output size
+        output_size = (self.output_shape[1], self.output_shape[0])
+        return cv.initUndistortRectifyMap(self.remap_mtx, self.dist, None, self.newcameramtx, output_size, cv.CV_16SC2)
+
+
+    def save_maps(self, map1, map2):
+        # write to a temporary file first so a crash never leaves a truncated cache behind
+        tmp_path = self.maps_path + ".tmp.npz"
+        np.savez(tmp_path, map1=map1, map2=map2, calibration_hash=np.array(self.calibration_hash))
+        os.replace(tmp_path, self.maps_path)
+
+
+    def demosaic(self, raw):
+        # R, the mean of both G and B of every cell, the strided reads are the only pass over the raw frame
+        (ry, rx), (by, bx) = BAYER_PATTERNS[self.bayer]
+        h, w = self.superpixel_shape[:2]
+        red, green1, green2, blue = self.planes
+        np.copyto(red, raw[ry:2 * h:2, rx:2 * w:2])
+        np.copyto(green1, raw[ry:2 * h:2, 1 - rx:2 * w:2])
+        np.copyto(green2, raw[1 - ry:2 * h:2, rx:2 * w:2])
+        np.copyto(blue, raw[by:2 * h:2, bx:2 * w:2])
+        cv.addWeighted(green1, 0.5, green2, 0.5, 0.0, dst=green1)
+        return cv.merge((blue, green1, red), dst=self.superpixels)
+
+
+    def undistort(self, image, dst=None):
+        # undistort and downscale in one pass
+        if self.bayer is not None:
+            image = self.demosaic(image.reshape(image.shape[:2]))
+        return cv.remap(image, self.map1, self.map2, self.interpolation_flag, dst=dst, borderMode=cv.BORDER_CONSTANT)
@@ -0,0 +1,100 @@
+import math
+import numpy as np
+
+
+
+class vertex_index_t:
+    '''
+    Uniform grid hash over the vertices of all contours, for hit-testing in the GUI edit mode.
+    Polygons get a stable id internally, so deleting a polygon or a vertex only touches the
+    cells of that polygon instead of rebuilding the whole index.
+    '''
+    def __init__(self, cell_size=10):
+        self.cell_size = cell_size
+        self.clear()
+
+
+    def clear(self):
+        self.cells = {} # (cell x, cell y) -> set of (polygon id, point index)
+        self.polygons = {} # polygon id -> (N, 2) float array of its vertices
+        self.ids = [] # polygon position in the contour list -> polygon id
+        self.next_id = 0
+
+
+    def cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+
+    def build(self, contours):
+        self.clear()
+        for contour in contours:
+            self.add_polygon(contour)
+
+
+    def insert_points(self, polygon_id):
+        for pt_idx, (x, y) in enumerate(self.polygons[polygon_id]):
+            self.cells.setdefault(self.cell(x, y), set()).add((polygon_id, pt_idx))
+
+
+    def remove_points(self, polygon_id):
+        for pt_idx, (x, y) in enumerate(self.polygons[polygon_id]):
+            key = self.cell(x, y)
+            entries = self.cells.get(key)
+            if entries is not None:
+                entries.discard((polygon_id, pt_idx))
+                if not entries:
+                    del self.cells[key]
+
+
+    def add_polygon(self, contour):
+        polygon_id = self.next_id
+        self.next_id += 1
+        self.polygons[polygon_id] = np.array(contour, dtype=np.float64).reshape(-1, 2)
+        self.ids.append(polygon_id)
+        self.insert_points(polygon_id)
+
+
+    def remove_polygon(self, poly_idx):
+        polygon_id = self.ids.pop(poly_idx)
+        self.remove_points(polygon_id)
+        del self.polygons[polygon_id]
+
+
+    def update_polygon(self, poly_idx, contour):
+        # after a vertex was inserted or deleted, the point indices of this polygon shift
+        polygon_id = self.ids[poly_idx]
+        self.remove_points(polygon_id)
+        self.polygons[polygon_id] = np.array(contour, dtype=np.float64).reshape(-1, 2)
+        self.insert_points(polygon_id)
+
+
+    def move_vertex(self, poly_idx, pt_idx, x, y):
+        polygon_id = self.ids[poly_idx]
+        points = self.polygons[polygon_id]
+        old_key, new_key = self.cell(*points[pt_idx]), self.cell(x, y)
+        points[pt_idx] = (x, y)
+        if old_key != new_key:
+            entries = self.cells[old_key]
+            entries.discard((polygon_id, pt_idx))
+            if not entries:
+                del self.cells[old_key]
+            self.cells.setdefault(new_key, set()).add((polygon_id, pt_idx))
+
+
+    def nearest(self, x, y, threshold):
+        '''
+        Returns (polygon index, point index) of the vertex closest to (x, y) within threshold, or None.
+        '''
+        reach = math.ceil(threshold / self.cell_size)
+        cx, cy = self.cell(x, y)
+        best, best_distance = None, threshold**2
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                for polygon_id, pt_idx in self.cells.get((i, j), ()):
+                    px, py = self.polygons[polygon_id][pt_idx]
+                    distance = (x - px)**2 + (y - py)**2
+                    if distance <= best_distance:
+                        best, best_distance = (polygon_id, pt_idx), distance
+        if best is None:
+            return None
+        return (self.ids.index(best[0]), best[1])
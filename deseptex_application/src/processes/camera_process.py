@@ -1,165 +1,107 @@
 import cv2 as cv
+import json
 import time
-from multiprocessing import Process
+from multiprocessing import Process, Event
 import numpy as np
 from multiprocessing.synchronize import Event as MpEvent
-from modules.settings import TESTING, ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE
-
-if not TESTING:
-    from arena_api.system import system # type: ignore
-    from arena_api.buffer import BufferFactory # type: ignore
-    from arena_api.__future__.save import Writer # type: ignore
-    from arena_api.enums import PixelFormat # type: ignore
-
-import ctypes
-import time
+from modules.settings import ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE, UNDISTORT_MAPS_PATH, UNDISTORT_INTERPOLATION, CAMERA_TIMEOUT_MARGIN
+from modules.undistorter import undistorter_t, BAYER_PATTERNS
+from modules.frame_ring import frame_ring_t
+from modules.tracer import tracer
+from modules.frame_source import frame_source_t, make_frame_source
 
 
 
 
 
 class CameraProcess(Process):
-    def __init__(self, shared_array, mtx, dist, newcameramtx, lock, running_flag:MpEvent, quit_event:MpEvent):
+    def __init__(self, frame_ring:frame_ring_t, preview_ring:frame_ring_t, calibration_path, running_flag:MpEvent, quit_event:MpEvent, trace_queue=None, frame_source:frame_source_t|None=None):
         super().__init__()
-        self.shared_array = shared_array
-        self.mtx = mtx
-        self.dist = dist
-        self.newcameramtx = newcameramtx
-        self.lock = lock
+        self.frame_ring = frame_ring
+        self.preview_ring = preview_ring # ready-to-display RGB frames at GUI_IMAGE_SHAPE
+        self.calibration_path = calibration_path
         self.running_flag = running_flag
         self.quit_event = quit_event
-        
-        # setup camera
-        if not TESTING:
-            self.fps = 0.6
-            self.width = ORIGINAL_IMAGE_SHAPE[1]
-            self.height = ORIGINAL_IMAGE_SHAPE[0]
-            self.timeout = 2000
-            self.pixelformat_string = 'RGB8'
-            self.pixel_format = PixelFormat.BGR8
-            self.exposure_time = 600000.0
-            self.num_channels = ORIGINAL_IMAGE_SHAPE[2]
-
-            # open camera
-            self.startup()
-            self.setup()
+        self.ready_event = Event() # set once the first frame is in the frame ring
+        self.trace_queue = trace_queue # sink of the tracer in this process, see modules/tracer.py
+        self.frame_source = frame_source if frame_source is not None else make_frame_source() # the camera or a replay, started in the child
             
 
+    def load_calibration(self):
+        with open(self.calibration_path) as f:
+            calibration_dict = json.load(f)
+        self.mtx = np.asarray(calibration_dict["mtx"])
+        self.dist = np.asarray(calibration_dict["dist"])
+        self.newcameramtx, _ = cv.getOptimalNewCameraMatrix(self.mtx, self.dist, (ORIGINAL_IMAGE_SHAPE[1],ORIGINAL_IMAGE_SHAPE[0]), 1, (SHARED_IMAGE_SHAPE[1],SHARED_IMAGE_SHAPE[0]))
+
+
     def run(self):
-        index = 0
+        tracer.configure("camera", self.trace_queue)
         
-        if not TESTING:
-            self.device.start_stream()
-            print("Camera stream started")
+        # everything slow happens here in the child, so the GUI can come up right away
+        self.load_calibration()
         
+        # build (or load the cached) remap tables once, undistortion and downscaling happen in one remap per frame,
+        # a raw Bayer frame is demosaiced at half resolution right before it
+        bayer = self.frame_source.pixel_format if self.frame_source.pixel_format in BAYER_PATTERNS else None
+        self.undistorter = undistorter_t(self.mtx, self.dist, self.newcameramtx, ORIGINAL_IMAGE_SHAPE, SHARED_IMAGE_SHAPE,
+                                         UNDISTORT_MAPS_PATH, UNDISTORT_INTERPOLATION, bayer)
+        self.preview_scratch = np.empty(self.preview_ring.shape, dtype=np.uint8)
+        
+        # open the camera (waits up to a minute for a device to be connected) or start the replay
+        self.frame_source.start()
+        
+        # wait at least one frame interval, at 0.6 fps a shorter timeout never sees a frame
+        fps = self.frame_source.fps
+        timeout = 1.0 / fps + CAMERA_TIMEOUT_MARGIN if fps > 0 else 1.0
         while not self.quit_event.is_set():
             if self.running_flag.is_set():
-                
-                if not TESTING:
-                    # get image from camera
-                    buffer = self.device.get_buffer()
-
-                    item = BufferFactory.copy(buffer)
-                    self.device.requeue_buffer(buffer)
-
-                    buffer_bytes_per_pixel = int(len(item.data)/(item.width * item.height))
-                    array = (ctypes.c_ubyte * self.num_channels * item.width * item.height).from_address(ctypes.addressof(item.pbytes))
-                    image = np.ndarray(buffer=array, dtype=np.uint8, shape=(item.height, item.width, buffer_bytes_per_pixel))
-                    image = cv.cvtColor(image, cv.COLOR_BGR2RGB)
-                    
-                    # undistort and resize image
-                    image_resized = cv.undistort(image, self.mtx, self.dist, None, self.newcameramtx)
-                    
-                    # copy image to shared memory
-                    with self.lock:
-                        np_array = np.frombuffer(self.shared_array.get_obj(), dtype=np.uint8).reshape(SHARED_IMAGE_SHAPE)
-                        np.copyto(np_array, image_resized)
-                        
-                    # Destroy the copied item to prevent memory leaks
-                    BufferFactory.destroy(item)
-                
-                else:
-                    # cycle three test images
-                    if index % 3 == 0:
-                        frame = cv.imread("./data/test_chemise.png")
-                    elif index % 3 == 1:
-                        frame = cv.imread("./data/test_pant_avant.png")
-                    elif index % 3 == 2:
-                        frame = cv.imread("./data/test_pant_arriere.png")
-                        
-                    # undistort image
-                    frame_resized = cv.undistort(frame, self.mtx, self.dist, None, self.newcameramtx)
-                    
-                    # put image in shared memory
-                    with self.lock:
-                        np_array = np.frombuffer(self.shared_array.get_obj(), dtype=np.uint8).reshape(SHARED_IMAGE_SHAPE)
-                        np.copyto(np_array, frame_resized)
-                    time.sleep(3)
-                
-                index += 1
-            
-            
+                self.capture_frame(timeout=timeout)
+                tracer.flush()
             
             # running flag is not set, sleep for a while
             else:
                 time.sleep(1)
                 
-            
         # close camera
-        if not TESTING:
-            self.device.stop_stream()
-            system.destroy_device()
-                
-                
-    def startup(self):
-        devices = self.create_devices_with_tries()
-        self.device = system.select_device(devices)
-        self.nodemap = self.device.nodemap
+        self.frame_source.stop()
 
 
-    def create_devices_with_tries(self):
+    def capture_frame(self, timeout=None):
         '''
-        Waits for the user to connect a device before
-            raising an exception if it fails
+        One pass over the sensor frame: the remap reads the source frame in place (for the camera a view on the
+        device buffer) and writes straight into a ring slot, the frame is released right after.
+        Returns False when the source had no frame within timeout.
         '''
-        tries = 0
-        tries_max = 6
-        sleep_time_secs = 10
-        devices = None
-        while tries < tries_max:  # Wait for device for 60 seconds
-            devices = system.create_device()
-            if not devices:
-                print(
-                    f'Try {tries+1} of {tries_max}: waiting for {sleep_time_secs} '
-                    f'secs for a device to be connected!')
-                for sec_count in range(sleep_time_secs):
-                    time.sleep(1)
-                    print(f'{sec_count + 1 } seconds passed ',
-                        '.' * sec_count, end='\r')
-                tries += 1
-            else:
-                return devices
-        else:
-            raise Exception(f'No device found! Please connect a device and run '
-                            f'the example again.')
-
-
-    def setup(self):
-        nodes = self.nodemap.get_node(['Width', 'Height', 'PixelFormat', 'AcquisitionFrameRateEnable', 'AcquisitionFrameRate', 'ExposureAuto', 'ExposureTime'])
-        
-        nodes['Width'].value = self.width
-        nodes['Height'].value = self.height
-        nodes['PixelFormat'].value = self.pixelformat_string
-        
-        # Get device stream nodemap
-        tl_stream_nodemap = self.device.tl_stream_nodemap
-        tl_stream_nodemap['StreamAutoNegotiatePacketSize'].value = True
-        tl_stream_nodemap['StreamPacketResendEnable'].value = True
-
-        # set framerate
-        nodes['AcquisitionFrameRateEnable'].value = True
-        nodes['AcquisitionFrameRate'].value = self.fps
+        with tracer.span("camera.get_frame"):
+            frame, release = self.frame_source.get_frame(timeout)
+        if frame is None:
+            return False
+        held = [release]
+        def release_once():
+            if held:
+                held.pop()()
+        try:
+            self.publish_frame(frame, release_once)
+        finally:
+            release_once() # publish_frame failed before the remap finished
+        return True
+
+
+    def publish_frame(self, image, release=None):
+        # undistort and resize image straight into a free slot of the shared ring, release is called once image is no longer read
+        with tracer.span("camera.undistort"):
+            slot, slot_view = self.frame_ring.begin_write()
+            self.undistorter.undistort(image, dst=slot_view)
+            seq = self.frame_ring.commit(slot)
+        if release is not None:
+            release()
         
-        # set exposure time
-        nodes['ExposureAuto'].value = 'Off'
-        nodes['ExposureTime'].value = self.exposure_time
\ No newline at end of file
+        # the GUI only ever shows the preview, make it here once per captured frame instead of on every refresh,
+        # it gets the sequence number of its frame so the GUI can show exactly the frame it snaps
+        with tracer.span("camera.preview"):
+            preview_slot, preview_view = self.preview_ring.begin_write()
+            cv.resize(slot_view, (self.preview_ring.shape[1], self.preview_ring.shape[0]), dst=self.preview_scratch, interpolation=cv.INTER_AREA)
+            cv.cvtColor(self.preview_scratch, cv.COLOR_BGR2RGB, dst=preview_view)
+            self.preview_ring.commit(preview_slot, seq)
+        self.ready_event.set()
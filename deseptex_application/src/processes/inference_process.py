@@ -0,0 +1,144 @@
+import os
+import time
+import queue
+from multiprocessing import Process, Queue, Value, Event
+from multiprocessing.synchronize import Event as MpEvent
+
+from modules.frame_ring import frame_ring_t
+from modules.tracer import tracer
+from modules.result_cache import result_cache_t
+from modules.settings import PRELOAD_SEGMENTATION_CLASS, RESULT_CACHE, RESULT_CACHE_MB, RESULT_CACHE_THRESHOLD, RESULT_CACHE_MIN_IOU, RESULT_CACHE_DISK_PATH, RESULT_CACHE_DISK_MB
+
+
+
+REFERENCE_REQUEST = 0 # request id of "store this frame as the empty-table reference", snap requests start at 1
+
+
+class InferenceProcess(Process):
+    '''
+    Owns the inferencer in its own process so the Tk mainloop never blocks on a snap.
+    The GUI side calls submit/poll/cancel, the child loads the models once and serves
+    snap requests that refer to a frame in the shared frame ring by sequence number.
+    '''
+    def __init__(self, frame_ring:frame_ring_t,
+                 classifier_model_path, classifier_image_shape,
+                 pants_avant_model_path, pants_arriere_model_path, chemises_model_path, segmentation_image_shape,
+                 quit_event:MpEvent, backend="pytorch", trace_queue=None, calibration_frames=None):
+        super().__init__()
+        self.frame_ring = frame_ring
+        self.inferencer_args = (classifier_model_path, classifier_image_shape,
+                                pants_avant_model_path, pants_arriere_model_path, chemises_model_path, segmentation_image_shape, backend, calibration_frames)
+        self.quit_event = quit_event
+        self.trace_queue = trace_queue # sink of the tracer in this process, see modules/tracer.py
+
+        self.request_queue = Queue()
+        self.result_queue = Queue()
+        self.cancelled_id = Value('q', 0) # every request with an id up to this value is dropped
+        self.last_request_id = 0
+        self.last_confidence = None # confidence of the result poll returned last, see inferencer_t.confidence_of
+        self.ready_event = Event() # set once the classifier and the preloaded segmentation model are warmed up
+        self.cache_hits = Value('q', 0) # counters of the result cache, for monitoring from the GUI process
+        self.cache_misses = Value('q', 0)
+
+
+    def run(self):
+        # imported here so the GUI process never loads torch
+        import torch
+        from modules.inferencer import inferencer_t
+        tracer.configure("inference", self.trace_queue)
+
+        # no Tk thread to share the interpreter with, use every core for the forward passes
+        torch.set_num_threads(os.cpu_count() or 1)
+        
+        # load the classifier and the segmentation model of the most frequent garment, warm both up on a dummy frame
+        start = time.perf_counter()
+        inferencer = inferencer_t(*self.inferencer_args)
+        inferencer.warm_up(self.frame_ring.shape)
+        inferencer.preload(PRELOAD_SEGMENTATION_CLASS, self.frame_ring.shape)
+        result_cache = None
+        if RESULT_CACHE:
+            result_cache = result_cache_t(inferencer.result_context(), RESULT_CACHE_MB, RESULT_CACHE_THRESHOLD, RESULT_CACHE_MIN_IOU, disk_path=RESULT_CACHE_DISK_PATH, disk_mb=RESULT_CACHE_DISK_MB)
+        self.ready_event.set()
+        print(f"Inference process ready after {time.perf_counter() - start:.1f} s")
+
+        while not self.quit_event.is_set():
+            try:
+                request_id, seq, use_cache = self.request_queue.get(timeout=0.5)
+            except queue.Empty:
+                # the other segmentation models are loaded on the first snap of their garment, a load here would hold up
+                # a snap that arrives meanwhile
+                continue
+
+            if request_id == REFERENCE_REQUEST:
+                seq, frame = self.frame_ring.read(seq)
+                if frame is not None:
+                    inferencer.store_reference(frame)
+                    if result_cache is not None:
+                        result_cache.clear() # the garment crop changes with the reference
+                    print("Empty-table reference stored")
+                continue
+
+            if self.is_cancelled(request_id):
+                continue
+
+            # copy the frame out of the ring, the camera is paused while a snap is pending
+            with tracer.span("inference.read_frame"):
+                seq, frame = self.frame_ring.read(seq)
+            if frame is None:
+                print(f"Frame for request {request_id} was overwritten before inference started")
+                self.result_queue.put((request_id, seq, [], None))
+                continue
+
+            # the same garment snapped again gets its stored contours
+            contours = None
+            if result_cache is not None and use_cache:
+                with tracer.span("inference.cache_lookup"):
+                    fingerprint = result_cache.fingerprint(frame, inferencer.garment_locator)
+                    contours = result_cache.lookup(fingerprint)
+                    confidence = result_cache.meta
+                self.cache_hits.value, self.cache_misses.value = result_cache.hits, result_cache.misses
+            if contours is None:
+                contours = inferencer.run_inference_with_postproc(frame, is_cancelled=lambda: self.is_cancelled(request_id))
+                confidence = inferencer.confidence
+                if result_cache is not None and use_cache and not self.is_cancelled(request_id):
+                    result_cache.insert(fingerprint, contours, confidence)
+            tracer.flush()
+            if not self.is_cancelled(request_id):
+                self.result_queue.put((request_id, seq, contours, confidence))
+
+
+    def is_cancelled(self, request_id):
+        return request_id <= self.cancelled_id.value
+
+
+    def submit(self, seq, use_cache=True):
+        # called from the GUI process, returns the id to match the result against, use_cache=False always runs the models
+        self.last_request_id += 1
+        self.request_queue.put((self.last_request_id, seq, use_cache))
+        return self.last_request_id
+
+
+    def store_reference(self, seq):
+        # called from the GUI process while the table is empty
+        self.request_queue.put((REFERENCE_REQUEST, seq, False))
+
+
+    def cancel(self, request_id):
+        with self.cancelled_id.get_lock():
+            self.cancelled_id.value = max(self.cancelled_id.value, request_id)
+
+
+    def poll(self, request_id):
+        '''
+        Non-blocking check for the result of request_id.
+        Returns the contours, or None while the request is still running. Their confidence is in self.last_confidence.
+        '''
+        while True:
+            try:
+                result_id, _, contours, confidence = self.result_queue.get_nowait()
+            except queue.Empty:
+                return None
+            # results of older (cancelled) requests are dropped
+            if result_id == request_id:
+                self.last_confidence = confidence
+                return contours